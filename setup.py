@@ -97,6 +97,8 @@ setup(
             'stitch-align = zetastitcher.align.__main__:main',
             'stitch-fuse = zetastitcher.fuse.__main__:main',
             'stitch-downscale = zetastitcher.scripts.stitch_downscale:main',
+            'stitch-convert = zetastitcher.scripts.stitch_convert:main',
+            'stitch-benchmark = zetastitcher.benchmark.__main__:main',
         ],
 
     },
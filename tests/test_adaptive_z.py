@@ -0,0 +1,63 @@
+import unittest
+
+from zetastitcher.align.__main__ import Runner
+from zetastitcher.align.journal import item_key
+
+
+def make_item(z_frame, score=0.9, shift=(4, 10, 10)):
+    item = {'aname': 'a', 'bname': 'b', 'z_frame': z_frame, 'axis': 2,
+            'score': score}
+    item.update(zip(['dz', 'dy', 'dx'], shift))
+    return item
+
+
+class FakeRunner(Runner):
+    """Runner returning precomputed results, recording what is aligned."""
+    def __init__(self, results):
+        super().__init__()
+        self.results = results
+        self.aligned = []
+
+    def align(self, items, journal_file, known=None):
+        self.aligned.append([item['z_frame'] for item in items])
+        return {item_key(item): self.results[item['z_frame']]
+                for item in items}
+
+
+class TestAdaptiveZ(unittest.TestCase):
+    def test_needs_more_samples(self):
+        r = Runner()
+        r.min_score = 0.8
+        r.shift_tolerance = 2
+
+        self.assertFalse(r.needs_more_samples([make_item(10)]))
+        self.assertTrue(r.needs_more_samples([make_item(10, score=0.5)]))
+        self.assertFalse(r.needs_more_samples(
+            [make_item(10), make_item(20, shift=(5, 12, 9))]))
+        self.assertTrue(r.needs_more_samples(
+            [make_item(10), make_item(20, shift=(4, 13, 10))]))
+        # bad samples are not taken into account for agreement
+        self.assertFalse(r.needs_more_samples(
+            [make_item(10), make_item(20, score=0.1, shift=(0, 0, 0))]))
+
+    def test_align_adaptive(self):
+        results = {
+            10: make_item(10, score=0.3),
+            20: make_item(20, score=0.5),
+            30: make_item(30, score=0.7),
+            40: make_item(40, score=0.9),
+            50: make_item(50, score=0.9),
+        }
+        r = FakeRunner(results)
+        r.processing_list = [make_item(z) for z in results]
+
+        out = r.align_adaptive('journal')
+
+        # from the center outwards, stopping at the first good sample
+        self.assertEqual(r.aligned, [[30], [20], [40]])
+        self.assertEqual(sorted(k[2] for k in out), [20, 30, 40])
+        self.assertEqual(len(r.processing_list), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import os
+import unittest
+import tempfile
+import threading
+import concurrent.futures
+from unittest import mock
+
+import numpy as np
+import tifffile
+from scipy import ndimage as ndi
+
+from zetastitcher.align import __main__ as align_main
+from zetastitcher.align.__main__ import Runner
+from zetastitcher.align.border_cache import BorderCache
+from zetastitcher.align.journal import item_key
+
+
+class RecordingExecutor(concurrent.futures.ThreadPoolExecutor):
+    """Executor recording the maximum number of futures not yet done."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pending = set()
+        self.max_pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, *args, **kwargs):
+        fut = super().submit(*args, **kwargs)
+        with self._lock:
+            self.pending.add(fut)
+            self.max_pending = max(self.max_pending, len(self.pending))
+        fut.add_done_callback(self._done)
+        return fut
+
+    def _done(self, fut):
+        with self._lock:
+            self.pending.discard(fut)
+
+
+def write_mosaic(folder, grid=(2, 3), tile_shape=(12, 64, 64), overlap=16):
+    """Write a grid of overlapping tiles cut from a smooth random volume."""
+    stride = tile_shape[-1] - overlap
+    shape = (tile_shape[0],
+             stride * (grid[0] - 1) + tile_shape[1],
+             stride * (grid[1] - 1) + tile_shape[2])
+    rng = np.random.default_rng(0)
+    volume = ndi.gaussian_filter(rng.random(shape), 2)
+    volume = (volume - volume.min()) / np.ptp(volume) * 4000
+    volume = volume.astype(np.uint16)
+
+    os.makedirs(folder)
+    for i in range(grid[0]):
+        for j in range(grid[1]):
+            y, x = i * stride, j * stride
+            tile = volume[:, y:y + tile_shape[1], x:x + tile_shape[2]]
+            tifffile.imwrite(
+                os.path.join(folder, '{:06d}_{:06d}.tiff'.format(x, y)), tile)
+
+
+def make_runner(input_folder, output_file):
+    r = Runner()
+    r.input_folder = input_folder
+    r.output_file = output_file
+    r.overlap_v = r.overlap_h = 16
+    r.max_dz, r.max_dy, r.max_dx = 2, 4, 4
+    r.z_samples = 2
+    r.n_of_workers = 1
+    return r
+
+
+class TestRunner(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.mosaic_dir = os.path.join(cls.tmpdir.name, 'mosaic')
+        write_mosaic(cls.mosaic_dir)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.tmpdir.cleanup()
+
+    def setUp(self) -> None:
+        self.output_file = os.path.join(self.tmpdir.name, 'stitch.yml')
+        self.runner = make_runner(self.mosaic_dir, self.output_file)
+        self.executors = []
+
+    def tearDown(self) -> None:
+        for f in [self.output_file, self.output_file + '.journal']:
+            if os.path.exists(f):
+                os.remove(f)
+
+    def make_executor(self, *args, **kwargs):
+        self.executors.append(RecordingExecutor(*args, **kwargs))
+        return self.executors[-1]
+
+    def test_max_in_flight(self):
+        r = self.runner
+        r.initialize_list()
+        items = list(r.processing_list)
+        self.assertGreater(len(items), r.max_in_flight)
+
+        with mock.patch('concurrent.futures.ProcessPoolExecutor',
+                        side_effect=self.make_executor):
+            r.run()
+
+        e, = self.executors
+        self.assertGreater(e.max_pending, 0)
+        self.assertLessEqual(e.max_pending, r.max_in_flight)
+
+        # results are collected in completion order, then reordered
+        self.assertEqual([item_key(row) for row in r.df.to_dict('records')],
+                         [item_key(item) for item in items])
+
+    def test_border_cache_released(self):
+        r = self.runner
+        r.border_cache_size = 0.05  # MB, a few bands
+
+        caches = []
+
+        def make_cache(*args):
+            caches.append(BorderCache(*args))
+            return caches[-1]
+
+        with mock.patch('concurrent.futures.ProcessPoolExecutor',
+                        side_effect=self.make_executor), \
+                mock.patch.object(align_main, 'BorderCache',
+                                  side_effect=make_cache):
+            r.run()
+
+        self.assertEqual(len(r.df), len(r.processing_list))
+        cache, = caches
+        self.assertGreater(cache.dropped, 0)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.currsize, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
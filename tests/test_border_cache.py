@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import tifffile as tiff
+
+from zetastitcher.io.inputfile import InputFile
+from zetastitcher.align.dog import dog
+from zetastitcher.align.timing import StageTimer
+from zetastitcher.align.border_cache import (
+    BorderCache, band_keys, extract_borders, read_band)
+
+
+class TestBorderCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmpdir)
+
+    def test_drop(self):
+        c = BorderCache(600)
+        c['a'] = np.zeros(100, dtype=np.float32)
+        c['b'] = np.zeros(100, dtype=np.float32)
+        self.assertNotIn('a', c)
+        self.assertIn('b', c)
+        self.assertEqual(c.dropped, 1)
+        self.assertIsNone(c.pop('a'))
+
+    def test_spill(self):
+        c = BorderCache(600, self.tmpdir)
+        c['a'] = np.arange(100, dtype=np.float32)
+        c['b'] = np.zeros(100, dtype=np.float32)
+        c['c'] = np.zeros(1000, dtype=np.float32)
+        self.assertEqual(len(os.listdir(self.tmpdir)), 2)
+        np.testing.assert_equal(c.pop('a'), np.arange(100))
+        self.assertEqual(c.pop('c').size, 1000)
+        self.assertEqual(len(os.listdir(self.tmpdir)), 0)
+        self.assertEqual(len(c), 1)
+
+    def test_extract_borders(self):
+        rng = np.random.default_rng(0)
+        a = (rng.random((20, 200, 180)) * 60000).astype(np.uint16)
+        fname = os.path.join(self.tmpdir, 'tile.tiff')
+        tiff.imwrite(fname, a, compression='zlib', rowsperstrip=16)
+
+        keys = []
+        for axis in [1, 2]:
+            item = {'aname': fname, 'bname': fname, 'z_frame': 10,
+                    'axis': axis}
+            keys += band_keys(item, 60, 4, 10)
+
+        timer = StageTimer()
+        with mock.patch.object(InputFile, 'zslice',
+                               side_effect=AssertionError('whole frames')):
+            bands = extract_borders(fname, keys, timer=timer)
+        self.assertEqual(set(bands.keys()), set(keys))
+        # only the bands are read
+        self.assertEqual(timer.bytes_read, sum(b.size for b in bands.values())
+                         * a.itemsize)
+
+        with InputFile(fname) as f:
+            for k in keys:
+                expected = dog(read_band(f, *k[1:]))
+                np.testing.assert_allclose(bands[k], expected, rtol=1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+
+from ddt import ddt, data
+
+import numpy as np
+
+from zetastitcher.align.dog import DoGFilter, dog, crossCorr, crossCorrStack
+
+
+test_vectors = [
+    ['separable', (60, 300)],
+    ['separable', (30, 200)],
+    ['fft', (60, 300)],
+    ['fft', (250, 512)],
+    ['fft', (31, 47)],
+    ['auto', (120, 256)],
+]
+
+
+@ddt
+class TestDoG(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.rng = np.random.default_rng(42)
+
+    @data(*test_vectors)
+    def test_same_as_direct(self, value):
+        method, shape = value
+        image = (self.rng.random(shape) * 1000).astype(np.float32)
+
+        expected = DoGFilter(method='direct')(image)
+        result = DoGFilter(method=method)(image)
+
+        self.assertEqual(result.dtype, np.float32)
+        atol = 1e-4 * np.abs(expected).max()
+        np.testing.assert_allclose(result, expected, atol=atol)
+
+    def test_stack(self):
+        stack = (self.rng.random((3, 64, 128)) * 1000).astype(np.float32)
+        result = DoGFilter(method='fft')(stack)
+        for i in range(stack.shape[0]):
+            expected = dog(stack[i], method='direct')
+            atol = 1e-4 * np.abs(expected).max()
+            np.testing.assert_allclose(result[i], expected, atol=atol)
+
+    def test_integer_input(self):
+        image = (self.rng.random((64, 64)) * 1000).astype(np.uint16)
+        self.assertEqual(DoGFilter().choose_method(image.shape, image.dtype),
+                         'direct')
+
+    def test_cross_corr_stack(self):
+        stack = (self.rng.random((4, 40, 90)) * 1000).astype(np.float32)
+        templ = stack[2, 5:30].copy()
+
+        result = crossCorrStack(stack, templ, 0, 6)
+        expected = np.stack([crossCorr(p, templ, 0, 6) for p in stack])
+
+        self.assertEqual(result.shape, expected.shape)
+        np.testing.assert_allclose(result, expected, atol=1e-5)
+        self.assertEqual(np.unravel_index(result.argmax(), result.shape),
+                         (2, 5, 6))
+
+
+if __name__ == '__main__':
+    unittest.main()
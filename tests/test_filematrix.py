@@ -1,10 +1,14 @@
+import os
 import unittest
+import tempfile
 
 import numpy as np
+import tifffile
 
 from ddt import ddt, data
 
-from zetastitcher.align.filematrix import parse_file_name
+from zetastitcher.align.filematrix import FileMatrix, parse_file_name
+from zetastitcher.benchmark.slices import grid_matrix, pairwise_slices
 
 
 test_vectors = [
@@ -24,6 +28,41 @@ class TestFileMatrix(unittest.TestCase):
         fields = parse_file_name(value[0])
         np.testing.assert_equal(fields, value[1])
 
+    def test_load_dir(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for x in [0, 100, 200]:
+                for y in [0, 50]:
+                    tifffile.imwrite(
+                        os.path.join(tmpdir, '{}_{}.tiff'.format(x, y)),
+                        np.zeros((8 + x // 100, 10, 12), dtype=np.uint16))
+            # skipped: name cannot be parsed, file cannot be opened
+            with open(os.path.join(tmpdir, 'notes.txt'), 'w') as f:
+                f.write('notes')
+            with open(os.path.join(tmpdir, '300_0.tiff'), 'w') as f:
+                f.write('not a tiff')
+
+            dfs = [FileMatrix(tmpdir, probe_workers=n).data_frame
+                   for n in [1, 8]]
+
+        self.assertEqual(len(dfs[0]), 6)
+        self.assertEqual(dfs[0].loc[os.path.join(tmpdir, '200_50.tiff'),
+                                    'nfrms'], 10)
+        self.assertTrue(dfs[0].equals(dfs[1]))
+
+    @data(0, 3, 50)
+    def test_slices(self, max_dz):
+        fm = grid_matrix(8, nfrms=40, max_dz=max_dz, seed=max_dz)
+        # some tiles containing others in Z
+        fm.data_frame.iloc[::5, fm.data_frame.columns.get_loc('Z_end')] += 30
+
+        slices = [list(s.nodes()) for s in fm.slices()]
+        expected = [set(s.nodes()) for s in pairwise_slices(fm)]
+        self.assertEqual([set(s) for s in slices], expected)
+
+        index = list(fm.data_frame.index)
+        for s in slices:
+            self.assertEqual(s, sorted(s, key=index.index))
+
 
 if __name__ == '__main__':
     unittest.main()
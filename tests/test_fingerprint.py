@@ -0,0 +1,50 @@
+import os
+import unittest
+import tempfile
+
+from zetastitcher.align.fingerprint import fingerprint, fingerprints
+
+
+class TestFingerprint(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fname = os.path.join(self.tmpdir.name, 'tile.raw')
+        with open(self.fname, 'wb') as f:
+            f.write(bytes(range(256)) * 1000)
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_content_change(self):
+        fp = fingerprint(self.fname)
+        self.assertEqual(fp['size'], 256000)
+        self.assertEqual(fingerprint(self.fname), fp)
+
+        # same size and modification time, different content at the end
+        st = os.stat(self.fname)
+        with open(self.fname, 'r+b') as f:
+            f.seek(-1, os.SEEK_END)
+            f.write(b'\x00')
+        os.utime(self.fname, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+        new_fp = fingerprint(self.fname)
+        self.assertEqual(new_fp['mtime'], fp['mtime'])
+        self.assertNotEqual(new_fp['hash'], fp['hash'])
+
+    def test_directory(self):
+        d = os.path.join(self.tmpdir.name, 'tile')
+        os.mkdir(d)
+        for i in range(3):
+            with open(os.path.join(d, '{}.tiff'.format(i)), 'wb') as f:
+                f.write(b'frame %d' % i)
+
+        fps = fingerprints([d, self.fname])
+        self.assertEqual(fps[d]['size'], 3 * 7)
+
+        with open(os.path.join(d, '3.tiff'), 'wb') as f:
+            f.write(b'frame 3')
+        self.assertNotEqual(fingerprint(d)['hash'], fps[d]['hash'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import math
+import unittest
+import tempfile
+from unittest import mock
+
+import numpy as np
+from ddt import ddt, data
+
+from zetastitcher.fuse import fuse
+from zetastitcher.fuse.fuse import squircle_alpha, normalization_factor
+
+
+def squircle_reference(height, width):
+    """Pixel by pixel squircle, as originally implemented."""
+    squircle = np.zeros((height, width))
+    ratio = width / height
+    a = math.ceil(width / 2)
+    b = math.ceil(height / 2)
+    N = max(a, b)
+    ps = np.logspace(np.log10(2), np.log10(50), N)
+    alpha = np.linspace(0, 1, N)
+
+    if a > b:
+        dra = a / N
+        ras = np.arange(0, a, dra) + 1
+        rbs = ras / ratio
+        drb = dra / ratio
+    else:
+        drb = b / N
+        rbs = np.arange(0, b, drb) + 1
+        ras = rbs * ratio
+        dra = drb * ratio
+
+    start_y = b - 1 if height % 2 else b
+    start_x = a - 1 if width % 2 else a
+
+    for y in range(b):
+        for x in range(a):
+            i = int(max(x / dra, y / drb))
+            count = -1
+            for n, p, ra, rb in zip(range(0, N - i), ps[i:], ras[i:],
+                                    rbs[i:]):
+                count += 1
+                if math.pow(x / ra, p) + math.pow(y / rb, p) < 1:
+                    break
+            squircle[start_y + y, start_x + x] = alpha[i + count] ** 2
+
+    squircle[:start_y, start_x:] = np.flipud(squircle[b:, start_x:])
+    squircle[:, :start_x] = np.fliplr(squircle[:, a:])
+
+    return 1 - squircle
+
+
+@ddt
+class TestSquircle(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmpdir.name, 'cache')
+        patcher = mock.patch.object(fuse, 'SQUIRCLE_CACHE_DIR',
+                                    self.cache_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        squircle_alpha.cache_clear()
+
+    def tearDown(self) -> None:
+        squircle_alpha.cache_clear()
+        self.tmpdir.cleanup()
+
+    @data((1, 1), (2, 2), (3, 7), (7, 3), (10, 11), (48, 64), (65, 40),
+          (84, 47))
+    def test_reference(self, shape):
+        np.testing.assert_array_equal(squircle_alpha(*shape),
+                                      squircle_reference(*shape))
+
+    def test_disk_cache(self):
+        a = squircle_alpha(30, 40)
+        self.assertFalse(a.flags.writeable)
+        self.assertTrue(os.path.exists(
+            os.path.join(self.cache_dir, 'squircle_30x40.npy')))
+        # private to the user
+        self.assertEqual(os.stat(self.cache_dir).st_mode & 0o777, 0o700)
+
+        squircle_alpha.cache_clear()
+        with mock.patch.object(fuse, '_compute_squircle_alpha') as compute:
+            b = squircle_alpha(30, 40)
+        compute.assert_not_called()
+        np.testing.assert_array_equal(a, b)
+
+    def test_normalization_factor(self):
+        f = normalization_factor((30, 40), [(0, 30, 30, 40)])
+        f = f[1:-1]  # zero weight at the corners
+        np.testing.assert_array_equal(f[:, 1:30], 1)
+        w = squircle_alpha(30, 40)[1:-1]
+        np.testing.assert_allclose(
+            f[:, 30:-1], w[:, 30:-1] / (w[:, 30:-1] + np.flipud(w[:, :9])))
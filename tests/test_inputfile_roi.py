@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from ddt import ddt, data
+
+import numpy as np
+import tifffile as tiff
+
+from zetastitcher.io.inputfile import InputFile
+from zetastitcher.io.tiffwrapper import TiffWrapper
+
+
+tiff_vectors = [
+    ['uncompressed', {}],
+    ['zlib', {'compression': 'zlib'}],
+    ['strips', {'compression': 'zlib', 'rowsperstrip': 16}],
+    ['tiles', {'compression': 'zlib', 'tile': (64, 48)}],
+]
+
+roi_vectors = [
+    [1, 4, slice(-70, None), slice(None)],
+    [0, 2, slice(10, 77), slice(33, 100)],
+    [2, 3, slice(None, 20), slice(None)],
+]
+
+
+@ddt
+class TestInputFileROI(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.tmpdir = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        cls.a = (rng.random((7, 300, 250)) * 60000).astype(np.uint16)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        shutil.rmtree(cls.tmpdir)
+
+    def check_rois(self, fname):
+        with InputFile(fname) as f:
+            for z_from, z_to, y, x in roi_vectors:
+                expected = self.a[z_from:z_to, y, x]
+                np.testing.assert_equal(f.roi(z_from, z_to, y, x), expected)
+
+    @data(*tiff_vectors)
+    def test_tiff(self, value):
+        name, kwargs = value
+        fname = os.path.join(self.tmpdir, name + '.tiff')
+        tiff.imwrite(fname, self.a, **kwargs)
+        self.check_rois(fname)
+
+    @data(*tiff_vectors)
+    def test_tiff_no_zslice(self, value):
+        name, kwargs = value
+        fname = os.path.join(self.tmpdir, name + '_noz.tiff')
+        tiff.imwrite(fname, self.a, **kwargs)
+        with mock.patch.object(TiffWrapper, 'zslice',
+                               side_effect=AssertionError('whole frames')):
+            self.check_rois(fname)
+
+    def test_tiff_fallback(self):
+        fname = os.path.join(self.tmpdir, 'fallback.tiff')
+        tiff.imwrite(fname, self.a, compression='zlib', rowsperstrip=16)
+        with mock.patch.object(TiffWrapper, 'segment_decoding', False):
+            self.check_rois(fname)
+
+    def test_mhd(self):
+        fname = os.path.join(self.tmpdir, 'test.mhd')
+        self.a.tofile(os.path.join(self.tmpdir, 'test.raw'))
+        with open(fname, 'w') as f:
+            f.write('ObjectType = Image\n'
+                    'NDims = 3\n'
+                    'BinaryData = True\n'
+                    'BinaryDataByteOrderMSB = False\n'
+                    'DimSize = 250 300 7\n'
+                    'ElementType = MET_USHORT\n'
+                    'ElementDataFile = test.raw\n')
+        self.check_rois(fname)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import unittest
+import tempfile
+
+import numpy as np
+
+from zetastitcher.align.journal import Journal, item_key
+
+
+def make_item(z_frame, score=0.9):
+    return {
+        'aname': 'a.tiff',
+        'bname': 'b.tiff',
+        'z_frame': z_frame,
+        'axis': 2,
+        'score': np.float32(score),
+        'dz': np.int64(1),
+        'dy': np.int64(2),
+        'dx': np.int64(3),
+    }
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'stitch.yml.journal')
+        self.params = {'max_dz': 4, 'engine': 'xcorr'}
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_resume(self):
+        with Journal(self.path, self.params) as j:
+            j.append(make_item(10))
+            j.append(make_item(20))
+
+        results = Journal(self.path, self.params).load()
+
+        self.assertEqual(set(results), {('a.tiff', 'b.tiff', 10, 2),
+                                        ('a.tiff', 'b.tiff', 20, 2)})
+        item = results[item_key(make_item(20))]
+        self.assertEqual((item['dz'], item['dy'], item['dx']), (1, 2, 3))
+        self.assertAlmostEqual(item['score'], 0.9, places=6)
+
+    def test_other_params(self):
+        with Journal(self.path, self.params) as j:
+            j.append(make_item(10))
+        with Journal(self.path, dict(self.params, max_dz=8)) as j:
+            j.append(make_item(20))
+
+        results = Journal(self.path, self.params).load()
+        self.assertEqual(list(results), [('a.tiff', 'b.tiff', 10, 2)])
+
+    def test_truncated(self):
+        with Journal(self.path, self.params) as j:
+            j.append(make_item(10))
+        with open(self.path, 'a') as f:
+            f.write('{"item": {"aname": "a.t')
+
+        with Journal(self.path, self.params) as j:
+            j.append(make_item(20))
+
+        results = Journal(self.path, self.params).load()
+        self.assertEqual(len(results), 2)
+
+        j.remove()
+        self.assertFalse(os.path.exists(self.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
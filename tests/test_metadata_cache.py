@@ -0,0 +1,76 @@
+import os
+import unittest
+import tempfile
+from unittest import mock
+
+import numpy as np
+import tifffile
+
+from zetastitcher import InputFile
+from zetastitcher.align.filematrix import FileMatrix
+from zetastitcher.io import metadata_cache
+from zetastitcher.io.metadata_cache import MetadataCache, CACHE_FILE
+
+
+class TestMetadataCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.dir = self.tmpdir.name
+        metadata_cache._caches.clear()
+
+        for x in [0, 100]:
+            name = os.path.join(self.dir, '{:06d}_000000.tiff'.format(x))
+            tifffile.imwrite(name, np.zeros((8, 10, 12), dtype=np.uint16))
+
+    def tearDown(self) -> None:
+        metadata_cache._caches.clear()
+        self.tmpdir.cleanup()
+
+    def tile(self, x=0):
+        return os.path.join(self.dir, '{:06d}_000000.tiff'.format(x))
+
+    def test_round_trip(self):
+        cache = MetadataCache(self.dir)
+        with InputFile(self.tile()) as f:
+            cache.put(self.tile(), f)
+        cache.save()
+
+        entry = MetadataCache(self.dir).get(self.tile())
+        self.assertEqual(
+            [entry['nfrms'], entry['ysize'], entry['xsize']], [8, 10, 12])
+        self.assertEqual(entry['nchannels'], 1)
+        self.assertEqual(np.dtype(entry['dtype']), np.uint16)
+        self.assertEqual(entry['wrapper'], 'TiffWrapper')
+        self.assertIsNone(MetadataCache(self.dir).get(self.tile(100)))
+
+    def test_invalidation(self):
+        cache = MetadataCache(self.dir)
+        with InputFile(self.tile()) as f:
+            cache.put(self.tile(), f)
+
+        tifffile.imwrite(self.tile(), np.zeros((9, 10, 12), dtype=np.uint16))
+        self.assertIsNone(cache.get(self.tile()))
+
+    def test_load_dir(self):
+        fm = FileMatrix(self.dir)
+        self.assertTrue(os.path.exists(os.path.join(self.dir, CACHE_FILE)))
+
+        metadata_cache._caches.clear()
+        self.assertIsNotNone(metadata_cache.lookup(self.tile(100)))
+        fm2 = FileMatrix(self.dir)
+        self.assertTrue(fm.data_frame.equals(fm2.data_frame))
+
+        with InputFile(self.tile()) as f:
+            self.assertEqual(f.shape, (8, 10, 12))
+
+    def test_disabled(self):
+        FileMatrix(self.dir, metadata_cache=False)
+        self.assertFalse(os.path.exists(os.path.join(self.dir, CACHE_FILE)))
+
+        # an existing cache is not even looked up
+        FileMatrix(self.dir)
+        with mock.patch.object(metadata_cache, 'lookup',
+                               side_effect=AssertionError('lookup')):
+            FileMatrix(self.dir, metadata_cache=False)
+            with InputFile(self.tile(), metadata_cache=False) as f:
+                self.assertEqual(f.shape, (8, 10, 12))
@@ -0,0 +1,40 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from zetastitcher.align.filematrix import FileMatrix
+from zetastitcher.fuse.overlaps import Overlaps, DIRECTIONS, COLUMNS
+
+
+class TestOverlaps(unittest.TestCase):
+    def setUp(self) -> None:
+        df = pd.DataFrame({
+            'filename': ['0_0', '1_0', '0_1', '1_1'],
+            'X': [0, 1, 0, 1], 'Y': [0, 0, 1, 1], 'Z': 0,
+            'nfrms': 10, 'ysize': 100, 'xsize': 100,
+            'Xs': [0, 90, 3, 95], 'Ys': [0, 5, 92, 96], 'Zs': [0, 2, 0, 20],
+        })
+        self.fm = FileMatrix()
+        self.fm.data_frame = df.set_index('filename')
+        self.fm.process_data_frame()
+        self.ov = Overlaps(self.fm)
+
+    def test_getitem(self):
+        expected = pd.DataFrame(0, index=DIRECTIONS, columns=COLUMNS)
+        expected.loc['e'] = [2, 10, 5, 100, 90, 100]
+        expected.loc['s'] = [0, 10, 92, 100, 3, 100]
+        # 'se' does not overlap in Z
+        pd.testing.assert_frame_equal(self.ov['0_0'], expected)
+
+        self.assertEqual(list(self.ov['1_0'].loc['w']), [0, 8, 0, 95, 0, 10])
+        self.assertFalse(self.ov['1_1'].values.any())
+
+    def test_table(self):
+        self.assertEqual(self.ov.table.shape, (4, 8, 6))
+        for name, i in self.ov.index.items():
+            np.testing.assert_array_equal(self.ov.table[i], self.ov[name])
+
+        e = self.ov.overlap_e
+        self.assertEqual(list(e.index), list(self.fm.name_array.ravel()))
+        self.assertEqual(list(e.loc['0_0']), [2, 10, 5, 100, 90, 100])
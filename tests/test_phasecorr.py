@@ -0,0 +1,57 @@
+import unittest
+
+from ddt import ddt, data
+
+import numpy as np
+import scipy.ndimage as ndi
+
+from zetastitcher.align.phasecorr import align_phasecorr, phase_correlation
+
+
+test_vectors = [
+    [2, 7, -3],
+    [0, 10, 0],
+    [-4, 3, 8],
+    [-1, 18, -6],
+]
+
+
+@ddt
+class TestPhaseCorr(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        rng = np.random.default_rng(0)
+        vol = rng.random((40, 200, 200)).astype(np.float32)
+        cls.vol = ndi.gaussian_filter(vol, 2) * 1000
+
+    @data(*test_vectors)
+    def test_shift(self, value):
+        sz, sy, sx = value
+        max_dz, max_dy, max_dx = 4, 10, 8
+
+        a = self.vol[15:24, 20:80, 20:120]
+        b = self.vol[15 + sz:24 + sz, 20 + sy:80 + sy, 20 + sx:120 + sx]
+
+        dz, dy, dx, score = align_phasecorr(a, b, max_dz, max_dy, max_dx)
+
+        self.assertEqual((dz, dy, dx), (sz + max_dz, sy, sx + max_dx))
+        self.assertGreater(score, 0.7)
+
+    @data([1, 3, 2], [-1, 7, 6])
+    def test_displaced_peak(self, value):
+        sz, sy, sx = value
+        max_dz, max_dy, max_dx = 2, 10, 8
+
+        # few frames: the phase correlation peak is one frame off in Z
+        a = self.vol[18:23, 20:80, 20:120]
+        b = self.vol[18 + sz:23 + sz, 20 + sy:80 + sy, 20 + sx:120 + sx]
+        pc = phase_correlation(a, b, max_dz, max_dy, max_dx)
+        peak = np.unravel_index(np.argmax(pc), pc.shape)
+        self.assertEqual(peak, (max_dz, sy, sx + max_dx))
+
+        dz, dy, dx, _ = align_phasecorr(a, b, max_dz, max_dy, max_dx)
+        self.assertEqual((dz, dy, dx), (sz + max_dz, sy, sx + max_dx))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import os
+import unittest
+import tempfile
+from unittest import mock
+
+import pandas as pd
+from ddt import ddt, data
+
+from zetastitcher.align.filematrix import FileMatrix
+from zetastitcher.align.xcorr_filematrix import XcorrFileMatrix
+from zetastitcher.io import project
+
+
+def make_project():
+    names = ['./{}_{}.tiff'.format(x, y) for y in [0, 300] for x in [0, 300]]
+    filematrix = pd.DataFrame({
+        'filename': names, 'X': [0., 300., 0., 300.], 'Y': [0., 0., 300., 300.],
+        'Z': 0., 'nfrms': 40, 'xsize': 400, 'ysize': 400,
+        'Xs': [0, 297, 1, 299], 'Ys': [0, 2, 296, 298], 'Zs': [0, 1, 0, 2]})
+    xcorr = pd.DataFrame({
+        'aname': names[:2], 'bname': names[2:], 'axis': 1, 'dz': [4, 5],
+        'dy': [14, 12], 'dx': [10, 11], 'score': [0.97, 0.93],
+        'z_frame': 20})
+    options = {'max_dx': 10, 'max_dy': 10, 'max_dz': 4, 'overlap_v': 100,
+               'overlap_h': 100, 'ascending_tiles_x': True,
+               'ascending_tiles_y': True, 'channel': None}
+    return {'filematrix': filematrix, 'xcorr': xcorr,
+            'xcorr-options': options,
+            'fuser-options': {'abs_mode': 'maximum_score'},
+            'fingerprints': {n: {'size': 1, 'mtime': 2} for n in names}}
+
+
+@ddt
+class TestProject(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmpdir.name, name)
+
+    @data('stitch.yml', 'stitch.npz')
+    def test_round_trip(self, name):
+        p = make_project()
+        project.write(self.path(name), p)
+        q = project.read(self.path(name))
+
+        self.assertEqual(sorted(q), sorted(p))
+        for k in project.TABLES:
+            pd.testing.assert_frame_equal(
+                q[k][p[k].columns], p[k], check_dtype=False)
+        for k in ['xcorr-options', 'fuser-options', 'fingerprints']:
+            self.assertEqual(q[k], p[k])
+
+    def test_npz_dtypes(self):
+        p = make_project()
+        project.write(self.path('stitch.npz'), p)
+        q = project.read(self.path('stitch.npz'))
+        self.assertEqual(list(q['xcorr'].columns), list(p['xcorr'].columns))
+        pd.testing.assert_series_equal(q['xcorr'].dtypes, p['xcorr'].dtypes)
+
+    def test_read_after_write(self):
+        p = make_project()
+        fname = self.path('stitch.yml')
+        project.write(fname, p)
+
+        q = project.read(fname)
+        q['fuser-options']['abs_mode'] = 'nominal_positions'
+        self.assertEqual(project.read(fname)['fuser-options'],
+                         p['fuser-options'])
+
+        project.write(fname, q)
+        self.assertEqual(project.read(fname)['fuser-options'],
+                         q['fuser-options'])
+
+    def test_cache_size(self):
+        p = make_project()
+        n = project.CACHE_SIZE + 2
+        names = ['stitch{}.yml'.format(i) for i in range(n)]
+        for name in names:
+            project.write(self.path(name), p)
+            project.read(self.path(name))
+        self.assertEqual(len(project._cache), project.CACHE_SIZE)
+
+        # least recently read files are parsed again
+        with mock.patch.object(project, '_read_yaml',
+                               wraps=project._read_yaml) as read_yaml:
+            project.read(self.path(names[-1]))
+            read_yaml.assert_not_called()
+            project.read(self.path(names[0]))
+            read_yaml.assert_called_once()
+
+    def test_matrices(self):
+        for name in ['stitch.yml', 'stitch.npz']:
+            project.write(self.path(name), make_project())
+        fms = [FileMatrix(self.path(n)) for n in ['stitch.yml', 'stitch.npz']]
+        pd.testing.assert_frame_equal(
+            fms[0].data_frame, fms[1].data_frame[fms[0].data_frame.columns],
+            check_dtype=False)
+
+        xfms = [XcorrFileMatrix.from_yaml(self.path(n))
+                for n in ['stitch.yml', 'stitch.npz']]
+        for xfm in xfms:
+            xfm.aggregate_results()
+        pd.testing.assert_frame_equal(
+            xfms[0].stitch_data_frame,
+            xfms[1].stitch_data_frame[xfms[0].stitch_data_frame.columns],
+            check_dtype=False)
+
+        fms[1].save_to_yaml(self.path('stitch.npz'), 'update')
+        q = project.read(self.path('stitch.npz'))
+        self.assertEqual(len(q['xcorr']), 2)
+        self.assertIn('Xs', q['filematrix'].columns)
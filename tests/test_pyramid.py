@@ -0,0 +1,57 @@
+import unittest
+
+from ddt import ddt, data
+
+import numpy as np
+import scipy.ndimage as ndi
+
+from zetastitcher.align.dog import dog, crossCorrStack
+from zetastitcher.align.pyramid import align_pyramid, downsample
+
+
+test_vectors = [
+    [10, 20, -30],
+    [-14, -35, 40],
+    [0, 0, 0],
+    [3, 38, 5],
+]
+
+
+@ddt
+class TestPyramid(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        rng = np.random.default_rng(1)
+        vol = rng.random((60, 400, 500)).astype(np.float32)
+        cls.vol = ndi.gaussian_filter(vol, (1.5, 3, 3)) * 1000
+
+    def test_downsample(self):
+        a = np.arange(2 * 9 * 10, dtype=np.float32).reshape(2, 9, 10)
+        result = downsample(a, 2)
+
+        self.assertEqual(result.shape, (2, 4, 5))
+        self.assertEqual(result[1, 2, 3], a[1, 4:6, 6:8].mean())
+
+    @data(*test_vectors)
+    def test_same_as_exhaustive(self, value):
+        sz, sy, sx = value
+        max_dz, max_dy, max_dx, overlap = 15, 40, 50, 120
+        z, y, x, w = 30, 150, 100, 300
+
+        a = self.vol[z - max_dz:z + max_dz + 1, y:y + overlap + max_dy,
+                     x:x + w]
+        y += max_dy + sy
+        b = self.vol[z + sz:z + sz + 1, y:y + overlap - max_dy,
+                     x + sx:x + sx + w]
+
+        xcorr = crossCorrStack(dog(a), dog(b)[0], 0, max_dx)
+        expected = np.unravel_index(np.argmax(xcorr), xcorr.shape)
+
+        dz, dy, dx, score = align_pyramid(a, b, max_dz, max_dy, max_dx, 2)
+
+        self.assertEqual((dz, dy, dx), expected)
+        self.assertAlmostEqual(score, xcorr[expected], places=5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+
+import numpy as np
+from ddt import ddt, data
+
+from zetastitcher.align.schedule import hilbert_order, schedule, tile_order
+
+
+@ddt
+class TestSchedule(unittest.TestCase):
+    @data((1, 1), (1, 7), (4, 4), (3, 5), (8, 3), (10, 13))
+    def test_hilbert_order(self, shape):
+        cells = hilbert_order(shape)
+        self.assertEqual(sorted(cells), [(y, x) for y in range(shape[0])
+                                         for x in range(shape[1])])
+        self.assertEqual(cells[0], (0, 0))
+
+        # consecutive cells are adjacent
+        steps = np.abs(np.diff(np.array(cells), axis=0))
+        if len(steps):
+            self.assertLessEqual(steps.max(), 1)
+
+    def test_schedule(self):
+        name_array = np.array([['{}_{}'.format(x, y) for x in range(4)]
+                               for y in range(4)])
+        items = []
+        for y in range(4):
+            for x in range(4):
+                for z in [10, 20]:
+                    if x < 3:
+                        items.append({'aname': name_array[y, x],
+                                      'bname': name_array[y, x + 1],
+                                      'z_frame': z, 'axis': 2})
+                    if y < 3:
+                        items.append({'aname': name_array[y, x],
+                                      'bname': name_array[y + 1, x],
+                                      'z_frame': z, 'axis': 1})
+
+        out = schedule(items, name_array)
+        self.assertCountEqual(out, items)
+
+        # all pairs of a tile are consecutive, tiles in Hilbert order
+        anames = [item['aname'] for item in out]
+        groups = [a for i, a in enumerate(anames) if i == 0 or a != anames[i - 1]]
+        self.assertEqual(len(groups), len(set(anames)))
+        order = tile_order(name_array)
+        self.assertEqual(groups, [t for t in order if t in set(anames)])
@@ -0,0 +1,42 @@
+import unittest
+import concurrent.futures
+
+import numpy as np
+
+from zetastitcher.align.shm import (
+    SharedArray, call_shared, start_resource_tracker)
+
+
+def total(a, b, offset=0):
+    return float(a.sum() - b.sum()) + offset
+
+
+class TestSharedArray(unittest.TestCase):
+    def test_call_shared(self):
+        start_resource_tracker()
+        a = np.arange(24, dtype=np.float32).reshape(2, 3, 4)
+        b = np.ones((3, 4), dtype=np.float32)
+
+        sa = SharedArray.copy_of(a)
+        sb = SharedArray.copy_of(b)
+        self.assertEqual(sa.nbytes, a.nbytes)
+
+        try:
+            with concurrent.futures.ProcessPoolExecutor(1) as e:
+                result = e.submit(call_shared, total, sa, sb, offset=1).result()
+            self.assertEqual(result, a.sum() - b.sum() + 1)
+
+            shm, view = sa.attach()
+            np.testing.assert_array_equal(view, a)
+            del view
+            shm.close()
+        finally:
+            sa.unlink()
+            sb.unlink()
+
+        with self.assertRaises(FileNotFoundError):
+            sa.attach()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import unittest
+import tempfile
+
+import numpy as np
+import pandas as pd
+from ddt import ddt, data
+
+from zetastitcher import InputFile
+from zetastitcher.align.filematrix import parse_file_name
+from zetastitcher.benchmark.synthetic import SyntheticMosaic, FORMATS, \
+    load_ground_truth
+
+
+@ddt
+class TestSyntheticMosaic(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.mosaic = SyntheticMosaic(grid=(2, 2), tile_shape=(8, 64, 64),
+                                      overlap=24, max_shift=(1, 4, 4))
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    @data(*FORMATS)
+    def test_write(self, fmt):
+        names = self.mosaic.write(self.tmpdir.name, fmt)
+        self.assertEqual(len(names), 4)
+
+        for (iy, ix), name in zip(self.mosaic.positions, names):
+            with InputFile(os.path.join(self.tmpdir.name, name)) as f:
+                np.testing.assert_array_equal(f.whole(),
+                                              self.mosaic.render(iy, ix))
+            x, y, z = parse_file_name(name)
+            self.assertEqual((y, x), (iy * 40, ix * 40))
+
+        gt = load_ground_truth(self.tmpdir.name)
+        self.assertEqual(gt['positions'][names[0]],
+                         {'Zs': 0, 'Ys': 0, 'Xs': 0})
+
+    def test_overlap(self):
+        """Overlapping regions show the same content, up to noise."""
+        m = self.mosaic
+        a = m.render(0, 0).astype(float)
+        b = m.render(0, 1).astype(float)
+        dz, dy, dx = np.subtract(m.positions[(0, 1)], m.positions[(0, 0)])
+
+        a = a[max(dz, 0):a.shape[0] + min(dz, 0), max(dy, 0):, dx:]
+        b = b[max(-dz, 0):b.shape[0] + min(-dz, 0), max(-dy, 0):,
+              :a.shape[-1]]
+        a = a[:, :b.shape[1]]
+        b = b[:, :a.shape[1]]
+        self.assertGreater(np.corrcoef(a.ravel(), b.ravel())[0, 1], 0.9)
+
+    def test_accuracy(self):
+        from zetastitcher.benchmark.__main__ import accuracy
+
+        names = self.mosaic.write(self.tmpdir.name)
+        gt = load_ground_truth(self.tmpdir.name)
+        rows = []
+        for name in names:
+            x, y, z = parse_file_name(name)
+            pos = gt['positions'][name]
+            rows.append(dict(X=x, Y=y, Z=z, Zs=pos['Zs'] + 5,
+                             Ys=pos['Ys'], Xs=pos['Xs']))
+        df = pd.DataFrame(rows, index=['./' + n for n in names])
+        df.loc['./' + names[-1], 'Xs'] += 2
+
+        acc = accuracy(df, gt)
+        self.assertEqual(acc['max_error_z'], 0)
+        self.assertEqual(acc['max_error_x'], 2)
+        self.assertEqual(acc['exact_fraction'], 0.75)
@@ -0,0 +1,64 @@
+import os
+import unittest
+import tempfile
+import concurrent.futures
+from unittest import mock
+
+import cv2 as cv
+import numpy as np
+import tifffile
+
+from zetastitcher.align import threads
+from zetastitcher.align.threads import InputFileCache, limit_threads
+
+
+class TestInputFileCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        self.data = {}
+        for i in range(4):
+            fname = os.path.join(self.tmpdir.name, '{}.tiff'.format(i))
+            self.data[fname] = rng.integers(0, 2**16, (6, 32, 48),
+                                            dtype=np.uint16)
+            tifffile.imwrite(fname, self.data[fname])
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_concurrent_reads(self):
+        def read(args):
+            fname, z = args
+            with files.open(fname) as f:
+                return f.zslice(z, z + 1)
+
+        # fewer open files than tiles, handles are evicted while in use
+        with InputFileCache(max_open=2) as files:
+            jobs = [(fname, z) for fname in self.data for z in range(6)] * 4
+            with concurrent.futures.ThreadPoolExecutor(8) as e:
+                for (fname, z), a in zip(jobs, e.map(read, jobs)):
+                    np.testing.assert_array_equal(a, self.data[fname][z:z + 1])
+            self.assertLessEqual(len(files._handles), 2)
+
+        self.assertEqual(len(files._handles), 0)
+
+    def test_same_handle(self):
+        with InputFileCache() as files:
+            fname = next(iter(self.data))
+            self.assertIs(files.open(fname), files.open(fname))
+
+    def test_limit_threads(self):
+        old = cv.getNumThreads()
+        with limit_threads(os.cpu_count() * 2):
+            self.assertEqual(cv.getNumThreads(), 1)
+        self.assertEqual(cv.getNumThreads(), old)
+
+    def test_limit_threads_warning(self):
+        with mock.patch.object(threads, 'threadpoolctl', None), \
+                mock.patch.object(threads, '_warned_threadpoolctl', False):
+            with self.assertLogs(threads.logger, 'WARNING') as cm:
+                with limit_threads(1):
+                    pass
+                with limit_threads(1):
+                    pass
+        self.assertEqual(len(cm.output), 1)
@@ -0,0 +1,63 @@
+import os
+import csv
+import json
+import time
+import unittest
+import tempfile
+
+from zetastitcher.align.timing import (
+    StageTimer, TimingReport, STAGES, STAGE_READ, STAGE_DOG, TIMING_KEY)
+
+
+class TestTiming(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def item(self, z_frame):
+        item = {'aname': 'a.tiff', 'bname': 'b.tiff', 'z_frame': z_frame,
+                'axis': 1, 'score': 0.9}
+        timer = StageTimer.of(item)
+        for _ in range(2):
+            with timer(STAGE_READ):
+                time.sleep(0.01)
+        timer.bytes_read += 100
+        return item
+
+    def test_timer(self):
+        item = self.item(0)
+        timer = item[TIMING_KEY]
+        self.assertIs(StageTimer.of(item), timer)
+        self.assertGreaterEqual(timer.seconds[STAGE_READ], 0.02)
+        self.assertEqual(timer.seconds[STAGE_DOG], 0)
+
+    def test_report(self):
+        report = TimingReport()
+        items = [self.item(z) for z in range(3)]
+        for item in items:
+            report.add(item)
+            self.assertNotIn(TIMING_KEY, item)
+        report.add_tile('c.tiff', StageTimer())
+
+        self.assertEqual(report.n_items, 3)
+        self.assertEqual(report.n_tiles, 1)
+        self.assertEqual(report.totals()['bytes_read'], 300)
+        self.assertIn('I/O-bound', report.summary())
+
+    def test_dump(self):
+        for ext in ['csv', 'json']:
+            fname = os.path.join(self.tmpdir.name, 'timing.' + ext)
+            report = TimingReport(fname)
+            report.add(self.item(5))
+            report.dump()
+
+            with open(fname, newline='') as f:
+                records = json.load(f) if ext == 'json' else list(
+                    csv.DictReader(f))
+            self.assertEqual(len(records), 1)
+            self.assertEqual(set(records[0]),
+                             {'aname', 'bname', 'z_frame', 'axis',
+                              'bytes_read'} | set(STAGES))
+            self.assertEqual(int(records[0]['z_frame']), 5)
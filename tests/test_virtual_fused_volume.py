@@ -0,0 +1,74 @@
+import os
+import time
+import unittest
+import tempfile
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from ddt import ddt, data
+
+from zetastitcher import VirtualFusedVolume
+from zetastitcher.align.filematrix import parse_file_name
+from zetastitcher.benchmark.synthetic import SyntheticMosaic, \
+    load_ground_truth
+from zetastitcher.io import project
+
+
+@ddt
+class TestVirtualFusedVolume(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        mosaic = SyntheticMosaic(grid=(2, 3), tile_shape=(12, 64, 64),
+                                 overlap=16, max_shift=(2, 3, 3))
+        names = mosaic.write(cls.tmpdir.name)
+        gt = load_ground_truth(cls.tmpdir.name)
+
+        rows = []
+        for name in names:
+            x, y, z = parse_file_name(name)
+            rows.append(dict(filename=name, X=x, Y=y, Z=z, nfrms=12,
+                             ysize=64, xsize=64, **gt['positions'][name]))
+        cls.yml_file = os.path.join(cls.tmpdir.name, 'stitch.yml')
+        project.write(cls.yml_file, {'filematrix': pd.DataFrame(rows)})
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.tmpdir.cleanup()
+
+    @data(np.index_exp[...], np.index_exp[3:10, 20:90, 5:150:2],
+          np.index_exp[::-1, 100:10:-3], np.index_exp[5])
+    def test_parallel(self, item):
+        vfv = VirtualFusedVolume(self.yml_file)
+        expected = vfv[item]
+
+        vfv.n_of_workers = 3
+        np.testing.assert_array_equal(vfv[item], expected)
+
+    def test_prefetch(self):
+        vfv = VirtualFusedVolume(self.yml_file)
+        vfv.io_workers = 1
+        expected = vfv[...]
+
+        # later tiles are read first
+        load = vfv._load
+        names = list(vfv.fm.data_frame.index)
+
+        def slow_load(index, *args):
+            time.sleep(0.02 * (len(names) - names.index(index)))
+            return load(index, *args)
+
+        vfv.io_workers = len(names)
+        for n_of_workers, prefetch_bytes in [(1, 1), (2, 2**30)]:
+            vfv.n_of_workers = n_of_workers
+            vfv.prefetch_bytes = prefetch_bytes
+            with mock.patch.object(vfv, '_load', side_effect=slow_load):
+                np.testing.assert_array_equal(vfv[...], expected)
+
+    def test_read_error(self):
+        vfv = VirtualFusedVolume(self.yml_file)
+        vfv.n_of_workers = 2
+        with mock.patch.object(vfv, '_load', side_effect=OSError):
+            with self.assertRaises(OSError):
+                vfv[...]
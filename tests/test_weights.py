@@ -0,0 +1,52 @@
+import unittest
+import tempfile
+from unittest import mock
+
+import numpy as np
+
+from zetastitcher.fuse.weights import WeightCache
+
+
+def fake_factor(frame_shape, rects):
+    f = np.ones(frame_shape)
+    for y_from, y_to, x_from, x_to in rects:
+        f[y_from:y_to, x_from:x_to] /= 2
+    return f
+
+
+@mock.patch('zetastitcher.fuse.weights.normalization_factor',
+            side_effect=fake_factor)
+class TestWeightCache(unittest.TestCase):
+    frame_shape = (10, 20)  # 1600 bytes per factor
+
+    def test_get(self, compute):
+        cache = WeightCache()
+        a = cache.get(self.frame_shape, [(0, 10, 15, 20)])
+        b = cache.get(self.frame_shape, [np.array([0, 10, 15, 20])])
+        self.assertIs(a, b)
+        self.assertEqual(compute.call_count, 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertFalse(a.flags.writeable)
+
+        cache.get(self.frame_shape, [])
+        self.assertEqual(compute.call_count, 2)
+
+    def test_budget(self, compute):
+        cache = WeightCache(max_bytes=2 * 1600)
+        for x in [0, 1, 2, 0]:
+            cache.get(self.frame_shape, [(0, 1, x, x + 1)])
+        self.assertEqual(cache.nbytes, 3200)
+        self.assertEqual(compute.call_count, 4)  # first one evicted
+
+        cache.get(self.frame_shape, [(0, 1, 2, 3)])
+        self.assertEqual(compute.call_count, 4)
+
+    def test_directory(self, compute):
+        rects = [(0, 10, 15, 20), (8, 10, 0, 20)]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            a = WeightCache(directory=tmpdir).get(self.frame_shape, rects)
+            b = WeightCache(directory=tmpdir).get(self.frame_shape, rects)
+
+        self.assertEqual(compute.call_count, 1)
+        np.testing.assert_array_equal(a, b)
+        np.testing.assert_array_equal(a, fake_factor(self.frame_shape, rects))
@@ -0,0 +1,67 @@
+import os
+import unittest
+import tempfile
+import multiprocessing
+
+from zetastitcher.align.journal import Journal
+from zetastitcher.align.work_queue import WorkQueue
+
+
+def claim_all(directory):
+    wq = WorkQueue(directory, 50, 3)
+    claimed = []
+    for i in wq.claim():
+        claimed.append(i)
+        wq.mark_done(i)
+    return claimed
+
+
+class TestWorkQueue(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.dir = os.path.join(self.tmpdir.name, 'stitch.yml.queue')
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_shards(self):
+        wq = WorkQueue(self.dir, 10, 4)
+        self.assertEqual(wq.n_shards, 3)
+        self.assertEqual(wq.shard(list(range(10)), 2), [8, 9])
+
+        # existing shard size is used
+        wq = WorkQueue(self.dir, 10, 5)
+        self.assertEqual(wq.shard_size, 4)
+
+        with self.assertRaises(ValueError):
+            WorkQueue(self.dir, 11, 4)
+
+    def test_claim_multiprocess(self):
+        with multiprocessing.Pool(4) as p:
+            claimed = p.map(claim_all, [self.dir] * 4)
+
+        claimed = [i for c in claimed for i in c]
+        self.assertEqual(sorted(claimed), list(range(17)))
+
+        wq = WorkQueue(self.dir, 50)
+        self.assertEqual(wq.pending(), [])
+        self.assertEqual(list(wq.claim()), [])
+
+    def test_load_results(self):
+        params = {'max_dz': 4}
+        wq = WorkQueue(self.dir, 2, 1)
+        for i in wq.claim():
+            with Journal(wq.journal_path(i), params) as j:
+                j.append({'aname': 'a', 'bname': 'b', 'z_frame': i, 'axis': 1,
+                          'score': 1.})
+            if i == 0:
+                wq.mark_done(i)
+
+        self.assertEqual(wq.pending(), [1])
+        results = wq.load_results(params)
+        self.assertEqual(sorted(results), [('a', 'b', 0, 1), ('a', 'b', 1, 1)])
+        self.assertEqual(wq.load_results({'max_dz': 8}), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 import os
 import sys
+import shutil
 import time
 import queue
 import logging
@@ -8,18 +9,30 @@ import threading
 import concurrent.futures
 from datetime import timedelta
 
-import json
-import yaml
-
 import coloredlogs
 
 import numpy as np
 import pandas as pd
 
+from zetastitcher.io import project
 from zetastitcher.io.inputfile import InputFile
 from zetastitcher.align.filematrix import FileMatrix
 from zetastitcher.align.xcorr_filematrix import XcorrFileMatrix
-from zetastitcher.align.dog import align_dog
+from zetastitcher.align.dog import dog, crossCorrStack
+from zetastitcher.align.border_cache import (
+    BorderCache, band_keys, read_band, extract_borders)
+from zetastitcher.align.phasecorr import align_phasecorr
+from zetastitcher.align.pyramid import align_pyramid
+from zetastitcher.align.journal import Journal, item_key
+from zetastitcher.align.work_queue import WorkQueue
+from zetastitcher.align.fingerprint import fingerprints
+from zetastitcher.align.threads import InputFileCache, limit_threads
+from zetastitcher.align.schedule import schedule, tile_order
+from zetastitcher.align.timing import (
+    StageTimer, TimingReport, STAGE_OPEN, STAGE_READ, STAGE_CONVERT,
+    STAGE_DOG, STAGE_CORRELATE)
+from zetastitcher.align.shm import (
+    extract_borders_shared, call_shared, start_resource_tracker)
 from zetastitcher.fuse import absolute_positions
 from zetastitcher.fuse.__main__ import ABS_MODE_MAXIMUM_SCORE
 
@@ -29,6 +42,19 @@ from zetastitcher.version import __version__
 logger = logging.getLogger(__name__)
 coloredlogs.install(level='INFO', fmt='%(levelname)s [%(name)s]: %(message)s')
 
+ENGINE_XCORR = 'xcorr'
+ENGINE_PHASECORR = 'phasecorr'
+
+BACKEND_PROCESSES = 'processes'
+BACKEND_THREADS = 'threads'
+
+DEFAULT_SHM_BUDGET = 1024  # MB
+
+# tiles kept open by each worker process
+PROCESS_MAX_OPEN = 8
+
+_process_files = None
+
 
 class CustomFormatter(argparse.ArgumentDefaultsHelpFormatter,
                       argparse.RawDescriptionHelpFormatter):
@@ -53,13 +79,30 @@ Unless otherwise stated, all values are expected in px.
         formatter_class=CustomFormatter)
 
     parser.add_argument('input_folder', help='input folder')
-    parser.add_argument('-o', type=str, default='stitch.yml', dest='output_file', help='output file')
+    parser.add_argument('-o', type=str, default='stitch.yml', dest='output_file',
+                        help='output file (YAML, or compressed NumPy archive '
+                             'if it ends with .npz)')
     parser.add_argument('-c', '--ch', type=int, dest='channel', help='color channel')
     parser.add_argument('-j', type=int, dest='n_of_workers',
                         help='number of parallel jobs (defaults to number of system cores)')
+    parser.add_argument('--backend', type=str, default=BACKEND_PROCESSES,
+                        choices=[BACKEND_PROCESSES, BACKEND_THREADS],
+                        help='run jobs in separate processes, or in threads '
+                             'sharing opened tiles. With threads, OpenCV and '
+                             'BLAS threads are limited to share the cores '
+                             'among jobs')
     parser.add_argument('-r', action='store_true', dest='recursive', help='recursively look for files')
     parser.add_argument('-e', action='store_true', dest='equal_shape',
                         help='consider tiles of identical shape (results in slightly faster loading)')
+    parser.add_argument('--no-metadata-cache', action='store_false',
+                        dest='metadata_cache',
+                        help='do not use nor update the tile metadata cache '
+                             'file in the input folder')
+    parser.add_argument('--engine', type=str, default=ENGINE_XCORR,
+                        choices=[ENGINE_XCORR, ENGINE_PHASECORR],
+                        help='alignment engine: plane-by-plane normalized cross '
+                             'correlation, or 3D phase correlation of the '
+                             'overlapping sub-volumes')
 
     group = parser.add_argument_group(
         'pixel size', 'If specified, the corresponding options can be '
@@ -80,6 +123,17 @@ Unless otherwise stated, all values are expected in px.
     group.add_argument('--dx', type=float, required=True, dest='max_dx',
                        help='maximum allowed shift along x (lateral shift)')
 
+    group = parser.add_argument_group(
+        'coarse-to-fine search',
+        description='Estimate shifts on downsampled bands, then refine them '
+                    'at full resolution near the coarse estimate. Useful with '
+                    'large maximum shifts (xcorr engine only)')
+
+    group.add_argument('--pyramid', type=int, default=0, metavar='LEVELS',
+                       dest='pyramid_levels',
+                       help='number of downsampling levels (by 2, 4, ..., '
+                            '2**LEVELS), 0 to disable')
+
     group = parser.add_argument_group('overlaps')
     group.add_argument('--overlap', type=float, help='nominal overlap, H & V')
     group.add_argument('--overlap-h', type=float, metavar='OH',
@@ -99,6 +153,75 @@ Unless otherwise stated, all values are expected in px.
     group.add_argument('--z-stride', type=float, default=None,
                        help='stride used for multiple Z sampling')
 
+    group.add_argument('--adaptive-z', action='store_true',
+                       help='start from the sample closest to the center of '
+                            'the stack and take more samples (up to ZSAMP) '
+                            'only while the best score is below --min-score '
+                            'or good samples disagree by more than '
+                            '--shift-tolerance')
+
+    group.add_argument('--min-score', type=float, default=0.8,
+                       help='score threshold for adaptive sampling')
+
+    group.add_argument('--shift-tolerance', type=float, default=2,
+                       help='maximum disagreement among samples for adaptive '
+                            'sampling (px, along each axis)')
+
+    group = parser.add_argument_group(
+        'border cache',
+        description='Read each tile once, extracting and filtering all of its '
+                    'border bands, then correlate pairs of cached bands')
+
+    group.add_argument('--border-cache', type=float, metavar='MB',
+                       dest='border_cache_size',
+                       help='enable border cache with the given memory budget')
+
+    group.add_argument('--border-cache-dir', type=str, metavar='DIR',
+                       help='spill bands exceeding the memory budget to this '
+                            'directory (otherwise they are read again)')
+
+    group.add_argument('--io-workers', type=int, metavar='N',
+                       help='read tiles in N dedicated processes, handing '
+                            'bands to the -j correlation workers through '
+                            'shared memory. The border cache budget (default '
+                            '{} MB) bounds the shared memory in use'.format(
+                                DEFAULT_SHM_BUDGET))
+
+    group = parser.add_argument_group(
+        'incremental alignment',
+        description='Reuse the results of a previous run for pairs whose '
+                    'tiles did not change (same size, modification time and '
+                    'sampled content), if alignment options are the same')
+
+    group.add_argument('--incremental', type=str, metavar='PREV_YML',
+                       help='output file of the previous run')
+
+    group = parser.add_argument_group(
+        'timing',
+        description='A summary of the time spent by workers reading and '
+                    'processing tiles is always logged at the end')
+
+    group.add_argument('--timing-file', type=str, metavar='FILE',
+                       help='save per-item timings of each stage to FILE '
+                            '(CSV, or JSON if FILE ends with .json)')
+
+    group = parser.add_argument_group(
+        'multiple nodes',
+        description='Share the work among processes running on hosts with a '
+                    'shared filesystem. Start any number of workers with the '
+                    'same options, then merge their results. The work queue '
+                    'is kept next to the output file')
+
+    me_group = group.add_mutually_exclusive_group()
+    me_group.add_argument('--worker', action='store_true',
+                          help='claim and align shards of work items until '
+                               'none is left')
+    me_group.add_argument('--merge', action='store_true',
+                          help='merge the results of all workers and compute '
+                               'tile positions')
+    group.add_argument('--shard-size', type=int, default=100, metavar='N',
+                       help='number of work items in each shard')
+
     group = parser.add_argument_group('tile ordering')
     group.add_argument('--iX', action='store_true', dest='invert_x',
                        help='invert tile ordering along X')
@@ -120,6 +243,22 @@ Unless otherwise stated, all values are expected in px.
         setattr(args, 'overlap_h', args.overlap)
         setattr(args, 'overlap_v', args.overlap)
 
+    for opt in ['adaptive_z', 'incremental']:
+        if getattr(args, opt) and (args.worker or args.merge):
+            logger.error('Incompatible options: --{} and --worker, '
+                         '--merge'.format(opt.replace('_', '-')))
+            sys.exit(1)
+
+    if args.io_workers and args.backend == BACKEND_THREADS:
+        logger.error('Incompatible options: --io-workers and --backend '
+                     '{}'.format(BACKEND_THREADS))
+        sys.exit(1)
+
+    if args.pyramid_levels and args.engine != ENGINE_XCORR:
+        logger.error('Incompatible options: --pyramid and --engine {}'.format(
+            args.engine))
+        sys.exit(1)
+
     args.max_dx = int(round(args.max_dx / args.px_size_xy))
     args.max_dy = int(round(args.max_dy / args.px_size_xy))
     args.max_dz = int(round(args.max_dz / args.px_size_z))
@@ -138,52 +277,91 @@ Unless otherwise stated, all values are expected in px.
     return args
 
 
-def worker(item, overlap_dict, channel, max_dz, max_dy, max_dx):
-    aname = item['aname']
-    bname = item['bname']
-    z_frame = item['z_frame']
-    axis = item['axis']
-    overlap = overlap_dict[axis]
-
-    a = InputFile(aname)
-    b = InputFile(bname)
-
-    z_min = z_frame - max_dz
-    z_max = z_frame + max_dz + 1
-
-    aslice = a.zslice(z_min, z_max, copy=True)
-    if a.nchannels > 1:
-        if channel is not None:
-            aslice = aslice[:, channel]
-        else:
-            aslice = np.sum(aslice.astype(np.float32), axis=1)
-    if axis == 2:
-        aslice = np.rot90(aslice, axes=(-1, -2))
-    aslice = aslice[..., -(overlap + max_dy):, :]
-
-    bframe = b.zslice_idx(z_frame, copy=True)
-    if b.nchannels > 1:
-        if channel is not None:
-            bframe = bframe[:, channel]
-        else:
-            bframe = np.sum(bframe.astype(np.float32), axis=1)
-    if axis == 2:
-        bframe = np.rot90(bframe, axes=(-1, -2))
-    bframe = bframe[..., :overlap - max_dy, :]
-
-    aslice = aslice.astype(np.float32)
-    bframe = bframe.astype(np.float32)
-
-    output_shape = np.array(aslice.shape) + np.array((0, 0, 2 * max_dx)) - np.array(bframe.shape) + 1
-    output_shape[0] = aslice.shape[0]
-    xcorr = np.zeros(output_shape)
-
-    for i in range(xcorr.shape[0]):
-        cc, max_loc = align_dog(aslice[i], bframe[0], 0, max_dx)
-        xcorr[i] = cc
-
-    shift = list(np.unravel_index(np.argmax(xcorr), xcorr.shape))
-    score = xcorr[tuple(shift)]
+def init_worker_process(metadata_cache=True):
+    """Give the worker process its own cache of opened tiles."""
+    global _process_files
+    _process_files = InputFileCache(PROCESS_MAX_OPEN, metadata_cache)
+
+
+def worker(item, overlap_dict, channel, max_dz, max_dy, max_dx,
+           engine=ENGINE_XCORR, pyramid_levels=0, files=None):
+    """Read the overlapping bands of a pair and find the best shift.
+
+    If `files` (an :class:`.InputFileCache`) is specified, tiles are taken
+    from it instead of being opened and closed. In worker processes, the
+    cache of the process is used.
+    """
+    if files is None:
+        files = _process_files
+    overlap = overlap_dict[item['axis']]
+    a_key, b_key = band_keys(item, overlap, max_dz, max_dy,
+                             b_volume=(engine == ENGINE_PHASECORR))
+
+    timer = StageTimer.of(item)
+
+    # read only the overlapping band of each tile
+    bands = []
+    for name, key in [(item['aname'], a_key), (item['bname'], b_key)]:
+        with timer(STAGE_OPEN):
+            handle = InputFile(name) if files is None else files.open(name)
+        with handle as f:
+            with timer(STAGE_READ):
+                band = read_band(f, *key[1:], channel=channel, convert=False)
+            timer.bytes_read += band.nbytes
+        with timer(STAGE_CONVERT):
+            bands.append(band.astype(np.float32))
+    aslice, bframe = bands
+
+    if engine != ENGINE_PHASECORR and not pyramid_levels:
+        with timer(STAGE_DOG):
+            aslice = dog(aslice)
+            bframe = dog(bframe)
+
+    return correlate(item, aslice, bframe, max_dz, max_dy, max_dx, engine,
+                     pyramid_levels)
+
+
+def read_tile(func, fname, keys, channel=None, filtered=True,
+              metadata_cache=True):
+    """Extract the bands of a tile with `func`, timing its stages.
+
+    Returns
+    -------
+    tuple
+        ``(bands, timer)``, see :func:`.extract_borders`.
+    """
+    timer = StageTimer()
+    return func(fname, keys, channel, filtered, timer=timer,
+                metadata_cache=metadata_cache), timer
+
+
+def correlate(item, a_band, b_band, max_dz, max_dy, max_dx,
+              engine=ENGINE_XCORR, pyramid_levels=0):
+    """Find the best shift between two bands.
+
+    Parameters
+    ----------
+    item : dict
+        Work item, results are stored in keys `score`, `dz`, `dy`, `dx`.
+    a_band : :class:`numpy.ndarray`
+        Band of the first tile over the whole Z search window.
+    b_band : :class:`numpy.ndarray`
+        Band of the second tile at `z_frame` (a single frame), or over the
+        whole Z search window for engine `phasecorr`.
+
+        Bands are expected DoG-filtered, except for engine `phasecorr` and
+        for coarse-to-fine search.
+    max_dz, max_dy, max_dx : int
+        Maximum shifts.
+    engine : str
+        Alignment engine.
+    pyramid_levels : int
+        If nonzero, use a coarse-to-fine search with this number of
+        downsampling levels.
+    """
+    with StageTimer.of(item)(STAGE_CORRELATE):
+        shift, score = _correlate(a_band, b_band, max_dz, max_dy, max_dx,
+                                  engine, pyramid_levels)
     if score < 0 or score > 1:
         score = 0
 
@@ -195,12 +373,41 @@ def worker(item, overlap_dict, channel, max_dz, max_dy, max_dx):
     return item
 
 
+def _correlate(a_band, b_band, max_dz, max_dy, max_dx, engine,
+               pyramid_levels):
+    if engine == ENGINE_PHASECORR:
+        *shift, score = align_phasecorr(a_band, b_band, max_dz, max_dy, max_dx)
+    elif pyramid_levels:
+        *shift, score = align_pyramid(a_band, b_band, max_dz, max_dy, max_dx,
+                                      pyramid_levels)
+    else:
+        # (dz, dy, dx) score volume, all planes at once
+        xcorr = crossCorrStack(a_band, b_band[0], 0, max_dx)
+
+        shift = list(np.unravel_index(np.argmax(xcorr), xcorr.shape))
+        score = xcorr[tuple(shift)]
+    return shift, score
+
+
 class Runner(object):
     def __init__(self):
         self.channel = None
         self.processing_list = None
         self.fut_q = None
         self.output_q = None
+        self.journal = None
+        self.n_resumed = 0
+        self.timing = None
+        self.backend = BACKEND_PROCESSES
+        self.files = None
+        self.timing_file = None
+        self.shard_size = 100
+        self.io_workers = None
+        self.adaptive_z = False
+        self.incremental = None
+        self.fingerprints = None
+        self.min_score = 0.8
+        self.shift_tolerance = 2
         self.input_folder = None
         self.output_file = None
         self.z_samples = None
@@ -214,23 +421,34 @@ class Runner(object):
         self.ascending_tiles_y = True
         self.recursive = False
         self.equal_shape = False
+        self.metadata_cache = True
         self.df = None
         self.fm = None
         self.px_size_xy = 1
         self.px_size_z = 1
         self.n_of_workers = None
+        self.border_cache_size = None
+        self.border_cache_dir = None
+        self.engine = ENGINE_XCORR
+        self.pyramid_levels = 0
 
     @property
     def overlap_dict(self):
         return {1: self.overlap_v, 2: self.overlap_h}
 
+    @property
+    def bands_filtered(self):
+        """Whether correlation expects DoG-filtered bands."""
+        return self.engine != ENGINE_PHASECORR and not self.pyramid_levels
+
     def initialize_list(self):
         fm = FileMatrix(self.input_folder, self.ascending_tiles_x, self.ascending_tiles_y,
-                        recursive=self.recursive, equal_shape=self.equal_shape)
+                        recursive=self.recursive, equal_shape=self.equal_shape,
+                        metadata_cache=self.metadata_cache)
         self.fm = fm
 
         if self.z_samples > 1 and self.z_stride is None:
-            self.z_stride = ((fm.data_frame.iloc[0].nfrms - self.max_dz * self.z_samples) // self.z_samples).item()
+            self.z_stride = int((fm.data_frame.iloc[0].nfrms - self.max_dz * self.z_samples) // self.z_samples)
 
         if self.z_stride is None:
             self.z_stride = 0
@@ -278,16 +496,253 @@ class Runner(object):
                         atile = btile
         self.processing_list = mylist
 
+    @property
+    def max_in_flight(self):
+        """Maximum number of futures submitted to the executor at a time."""
+        return 2 * (self.n_of_workers or os.cpu_count())
+
+    def executor(self):
+        """Executor running the alignment jobs, see :attr:`backend`."""
+        if self.backend == BACKEND_THREADS:
+            return concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.n_of_workers or os.cpu_count())
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.n_of_workers, initializer=init_worker_process,
+            initargs=(self.metadata_cache,))
+
     def keep_filling_fut_queue(self):
-        e = concurrent.futures.ProcessPoolExecutor(max_workers=self.n_of_workers)
+        """Submit work items, keeping at most :attr:`max_in_flight` pending.
+
+        Items are submitted in locality order (see :func:`.schedule`), so
+        that pairs sharing a tile are aligned close in time. Futures are put
+        in :attr:`fut_q` in completion order.
+        """
+        e = self.executor()
+
+        items = iter(schedule(self.processing_list, self.fm.name_array))
+        pending = set()
+        while True:
+            for item in items:
+                pending.add(e.submit(
+                    worker, item, self.overlap_dict, self.channel, self.max_dz,
+                    self.max_dy, self.max_dx, self.engine, self.pyramid_levels,
+                    self.files))
+                if len(pending) >= self.max_in_flight:
+                    break
+
+            if not pending:
+                break
+
+            done, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for fut in done:
+                self.fut_q.put(fut)
 
-        for item in self.processing_list:
-            self.fut_q.put(e.submit(worker, item, self.overlap_dict, self.channel, self.max_dz, self.max_dy, self.max_dx))
+        e.shutdown()
+        self.fut_q.put(None)
+
+    def plan_bands(self):
+        """Bands needed by the work items in :attr:`processing_list`.
+
+        Returns
+        -------
+        tuple
+            ``(item_keys, items_by_tile, keys_by_tile, refcount)``: the pair
+            of band keys of each item, the indices of the items using each
+            tile, the band keys of each tile, and the number of items using
+            each band.
+        """
+        item_keys = []
+        items_by_tile = {}
+        keys_by_tile = {}
+        for i, item in enumerate(self.processing_list):
+            keys = band_keys(item, self.overlap_dict[item['axis']],
+                             self.max_dz, self.max_dy,
+                             b_volume=(self.engine == ENGINE_PHASECORR))
+            item_keys.append(keys)
+            for k in keys:
+                items_by_tile.setdefault(k[0], []).append(i)
+                keys_by_tile.setdefault(k[0], set()).add(k)
+
+        refcount = {}
+        for keys in item_keys:
+            for k in keys:
+                refcount[k] = refcount.get(k, 0) + 1
+
+        return item_keys, items_by_tile, keys_by_tile, refcount
+
+    def tile_order(self, keys_by_tile):
+        """Order in which tiles are read, along a Hilbert curve."""
+        return [t for t in tile_order(self.fm.name_array)
+                if t in keys_by_tile]
+
+    def keep_filling_fut_queue_with_border_cache(self):
+        """Extract and filter tile borders once, then correlate pairs.
+
+        Tiles are read along a Hilbert curve. As soon as both bands of a pair
+        are available, the pair is submitted for correlation and its bands
+        are released from the cache. Reading of new tiles is throttled when the
+        cache exceeds its memory budget or when too many futures are pending.
+        Futures are put in :attr:`fut_q` in completion order.
+        """
+        e = self.executor()
+        cache = BorderCache(int(self.border_cache_size * 1024 ** 2),
+                            self.border_cache_dir)
+
+        item_keys, items_by_tile, keys_by_tile, refcount = self.plan_bands()
+
+        def take(key):
+            refcount[key] -= 1
+            if refcount[key]:
+                band = cache.pop(key)
+                cache[key] = band
+                return band
+            return cache.pop(key)
+
+        tiles = self.tile_order(keys_by_tile)
+        done_tiles = set()
+        pending = set()  # tiles being read
+        in_flight = set()  # pairs being correlated
+
+        while tiles or pending or in_flight:
+            while tiles and len(pending) + len(in_flight) < self.max_in_flight \
+                    and (cache.currsize < cache.maxsize or not pending):
+                t = tiles.pop(0)
+                pending.add(e.submit(read_tile, extract_borders, t,
+                                     sorted(keys_by_tile[t]), self.channel,
+                                     self.bands_filtered, self.metadata_cache))
+
+            done, _ = concurrent.futures.wait(
+                pending | in_flight,
+                return_when=concurrent.futures.FIRST_COMPLETED)
+
+            for fut in done:
+                if fut in in_flight:
+                    in_flight.remove(fut)
+                    self.fut_q.put(fut)
+                    continue
+
+                pending.remove(fut)
+                bands, timer = fut.result()
+                for k, band in bands.items():
+                    cache[k] = band
+
+                tile = next(iter(bands))[0]
+                done_tiles.add(tile)
+                self.timing.add_tile(tile, timer)
+
+                for i in items_by_tile[tile]:
+                    item = self.processing_list[i]
+                    a_key, b_key = item_keys[i]
+                    if a_key[0] not in done_tiles or b_key[0] not in done_tiles:
+                        continue
+
+                    if a_key in cache and b_key in cache:
+                        f = e.submit(correlate, item, take(a_key), take(b_key),
+                                     self.max_dz, self.max_dy, self.max_dx,
+                                     self.engine, self.pyramid_levels)
+                    else:  # evicted from cache, read again
+                        for k in (a_key, b_key):
+                            if k in cache:
+                                take(k)
+                        f = e.submit(worker, item, self.overlap_dict, self.channel,
+                                     self.max_dz, self.max_dy, self.max_dx,
+                                     self.engine, self.pyramid_levels,
+                                     self.files)
+                    in_flight.add(f)
+
+        if cache.dropped:
+            logger.warning('border cache: {} bands exceeded the memory budget, '
+                           'affected pairs were read again'.format(cache.dropped))
+
+        e.shutdown()
+        self.fut_q.put(None)
 
+    def keep_filling_fut_queue_shared(self):
+        """Read tile borders in dedicated processes, correlate in others.
+
+        :attr:`io_workers` reader processes extract the bands of each tile
+        into shared memory, :attr:`n_of_workers` processes correlate pairs
+        using the bands in place. Tiles are read along a Hilbert curve,
+        reading is throttled when the bands held in shared memory exceed
+        :attr:`border_cache_size` (MB). Futures are put in :attr:`fut_q` in
+        completion order.
+        """
+        start_resource_tracker()
+        readers = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.io_workers)
+        e = concurrent.futures.ProcessPoolExecutor(max_workers=self.n_of_workers)
+        max_bytes = (self.border_cache_size or DEFAULT_SHM_BUDGET) * 1024 ** 2
+
+        item_keys, items_by_tile, keys_by_tile, refcount = self.plan_bands()
+
+        shared = {}
+        tiles = self.tile_order(keys_by_tile)
+        done_tiles = set()
+        pending = set()  # tiles being read
+        in_flight = {}  # pairs being correlated, with their band keys
+
+        def shared_bytes():
+            return sum(b.nbytes for b in shared.values())
+
+        def release(key):
+            refcount[key] -= 1
+            if not refcount[key]:
+                shared.pop(key).unlink()
+
+        try:
+            while tiles or pending or in_flight:
+                while tiles and len(pending) < 2 * self.io_workers and (
+                        shared_bytes() < max_bytes
+                        or not (pending or in_flight)):
+                    t = tiles.pop(0)
+                    pending.add(readers.submit(
+                        read_tile, extract_borders_shared, t,
+                        sorted(keys_by_tile[t]), self.channel,
+                        self.bands_filtered, self.metadata_cache))
+
+                done, _ = concurrent.futures.wait(
+                    pending | set(in_flight),
+                    return_when=concurrent.futures.FIRST_COMPLETED)
+
+                for fut in done:
+                    if fut in in_flight:
+                        for k in in_flight.pop(fut):
+                            release(k)
+                        self.fut_q.put(fut)
+                        continue
+
+                    pending.remove(fut)
+                    bands, timer = fut.result()
+                    shared.update(bands)
+
+                    tile = next(iter(bands))[0]
+                    done_tiles.add(tile)
+                    self.timing.add_tile(tile, timer)
+
+                    for i in items_by_tile[tile]:
+                        item = self.processing_list[i]
+                        a_key, b_key = item_keys[i]
+                        if a_key[0] not in done_tiles \
+                                or b_key[0] not in done_tiles:
+                            continue
+
+                        f = e.submit(call_shared, correlate, item,
+                                     shared[a_key], shared[b_key],
+                                     self.max_dz, self.max_dy, self.max_dx,
+                                     self.engine, self.pyramid_levels)
+                        in_flight[f] = (a_key, b_key)
+        finally:
+            for b in shared.values():
+                b.unlink()
+
+        readers.shutdown()
+        e.shutdown()
         self.fut_q.put(None)
 
     def output_worker(self):
         i = 1
+        total = self.n_resumed + len(self.processing_list)
         while True:
             fut = self.fut_q.get()
             if fut is None:
@@ -295,8 +750,10 @@ class Runner(object):
                 break
 
             item = fut.result()
+            self.timing.add(item)
+            self.journal.append(item)
 
-            progress = 100 * i / len(self.processing_list)
+            progress = 100 * (self.n_resumed + i) / total
             aname = item['aname']
             bname = item['bname']
             z_frame = item['z_frame']
@@ -309,26 +766,140 @@ class Runner(object):
 
             i += 1
 
-    def run(self):
+    def check_output_dir(self):
         out_dir = os.path.dirname(os.path.abspath(self.output_file))
         if not os.access(out_dir, os.W_OK):
             raise ValueError('cannot write to {}'.format(self.output_file))
 
-        self.initialize_list()
+    def align(self, items, journal_file, known=None):
+        """Align the given work items, recording results in a journal.
+
+        Items already having a result in `journal_file` or in `known` are
+        skipped.
+
+        Returns
+        -------
+        dict
+            Results, including those found in the journal, by
+            :func:`.item_key`.
+        """
         self.fut_q = queue.Queue()
         self.output_q = queue.Queue()
+        if self.timing is None:
+            self.timing = TimingReport(self.timing_file)
+
+        # skip pairs already aligned by an interrupted run
+        self.journal = Journal(journal_file, self.journal_params)
+        resumed = dict(known or {})
+        resumed.update(self.journal.load())
+        self.processing_list = [
+            item for item in items if item_key(item) not in resumed]
+        self.n_resumed = len(items) - len(self.processing_list)
+        if self.n_resumed:
+            logger.info('{} of {} pairs already aligned'.format(
+                self.n_resumed, len(items)))
 
         t = threading.Thread(target=self.output_worker)
         t.start()
 
-        self.keep_filling_fut_queue()
+        if self.backend == BACKEND_THREADS:
+            files = InputFileCache(metadata_cache=self.metadata_cache)
+            with files as self.files, \
+                    limit_threads(self.n_of_workers or os.cpu_count()):
+                self.fill_fut_queue()
+            self.files = None
+        else:
+            self.fill_fut_queue()
 
         # block until all tasks are done
         self.fut_q.join()
-
-        df = pd.DataFrame(self.output_q.queue)
-        self.df = df
-
+        self.journal.close()
+        self.processing_list = items
+
+        results = dict(resumed)
+        results.update((item_key(item), item) for item in self.output_q.queue)
+        return results
+
+    def fill_fut_queue(self):
+        if self.io_workers:
+            self.keep_filling_fut_queue_shared()
+        elif self.border_cache_size:
+            self.keep_filling_fut_queue_with_border_cache()
+        else:
+            self.keep_filling_fut_queue()
+
+    def align_adaptive(self, journal_file, known=None):
+        """Align with adaptive Z sampling.
+
+        Samples of each pair are taken in rounds, starting from the one
+        closest to the center of the stack. After each round, a new sample
+        is scheduled only for pairs needing it, see
+        :meth:`needs_more_samples`.
+
+        Returns
+        -------
+        dict
+            Results by :func:`.item_key`, only for the samples taken.
+        """
+        full_list = self.processing_list
+
+        samples = {}
+        for item in full_list:
+            k = (item['aname'], item['bname'], item['axis'])
+            samples.setdefault(k, []).append(item)
+        for s in samples.values():
+            center = np.mean([item['z_frame'] for item in s])
+            s.sort(key=lambda item: (abs(item['z_frame'] - center),
+                                     item['z_frame']))
+
+        results = {}
+        items = [s[0] for s in samples.values()]
+        while items:
+            results.update(self.align(items, journal_file, known))
+
+            items = []
+            for s in samples.values():
+                taken = [results[item_key(i)] for i in s
+                         if item_key(i) in results]
+                missing = [i for i in s if item_key(i) not in results]
+                if missing and self.needs_more_samples(taken):
+                    items.append(missing[0])
+
+        self.processing_list = full_list
+        n_taken = sum(item_key(item) in results for item in full_list)
+        logger.info('adaptive Z sampling: {} of {} samples taken'.format(
+            n_taken, len(full_list)))
+        return results
+
+    def needs_more_samples(self, items):
+        """Whether the samples taken for a pair are not conclusive.
+
+        This is the case when no sample reaches :attr:`min_score`, or when
+        the shifts of the samples reaching it differ by more than
+        :attr:`shift_tolerance` along any axis.
+        """
+        good = [item for item in items if item['score'] >= self.min_score]
+        if not good:
+            return True
+
+        shifts = np.array([[item['dz'], item['dy'], item['dx']]
+                           for item in good])
+        spread = shifts.max(axis=0) - shifts.min(axis=0)
+        return spread.max() > self.shift_tolerance
+
+    def finalize(self, results):
+        """Compute absolute positions from pair results and save them.
+
+        Items of :attr:`processing_list` without a result (samples skipped
+        by adaptive sampling) are ignored.
+        """
+        self.df = pd.DataFrame([results[item_key(item)]
+                                for item in self.processing_list
+                                if item_key(item) in results])
+        self.compute_positions()
+
+    def compute_positions(self):
+        """Compute absolute positions from :attr:`df` and save them."""
         xcorr_fm = XcorrFileMatrix.from_data(self.xcorr_options, self.df)
         xcorr_fm.aggregate_results()
 
@@ -340,13 +911,157 @@ class Runner(object):
         self.save_results_to_file()
 
         cols = ['score', 'dz', 'dy', 'dx']
-        print(df[cols].describe())
+        print(self.df[cols].describe())
+
+    def align_pairs(self):
+        """Align all pairs of tiles, the first step of :meth:`run`.
+
+        Returns
+        -------
+        dict
+            Results by :func:`.item_key`.
+        """
+        self.check_output_dir()
+        self.initialize_list()
+
+        self.fingerprints = fingerprints(list(self.fm.data_frame.index))
+        known = None
+        if self.incremental is not None:
+            known = self.reusable_results(self.incremental)
+
+        if self.adaptive_z:
+            results = self.align_adaptive(self.journal_file, known)
+        else:
+            results = self.align(self.processing_list, self.journal_file, known)
+        self.report_timing()
+        return results
+
+    def run(self):
+        self.finalize(self.align_pairs())
+        self.journal.remove()
+
+    def reusable_results(self, fname):
+        """Results of a previous run still valid for the current tiles.
+
+        Results are reused for pairs whose tiles have the same fingerprint
+        as in the previous run, provided that the alignment parameters are
+        the same.
+
+        Parameters
+        ----------
+        fname : str
+            Output file of a previous run.
+
+        Returns
+        -------
+        dict
+            Results by :func:`.item_key`.
+        """
+        y = project.read(fname)
+
+        if 'fingerprints' not in y:
+            logger.warning('{} has no tile fingerprints, aligning all '
+                           'pairs'.format(fname))
+            return {}
+
+        params = self.journal_params
+        old_params = dict(y['xcorr-options'])
+        old_params.setdefault('channel', None)
+        changed = [k for k in params if old_params.get(k) != params[k]]
+        if changed:
+            logger.warning('alignment options changed since {} ({}), '
+                           'aligning all pairs'.format(fname,
+                                                       ', '.join(changed)))
+            return {}
+
+        old_fingerprints = y['fingerprints']
+        same = {name for name, fp in self.fingerprints.items()
+                if old_fingerprints.get(name) == fp}
+        logger.info('incremental alignment: {} of {} tiles unchanged since '
+                    '{}'.format(len(same), len(self.fingerprints), fname))
+
+        return {item_key(r): r for r in y['xcorr'].to_dict('records')
+                if r['aname'] in same and r['bname'] in same}
+
+    def work_queue(self, create=False):
+        items = schedule(self.processing_list, self.fm.name_array)
+        wq = WorkQueue(self.work_queue_dir, len(items),
+                       self.shard_size if create else None)
+        return wq, items
+
+    def run_worker(self):
+        """Claim and align shards of the work queue until none is left."""
+        self.check_output_dir()
+        self.initialize_list()
+
+        wq, items = self.work_queue(create=True)
+        for i in wq.claim():
+            shard = wq.shard(items, i)
+            logger.info('worker {}: aligning shard {} of {}'.format(
+                os.getpid(), i + 1, wq.n_shards))
+            self.align(shard, wq.journal_path(i))
+            wq.mark_done(i)
+
+        self.processing_list = items
+        self.report_timing()
+
+    def report_timing(self):
+        """Log a summary of per-stage timings and save per-item timings."""
+        if self.timing is None or not self.timing.records:
+            return
+        logger.info('time spent per stage:\n' + self.timing.summary())
+        if self.timing_file is not None:
+            self.timing.dump()
+            logger.info('per-item timings saved to {}'.format(
+                self.timing_file))
+
+    def run_merge(self):
+        """Collect the results of all shards and compute positions."""
+        self.check_output_dir()
+        self.initialize_list()
+
+        wq, _ = self.work_queue()
+        pending = wq.pending()
+        if pending:
+            raise ValueError(
+                '{} shards of {} are not done: {}. Run more workers, removing '
+                'the lock files of crashed ones'.format(
+                    len(pending), wq.n_shards, wq.directory))
+
+        results = wq.load_results(self.journal_params)
+        missing = [i for i in self.processing_list
+                   if item_key(i) not in results]
+        if missing:
+            raise ValueError('{} pairs have no result in {}'.format(
+                len(missing), wq.directory))
+
+        self.fingerprints = fingerprints(list(self.fm.data_frame.index))
+        self.finalize(results)
+        shutil.rmtree(wq.directory)
+
+    @property
+    def work_queue_dir(self):
+        return self.output_file + '.queue'
+
+    @property
+    def journal_file(self):
+        return self.output_file + '.journal'
+
+    @property
+    def journal_params(self):
+        """Parameters affecting the alignment of a single pair."""
+        params = self.xcorr_options
+        for k in ['adaptive_z', 'min_score', 'shift_tolerance']:
+            del params[k]
+        return params
 
     @property
     def xcorr_options(self):
         attrs = ['max_dx', 'max_dy', 'max_dz', 'overlap_v', 'overlap_h',
                  'ascending_tiles_x', 'ascending_tiles_y', 'px_size_xy',
-                 'px_size_z', 'z_samples', 'z_stride']
+                 'px_size_z', 'z_samples', 'z_stride', 'engine',
+                 'pyramid_levels', 'adaptive_z', 'min_score',
+                 'shift_tolerance', 'channel']
 
         options = {}
         for attr in attrs:
@@ -355,15 +1070,17 @@ class Runner(object):
         return options
 
     def save_results_to_file(self):
-        self.fm.save_to_yaml(self.output_file, 'w')
+        y = {
+            'filematrix': self.fm.get_table(),
+            'xcorr-options': self.xcorr_options,
+            'xcorr': self.df,
+            'fuser-options': {'abs_mode': ABS_MODE_MAXIMUM_SCORE},
+        }
+        if self.fingerprints is not None:
+            y['fingerprints'] = self.fingerprints
 
-        with open(self.output_file, 'a') as f:
-            yaml.dump(
-                {
-                    'xcorr-options': self.xcorr_options,
-                    'xcorr': json.loads(self.df.to_json(orient='records')),
-                    'fuser-options': {'abs_mode': ABS_MODE_MAXIMUM_SCORE},
-                }, f, default_flow_style=False)
+        logger.info('writing {}'.format(self.output_file))
+        project.write(self.output_file, y)
 
 
 def main():
@@ -374,13 +1091,22 @@ def main():
     keys = ['input_folder', 'output_file', 'channel', 'max_dx', 'max_dy',
             'max_dz', 'z_samples', 'z_stride', 'overlap_v', 'overlap_h',
             'ascending_tiles_x', 'ascending_tiles_y', 'px_size_xy',
-            'px_size_z', 'n_of_workers', 'recursive', 'equal_shape']
+            'px_size_z', 'n_of_workers', 'recursive', 'equal_shape',
+            'border_cache_size', 'border_cache_dir', 'engine',
+            'pyramid_levels', 'shard_size', 'io_workers', 'adaptive_z',
+            'min_score', 'shift_tolerance', 'incremental', 'timing_file',
+            'backend', 'metadata_cache']
 
     for key in keys:
         setattr(r, key, getattr(arg, key))
 
     t = time.time()
-    r.run()
+    if arg.worker:
+        r.run_worker()
+    elif arg.merge:
+        r.run_merge()
+    else:
+        r.run()
     elapsed = timedelta(seconds=time.time() - t)
     logger.info(f'elapsed  time: {elapsed}')
 
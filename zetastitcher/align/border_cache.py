@@ -0,0 +1,251 @@
+"""Extract, filter and cache the borders of each tile.
+
+Every interior tile takes part in four pairs, each one needing a different
+border band of the tile. Instead of opening and decoding the tile once per
+pair, the bands needed by all pairs are extracted from a single read of the
+tile and DoG-filtered once. Filtered bands are kept in a :class:`BorderCache`
+until the corresponding pair is correlated.
+
+Bands are stored in a canonical orientation where rows run along the
+stitching axis, i.e. bands taken from the east or west border are rotated as
+in :func:`zetastitcher.align.__main__.worker`.
+"""
+
+import os
+import hashlib
+import logging
+
+import numpy as np
+from cachetools import LRUCache
+
+from zetastitcher.io.inputfile import InputFile
+from zetastitcher.align.dog import dog
+from zetastitcher.align.timing import (
+    StageTimer, STAGE_OPEN, STAGE_READ, STAGE_CONVERT, STAGE_DOG)
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+NORTH = 'n'
+SOUTH = 's'
+WEST = 'w'
+EAST = 'e'
+
+
+def band_keys(item, overlap, max_dz, max_dy, b_volume=False):
+    """Cache keys of the two bands needed to correlate a pair.
+
+    Parameters
+    ----------
+    item : dict
+        A work item, with keys `aname`, `bname`, `z_frame`, `axis`.
+    overlap : int
+        Nominal overlap along the stitching axis.
+    max_dz, max_dy : int
+        Maximum shifts.
+    b_volume : bool
+        If True, the band of the second tile spans the same Z range and has
+        the same depth as the band of the first tile (as needed for 3D phase
+        correlation), otherwise it is a single frame.
+
+    Returns
+    -------
+    tuple
+        ``(a_key, b_key)``, each one in the form ``(name, side, depth,
+        z_from, z_to)``.
+    """
+    z_frame = item['z_frame']
+    if item['axis'] == 2:
+        a_side, b_side = EAST, WEST
+    else:
+        a_side, b_side = SOUTH, NORTH
+
+    a_key = (item['aname'], a_side, overlap + max_dy,
+             z_frame - max_dz, z_frame + max_dz + 1)
+    if b_volume:
+        b_key = (item['bname'], b_side) + a_key[2:]
+    else:
+        b_key = (item['bname'], b_side, overlap - max_dy, z_frame, z_frame + 1)
+    return a_key, b_key
+
+
+def to_single_channel(a, infile, channel):
+    """Select `channel`, or sum all channels if `channel` is None."""
+    if infile.nchannels > 1:
+        if channel is not None:
+            a = a[:, channel]
+        else:
+            a = np.sum(a.astype(np.float32), axis=1)
+    return a
+
+
+def read_band(infile, side, depth, z_from, z_to, channel=None, convert=True):
+    """Read a border band of `infile`, reading only the band itself.
+
+    The band is converted to float32, unless `convert` is False.
+    """
+    band = slice(-depth, None) if side in [SOUTH, EAST] else slice(None, depth)
+    if side in [EAST, WEST]:
+        a = infile.roi(z_from, z_to, x=band)
+    else:
+        a = infile.roi(z_from, z_to, y=band)
+
+    a = to_single_channel(a, infile, channel)
+    if side in [EAST, WEST]:
+        a = np.rot90(a, axes=(-1, -2))
+    if not convert:
+        return a
+    return a.astype(np.float32)
+
+
+def extract_borders(fname, keys, channel=None, filtered=True, timer=None,
+                    metadata_cache=True):
+    """Open a tile once and return all the requested DoG-filtered bands.
+
+    Only the bands are read from the file (see :func:`read_band`). Bands on
+    the same side with overlapping Z ranges are read at once.
+
+    Parameters
+    ----------
+    fname : str
+        Tile file name.
+    keys : list
+        Band keys, see :func:`band_keys`.
+    channel : int
+    filtered : bool
+        If False, bands are returned without DoG filtering.
+    timer : :class:`.StageTimer`
+        If specified, time spent in each stage is added to it.
+    metadata_cache : bool
+        Whether to open the tile with the metadata cache.
+
+    Returns
+    -------
+    dict
+        Filtered bands, by key.
+    """
+    if timer is None:
+        timer = StageTimer()
+
+    out = {}
+    with timer(STAGE_OPEN):
+        infile = InputFile(fname, metadata_cache)
+    with infile:
+        by_side = {}
+        for key in keys:
+            by_side.setdefault(key[1:3], []).append(key)
+
+        for (side, depth), side_keys in by_side.items():
+            for z_from, z_to in _merge_ranges([k[3:5] for k in side_keys]):
+                with timer(STAGE_READ):
+                    band = read_band(infile, side, depth, z_from, z_to,
+                                     channel, convert=False)
+                timer.bytes_read += band.nbytes
+                for key in side_keys:
+                    k_from, k_to = key[3:5]
+                    if k_from < z_from or k_to > z_to:
+                        continue
+                    a = band[k_from - z_from:k_to - z_from]
+                    with timer(STAGE_CONVERT):
+                        a = a.astype(np.float32)
+                    if filtered:
+                        with timer(STAGE_DOG):
+                            a = dog(a)
+                    out[key] = a
+    return out
+
+
+def _merge_ranges(ranges):
+    merged = []
+    for start, stop in sorted(set(ranges)):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], stop)
+        else:
+            merged.append([start, stop])
+    return merged
+
+
+class _SpillingLRUCache(LRUCache):
+    def __init__(self, maxsize, spill):
+        super().__init__(maxsize, getsizeof=lambda a: a.nbytes)
+        self.spill = spill
+
+    def popitem(self):
+        key, value = super().popitem()
+        self.spill(key, value)
+        return key, value
+
+
+class BorderCache:
+    """Bounded cache of filtered border bands.
+
+    Bands are kept in memory up to `max_bytes`. Least recently used bands
+    exceeding the budget are written to `directory` if specified, or dropped
+    otherwise.
+
+    Parameters
+    ----------
+    max_bytes : int
+        Memory budget in bytes.
+    directory : str
+        Directory used to spill bands to disk.
+    """
+    def __init__(self, max_bytes, directory=None):
+        self.directory = directory
+        self._mem = _SpillingLRUCache(max_bytes, self._spill)
+        self._on_disk = set()
+        self.dropped = 0
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __contains__(self, key):
+        return key in self._mem or key in self._on_disk
+
+    def __len__(self):
+        return len(self._mem) + len(self._on_disk)
+
+    def __setitem__(self, key, value):
+        try:
+            self._mem[key] = value
+        except ValueError:  # larger than the whole budget
+            self._spill(key, value)
+
+    @property
+    def currsize(self):
+        """Bytes currently held in memory."""
+        return self._mem.currsize
+
+    @property
+    def maxsize(self):
+        return self._mem.maxsize
+
+    def pop(self, key, default=None):
+        """Remove `key` from the cache and return its band."""
+        try:
+            return self._mem.pop(key)
+        except KeyError:
+            pass
+
+        if key not in self._on_disk:
+            return default
+
+        self._on_disk.remove(key)
+        path = self._path(key)
+        a = np.load(path)
+        os.remove(path)
+        return a
+
+    def _spill(self, key, value):
+        if self.directory is None:
+            self.dropped += 1
+            logger.debug('border cache full, dropping {}'.format(key))
+            return
+        path = self._path(key)
+        np.save(path + '.tmp.npy', value)
+        os.replace(path + '.tmp.npy', path)
+        self._on_disk.add(key)
+
+    def _path(self, key):
+        h = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.directory, h + '.npy')
@@ -1,21 +1,181 @@
+import logging
+from functools import lru_cache
+
 import cv2 as cv
+import scipy.fft
 
 import numpy as np
 
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+METHOD_AUTO = 'auto'
+METHOD_DIRECT = 'direct'
+METHOD_SEPARABLE = 'separable'
+METHOD_FFT = 'fft'
+
+METHODS = [METHOD_AUTO, METHOD_DIRECT, METHOD_SEPARABLE, METHOD_FFT]
+
+# relative cost of an FFT butterfly vs. a multiply-accumulate in a separable
+# pass (empirical, OpenCV sepFilter2D vs. scipy.fft)
+_FFT_COST_FACTOR = 4
+
 
 def twoD_gaussian_kernel(ksize, sigma):
     filter = cv.getGaussianKernel(ksize, sigma)
     return cv.mulTransposed(filter, False)
 
 
-def dog(image, ksize=100, sigma1=5, sigma2=10):
+@lru_cache()
+def gaussian_kernel_1d(ksize, sigma):
+    """L1-normalized 1D Gaussian kernel (float32, shape ``(ksize, 1)``)."""
+    k = cv.getGaussianKernel(ksize, sigma, ktype=cv.CV_32F)
+    cv.normalize(k, k, 1, 0, cv.NORM_L1)
+    k.setflags(write=False)
+    return k
+
+
+@lru_cache()
+def dog_kernel(ksize, sigma1, sigma2):
+    """Dense 2D Difference of Gaussians kernel."""
     filter1 = twoD_gaussian_kernel(ksize, sigma1)
     filter2 = twoD_gaussian_kernel(ksize, sigma2)
     cv.normalize(filter1, filter1, 1, 0, cv.NORM_L1)
     cv.normalize(filter2, filter2, 1, 0, cv.NORM_L1)
     filter = filter1 - filter2
+    filter.setflags(write=False)
+    return filter
+
+
+class DoGFilter:
+    """Difference of Gaussians filter with cached kernels.
+
+    The DoG kernel is the difference of two separable Gaussian kernels,
+    therefore it can be applied as two pairs of 1D passes (`separable`) or as
+    a single product in the Fourier domain (`fft`). With method `auto`, the
+    cheapest of the two is chosen depending on the plane size. Both methods
+    reproduce the result of :func:`cv2.filter2D` with the dense kernel
+    (`direct`) within float tolerance, including border handling
+    (``BORDER_REFLECT_101``).
+
+    Parameters
+    ----------
+    ksize : int
+        Kernel size.
+    sigma1, sigma2 : float
+        Standard deviations of the two Gaussian kernels.
+    method : str
+        One of ``'auto'``, ``'direct'``, ``'separable'``, ``'fft'``.
+    """
+    def __init__(self, ksize=100, sigma1=5, sigma2=10, method=METHOD_AUTO):
+        if method not in METHODS:
+            raise ValueError('invalid method {}'.format(method))
+        self.ksize = ksize
+        self.sigma1 = sigma1
+        self.sigma2 = sigma2
+        self.method = method
+
+    def __call__(self, image):
+        """Filter a single plane or a stack of planes (ZYX).
+
+        Parameters
+        ----------
+        image : :class:`numpy.ndarray`
+            2D or 3D array. Filtering is performed on the last two axes.
+
+        Returns
+        -------
+        :class:`numpy.ndarray`
+            Filtered array of the same shape. Floating point images keep
+            their dtype, other images are processed as with
+            :func:`cv2.filter2D` (i.e. with saturation).
+        """
+        method = self.choose_method(image.shape[-2:], image.dtype)
+
+        if method == METHOD_FFT:
+            return self._fft(image)
+
+        if image.ndim == 2:
+            return self._filter_plane(image, method)
+
+        out = np.empty_like(image)
+        for i in range(image.shape[0]):
+            out[i] = self._filter_plane(image[i], method)
+        return out
+
+    def choose_method(self, plane_shape, dtype=np.float32):
+        if not np.issubdtype(dtype, np.floating):
+            return METHOD_DIRECT
+        if self.method != METHOD_AUTO:
+            return self.method
+        return _choose_method(tuple(plane_shape), self.ksize)
+
+    @property
+    def kernel(self):
+        return dog_kernel(self.ksize, self.sigma1, self.sigma2)
+
+    @property
+    def anchor(self):
+        return self.ksize // 2
+
+    def _filter_plane(self, image, method):
+        if method == METHOD_DIRECT:
+            return cv.filter2D(image, -1, self.kernel)
+
+        k1 = gaussian_kernel_1d(self.ksize, self.sigma1)
+        k2 = gaussian_kernel_1d(self.ksize, self.sigma2)
+        out = cv.sepFilter2D(image, -1, k1, k1)
+        out -= cv.sepFilter2D(image, -1, k2, k2)
+        return out
+
+    def _fft(self, image):
+        ksize = self.ksize
+        a = self.anchor
+        b = ksize - 1 - a
+
+        padding = ((0, 0),) * (image.ndim - 2) + ((a, b), (a, b))
+        padded = np.pad(image, padding, mode='reflect')
+
+        fft_shape = tuple(scipy.fft.next_fast_len(s, real=True)
+                          for s in padded.shape[-2:])
+        kernel_fft = self._kernel_fft(fft_shape)
 
-    return cv.filter2D(image, -1, filter)
+        out = scipy.fft.rfft2(padded, s=fft_shape)
+        out *= kernel_fft
+        out = scipy.fft.irfft2(out, s=fft_shape)
+
+        # keep only the part not affected by circular wrap-around
+        out = out[..., ksize - 1:padded.shape[-2], ksize - 1:padded.shape[-1]]
+        return out.astype(image.dtype, copy=False)
+
+    def _kernel_fft(self, fft_shape):
+        return _dog_kernel_fft(self.ksize, self.sigma1, self.sigma2, fft_shape)
+
+
+@lru_cache(maxsize=32)
+def _dog_kernel_fft(ksize, sigma1, sigma2, fft_shape):
+    # correlation is a convolution with the flipped kernel
+    kernel = dog_kernel(ksize, sigma1, sigma2)[::-1, ::-1].astype(np.float32)
+    kernel_fft = scipy.fft.rfft2(kernel, s=fft_shape)
+    kernel_fft.setflags(write=False)
+    return kernel_fft
+
+
+@lru_cache(maxsize=128)
+def _choose_method(plane_shape, ksize):
+    h, w = plane_shape
+    separable_cost = 4 * ksize * h * w
+    n = (h + ksize - 1) * (w + ksize - 1)
+    fft_cost = _FFT_COST_FACTOR * n * np.log2(n)
+
+    method = METHOD_FFT if fft_cost < separable_cost else METHOD_SEPARABLE
+    logger.info('DoG filter: using {} method for {}x{} planes '
+                '(ksize={})'.format(method, h, w, ksize))
+    return method
+
+
+def dog(image, ksize=100, sigma1=5, sigma2=10, method=METHOD_AUTO):
+    return DoGFilter(ksize, sigma1, sigma2, method)(image)
 
 
 def crossCorr(image1, image2, padding_y, padding_x):
@@ -29,6 +189,75 @@ def crossCorr(image1, image2, padding_y, padding_x):
     return cv.matchTemplate(padded, temp2, cv.TM_CCORR_NORMED)
 
 
+def crossCorrStack(stack, image, padding_y, padding_x):
+    """Normalized cross correlation of `image` against each plane of `stack`.
+
+    Same as calling :func:`crossCorr` on every plane of `stack`, but all
+    planes are correlated at once in the Fourier domain.
+
+    Parameters
+    ----------
+    stack : :class:`numpy.ndarray`
+        3D array (ZYX).
+    image : :class:`numpy.ndarray`
+        2D template, not larger than a plane of `stack`.
+    padding_y, padding_x : int
+        Zero padding applied to `stack` along Y and X (on both sides).
+
+    Returns
+    -------
+    :class:`numpy.ndarray`
+        Score volume of shape ``(Z, Y + 2 * padding_y - h + 1,
+        X + 2 * padding_x - w + 1)`` where ``(h, w)`` is the shape of
+        `image`, in the range [-1, 1] as with ``cv.TM_CCORR_NORMED``.
+    """
+    stack = stack.astype(np.float32, copy=False)
+    templ = image.astype(np.float32, copy=False)
+
+    padding = ((0, 0), (padding_y, padding_y), (padding_x, padding_x))
+    padded = np.pad(stack, padding, mode='constant')
+
+    h, w = templ.shape
+    out_h = padded.shape[-2] - h + 1
+    out_w = padded.shape[-1] - w + 1
+
+    fft_shape = tuple(scipy.fft.next_fast_len(s, real=True)
+                      for s in padded.shape[-2:])
+
+    num = scipy.fft.rfft2(padded, s=fft_shape)
+    num *= np.conj(scipy.fft.rfft2(templ, s=fft_shape))
+    num = scipy.fft.irfft2(num, s=fft_shape)[..., :out_h, :out_w]
+
+    # sum of squares of each window: out_w is usually much smaller than w,
+    # therefore sum along X by subtracting the few columns outside of each
+    # window from the row totals, then use a cumulative sum along Y
+    sq = np.square(padded, dtype=np.float64)
+    row_sum = sq.sum(axis=-1, keepdims=True)
+    left = np.zeros(sq.shape[:-1] + (out_w,))
+    left[..., 1:] = np.cumsum(sq[..., :out_w - 1], axis=-1)
+    right = np.zeros(sq.shape[:-1] + (out_w,))
+    right[..., :-1] = np.cumsum(sq[..., :w - 1:-1], axis=-1)[..., ::-1]
+    wnd_sum2 = row_sum - left - right
+
+    wnd_sum2 = np.concatenate(
+        [np.zeros((wnd_sum2.shape[0], 1, out_w)), wnd_sum2.cumsum(axis=1)],
+        axis=1)
+    wnd_sum2 = wnd_sum2[:, h:] - wnd_sum2[:, :out_h]
+    np.maximum(wnd_sum2, 0, out=wnd_sum2)
+
+    denom = np.sqrt(wnd_sum2 * np.square(templ, dtype=np.float64).sum())
+
+    # same clipping rules as cv.matchTemplate
+    abs_num = np.abs(num)
+    cc = np.zeros(num.shape, dtype=np.float32)
+    ok = abs_num < denom
+    cc[ok] = num[ok] / denom[ok]
+    sat = ~ok & (abs_num < denom * 1.125)
+    cc[sat] = np.sign(num[sat])
+
+    return cc
+
+
 def align_dog(i1, i2, padding_y, padding_x):
     dog1 = dog(i1)
     dog2 = dog(i2)
@@ -37,3 +266,4 @@ def align_dog(i1, i2, padding_y, padding_x):
 
     min_val, max_val, min_loc, max_loc = cv.minMaxLoc(cc)
     return cc, max_loc
+
@@ -3,19 +3,24 @@
 import os
 import re
 import logging
+import concurrent.futures
 
 import json
-import yaml
 
 import numpy as np
 import pandas as pd
 import networkx as nx
 
+from zetastitcher.io import project
 from zetastitcher.io.inputfile import InputFile
+from zetastitcher.io.metadata_cache import MetadataCache
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
+# number of tiles whose header is read concurrently when loading a directory
+DEFAULT_PROBE_WORKERS = 16
+
 
 def parse_file_name(file_name):
     """Parse fields (stage coordinates) contained in `file_name`.
@@ -60,26 +65,110 @@ def parse_file_name(file_name):
     return fields
 
 
+def _read_shape(name, use_cache=True):
+    """Shape ``[nfrms, ysize, xsize]`` of a tile, None if it cannot be
+    opened.
+
+    If `use_cache` is True, the shape is taken from the metadata cache when
+    valid, otherwise it is added to the cache.
+    """
+    cache = MetadataCache.of(name) if use_cache else None
+    if cache is not None:
+        entry = cache.get(name)
+        if entry is not None:
+            return [entry['nfrms'], entry['ysize'], entry['xsize']]
+
+    try:
+        with InputFile(name, metadata_cache=use_cache) as infile:
+            if cache is not None:
+                cache.put(name, infile)
+            return [infile.nfrms, infile.ysize, infile.xsize]
+    except (RuntimeError, ValueError):
+        return None
+
+
+def _equal_shapes(names, use_cache=True):
+    """Shapes of tiles assumed to be identical: only the first tile that can
+    be opened is read."""
+    shapes = []
+    shape = None
+    for name in names:
+        if shape is None:
+            shape = _read_shape(name, use_cache)
+        shapes.append(shape)
+    return shapes
+
+
+def z_components(z, z_end):
+    """Connected components of tiles by containment of their `z` ranges.
+
+    Two tiles are connected when ``[z, z_end]`` of one contains that of the
+    other. Tiles are swept in order of increasing `z` (decreasing `z_end` for
+    equal `z`), so that the tiles containing the current one are the
+    previous ones reaching at least its `z_end`. Groups of previous tiles
+    are kept on a stack sorted by their largest `z_end`: the current tile
+    joins all groups on top of the stack reaching its `z_end`, which merge.
+    This takes O(N log N) time.
+
+    Parameters
+    ----------
+    z, z_end : array_like
+        Start and end of the `z` range of each tile.
+
+    Returns
+    -------
+    :class:`numpy.ndarray`
+        Component label of each tile.
+    """
+    z = np.asarray(z)
+    z_end = np.asarray(z_end)
+    parent = np.arange(len(z))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    stack = []  # (largest z_end, representative tile) of each group
+    for i in np.lexsort((-z_end, z)):
+        top_end = None
+        while stack and stack[-1][0] >= z_end[i]:
+            end, j = stack.pop()
+            if top_end is None:
+                top_end = end
+            parent[find(j)] = find(i)
+        stack.append((z_end[i] if top_end is None else top_end, i))
+
+    return np.array([find(i) for i in range(len(z))])
+
+
 class FileMatrix:
     """Data structures for a matrix of input files."""
     def __init__(self, input_path=None, ascending_tiles_x=True,
-                 ascending_tiles_y=True, recursive=False, equal_shape=False):
+                 ascending_tiles_y=True, recursive=False, equal_shape=False,
+                 probe_workers=DEFAULT_PROBE_WORKERS, metadata_cache=True):
         """
-        Construct a FileMatrix object from a directory path or a .yml file
-        produced by the stitcher. Tile ordering parameters need to be
+        Construct a FileMatrix object from a directory path or a project
+        file (.yml or .npz, see :mod:`.project`) produced by the stitcher. Tile ordering parameters need to be
         specified only if constructing from a directory, otherwise they are
         ignored.
 
         Parameters
         ----------
         input_path : str
-                     input path (directory) or file (.yml)
+                     input path (directory) or file (.yml or .npz)
         ascending_tiles_x : bool
             whether tiles are supposed to be read in ascending X order
         ascending_tiles_y : bool
             whether tiles are supposed to be read in ascending Y order
         equal_shape : bool
             if True, tiles are considered to be identical in shape (results in slightly faster loading)
+        probe_workers : int
+            number of threads reading tile headers when loading a directory
+        metadata_cache : bool
+            whether to use and update the tile metadata cache (see
+            :mod:`.metadata_cache`) when loading a directory
         """
         self.input_path = input_path
 
@@ -91,6 +180,8 @@ class FileMatrix:
         self.ascending_tiles_x = ascending_tiles_x
         self.ascending_tiles_y = ascending_tiles_y
         self.consider_equal = equal_shape
+        self.probe_workers = probe_workers
+        self.use_metadata_cache = metadata_cache
 
         self.name_array = None
 
@@ -105,21 +196,14 @@ class FileMatrix:
     def load_dir(self, dir=None, recursive=False):
         """Look for files in `dir` recursively and populate data structures.
 
+        Tile headers are read concurrently by :attr:`probe_workers` threads,
+        tiles are added in directory listing order. Shapes found in the
+        metadata cache are not read again.
+
         Parameters
         ----------
         dir : path
         """
-
-        def _process_list(root, mylist):
-            shape = None
-            for f in mylist:
-                try:
-                    shape = self.parse_and_append(os.path.join(root, f), flist, shape)
-                    if not self.consider_equal:
-                        shape = None
-                except (RuntimeError, ValueError):
-                    pass
-
         if dir is None:
             dir = self.input_path
 
@@ -127,22 +211,40 @@ class FileMatrix:
             return
 
         flist = []
-        shape = None
-
-        if recursive:
-            for root, dirs, files in os.walk(dir, followlinks=True):
-                if os.path.basename(root):
-                    try:
-                        shape = self.parse_and_append(root, flist, shape)
-                        if not self.consider_equal:
-                            shape = None
-                        continue
-                    except (RuntimeError, ValueError):
-                        pass
-
-                _process_list(root, files)
-        else:
-            _process_list(dir, os.listdir(dir))
+
+        with concurrent.futures.ThreadPoolExecutor(self.probe_workers) as e:
+            if recursive:
+                walk = list(os.walk(dir, followlinks=True))
+
+                # a directory whose name can be parsed is a tile (a directory
+                # of frames), otherwise its files are tiles
+                roots = [root for root, _, _ in walk if os.path.basename(root)]
+                dir_tiles = {}
+                for name, fields, shape in self._probe(e, roots)():
+                    dir_tiles[name] = (fields, shape)
+
+                groups = []
+                for root, dirs, files in walk:
+                    if root in dir_tiles:
+                        groups.append(lambda root=root: [
+                            (root, *dir_tiles[root])])
+                    else:
+                        groups.append(self._probe(
+                            e, [os.path.join(root, f) for f in files]))
+            else:
+                groups = [self._probe(
+                    e, [os.path.join(dir, f) for f in os.listdir(dir)])]
+
+            for group in groups:
+                for name, fields, shape in group():
+                    flist += fields + shape
+                    flist.append(name)
+                    logger.info('adding {} \tX={} Y={} Z={}'.format(
+                        name, *fields))
+
+        if self.use_metadata_cache:
+            for d in {os.path.dirname(n) for n in flist[6::7]}:
+                MetadataCache.of_directory(d).save()
 
         if not flist:
             raise ValueError('Empty file list')
@@ -163,11 +265,11 @@ class FileMatrix:
         self.process_data_frame()
 
     def load_yaml(self, fname):
+        """Load a project file, in any of the formats of :mod:`.project`."""
         logger.info('loading {}'.format(fname))
-        with open(fname, 'r') as f:
-            y = yaml.safe_load(f)
+        y = project.read(fname)
 
-        self.data_frame = pd.DataFrame(y['filematrix']).set_index('filename')
+        self.data_frame = y['filematrix'].set_index('filename')
         self.data_frame = self.data_frame.sort_values(['Z', 'Y', 'X'])
 
         self.process_data_frame()
@@ -197,44 +299,73 @@ class FileMatrix:
         self.compute_end_pos()
         self.name_array = np.array(df.index.values).reshape(self.Ny, self.Nx)
 
-    def parse_and_append(self, name, flist, shape=None):
-        try:
-            fields = parse_file_name(name)
-            if shape is None:
-                with InputFile(name) as infile:
-                    shape = [infile.nfrms, infile.ysize, infile.xsize]
-            flist += fields + shape
-            flist.append(name)
-            logger.info('adding {} \tX={} Y={} Z={}'.format(name, *fields))
-        except (RuntimeError, ValueError):
-            raise
-        return shape
+    def _probe(self, executor, names):
+        """Start reading the shape of the tiles among `names`.
 
-    def get_json(self):
+        Names that cannot be parsed, and files that cannot be opened, are
+        skipped. If :attr:`consider_equal` is True, only the first tile that
+        can be opened is read.
+
+        Returns
+        -------
+        callable
+            Returning a list of ``(name, fields, shape)`` tuples, in the
+            same order as `names`.
+        """
+        parsed = []
+        for name in names:
+            try:
+                parsed.append((name, parse_file_name(name)))
+            except ValueError:
+                pass
+
+        if self.consider_equal:
+            fut = executor.submit(_equal_shapes, [n for n, _ in parsed],
+                                  self.use_metadata_cache)
+            get_shapes = fut.result
+        else:
+            futs = [executor.submit(_read_shape, n, self.use_metadata_cache)
+                    for n, _ in parsed]
+
+            def get_shapes():
+                return [f.result() for f in futs]
+
+        def result():
+            return [(name, fields, shape) for (name, fields), shape
+                    in zip(parsed, get_shapes()) if shape is not None]
+        return result
+
+    def get_table(self):
+        """The columns of :attr:`data_frame` saved to project files."""
         keys = ['X', 'Y', 'Z', 'nfrms', 'xsize', 'ysize']
         abs_keys = ['Xs', 'Ys', 'Zs']
         for k in abs_keys:
             if k in self.data_frame.columns:
                 keys.append(k)
-        df = self.data_frame[keys].reset_index()
-        return json.loads(df.to_json(orient='records'))
+        return self.data_frame[keys].reset_index()
+
+    def get_json(self):
+        return json.loads(self.get_table().to_json(orient='records'))
 
     def save_to_yaml(self, filename, mode):
-        j = self.get_json()
+        """Save to a project file, in the format given by its extension.
 
+        Parameters
+        ----------
+        filename : str
+        mode : str
+            ``'update'`` to replace the tile table of an existing file,
+            keeping the other sections, ``'w'`` to write a new file.
+        """
         if mode == 'update':
-            with open(filename, 'r') as f:
-                y = yaml.safe_load(f)
-
-            y['filematrix'] = j
-
+            y = project.read(filename)
             logger.info('updating {}'.format(filename))
-            with open(filename, 'w') as f:
-                yaml.dump(y, f, default_flow_style=False)
         else:
+            y = {}
             logger.info('writing {}'.format(filename))
-            with open(filename, mode) as f:
-                yaml.dump({'filematrix': j}, f, default_flow_style=False)
+
+        y['filematrix'] = self.get_table()
+        project.write(filename, y)
 
     def clear_absolute_positions(self):
         keys = ['Xs', 'Ys', 'Zs', 'Xs_end', 'Ys_end', 'Zs_end']
@@ -281,27 +412,28 @@ class FileMatrix:
     def slices(self):
         """A slice is a group of tiles that share at least a `z` frame.
 
+        Tiles are connected when the `z` range of one contains the `z` range
+        of the other.
+
         Returns
         -------
         comp : generator
             A generator of graphs, one for each connected component of G,
             where G is the graph of tiles connected by at least a `z` frame.
+            Components are yielded in order of their first tile in
+            :attr:`data_frame`, each graph holding its tiles in the same
+            order.
         """
-        G = nx.Graph()
-        for index, row in self.data_frame.iterrows():
-            G.add_node(index)
-
-        for index, row in self.data_frame.iterrows():
-            view = self.data_frame[
-                (self.data_frame['Z'] <= row['Z'])
-                & (self.data_frame['Z_end'] >= row['Z_end'])
-                ]
-            pairs = zip(view.index.values[::1], view.index.values[1::1])
-            G.add_edges_from(pairs)
-            G.add_edge((view.index.values[0]), view.index.values[-1])
-
-        for c in nx.connected_components(G):
-            yield G.subgraph(c).copy()
+        df = self.data_frame
+        labels = z_components(df['Z'].values, df['Z_end'].values)
+        index = df.index.values
+
+        for label in pd.unique(labels):
+            nodes = index[labels == label]
+            G = nx.Graph()
+            G.add_nodes_from(nodes)
+            G.add_edges_from(zip(nodes[:-1], nodes[1:]))
+            yield G
 
     @property
     def tiles_along_dir(self):
@@ -0,0 +1,78 @@
+"""Cheap fingerprints of tiles, to detect re-acquired tiles.
+
+A fingerprint is made of size, modification time and a hash of a few small
+chunks sampled at evenly spaced offsets of the file. Tiles stored as
+directories of frames are fingerprinted from the list of their files and
+from a sample of the files themselves.
+"""
+
+import os
+import hashlib
+import concurrent.futures
+
+N_SAMPLES = 8
+SAMPLE_SIZE = 4096
+
+
+def _hash_file(h, path, size, n_samples=N_SAMPLES):
+    if size <= n_samples * SAMPLE_SIZE:
+        offsets = [0]
+        length = size
+    else:
+        step = (size - SAMPLE_SIZE) / max(n_samples - 1, 1)
+        offsets = [int(i * step) for i in range(n_samples)]
+        length = SAMPLE_SIZE
+
+    with open(path, 'rb') as f:
+        for offset in offsets:
+            f.seek(offset)
+            h.update(f.read(length))
+
+
+def fingerprint(path):
+    """Fingerprint of a tile.
+
+    Parameters
+    ----------
+    path : str
+        Tile file, or directory of frames.
+
+    Returns
+    -------
+    dict
+        With keys `size` (bytes), `mtime` (ns) and `hash`.
+    """
+    h = hashlib.sha1()
+
+    if not os.path.isdir(path):
+        st = os.stat(path)
+        _hash_file(h, path, st.st_size)
+        return {'size': st.st_size, 'mtime': st.st_mtime_ns,
+                'hash': h.hexdigest()}
+
+    files = sorted(
+        f for f in os.listdir(path) if os.path.isfile(os.path.join(path, f)))
+    stats = [os.stat(os.path.join(path, f)) for f in files]
+    for f, st in zip(files, stats):
+        h.update('{}:{}\n'.format(f, st.st_size).encode())
+
+    n = len(files)
+    for i in sorted({i * (n - 1) // (N_SAMPLES - 1) for i in range(N_SAMPLES)}
+                    if n else []):
+        _hash_file(h, os.path.join(path, files[i]), stats[i].st_size, 1)
+
+    return {'size': sum(st.st_size for st in stats),
+            'mtime': max((st.st_mtime_ns for st in stats), default=0),
+            'hash': h.hexdigest()}
+
+
+def fingerprints(paths, max_workers=16):
+    """Fingerprints of several tiles, computed in parallel.
+
+    Returns
+    -------
+    dict
+        Fingerprints by path.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as e:
+        return dict(zip(paths, e.map(fingerprint, paths)))
@@ -0,0 +1,113 @@
+"""Append-only journal of alignment results, to resume interrupted runs.
+
+The journal is a text file with one JSON record per line. A header record
+``{"params": {...}}`` holding the alignment parameters is written every time
+the journal is opened for writing, and is followed by the result records
+(``{"item": {...}}``) produced with those parameters. When loading, only
+results produced with the same parameters are retained.
+"""
+
+import os
+import json
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+KEY_FIELDS = ['aname', 'bname', 'z_frame', 'axis']
+
+
+def item_key(item):
+    """Key identifying a work item, i.e. ``(aname, bname, z_frame, axis)``."""
+    return tuple(item[k] for k in KEY_FIELDS)
+
+
+def _to_builtin(v):
+    if isinstance(v, np.generic):
+        return v.item()
+    return v
+
+
+class Journal:
+    """Journal of alignment results.
+
+    Parameters
+    ----------
+    path : str
+        Journal file.
+    params : dict
+        Alignment parameters. Must be JSON serializable.
+    """
+    def __init__(self, path, params):
+        self.path = path
+        self.params = json.loads(json.dumps(params))
+        self._f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def load(self):
+        """Read results produced with the current parameters.
+
+        Returns
+        -------
+        dict
+            Result items, by :func:`item_key`.
+        """
+        out = {}
+        if not os.path.exists(self.path):
+            return out
+
+        params = None
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:  # truncated by a crash
+                    logger.debug('skipping invalid journal line')
+                    continue
+
+                if 'params' in record:
+                    params = record['params']
+                elif 'item' in record and params == self.params:
+                    item = record['item']
+                    out[item_key(item)] = item
+        return out
+
+    def append(self, item):
+        """Append a result and flush it to disk."""
+        if self._f is None:
+            self._open()
+
+        item = {k: _to_builtin(v) for k, v in item.items()}
+        self._write({'item': item})
+
+    def _open(self):
+        self._f = open(self.path, 'a+')
+        # terminate a line truncated by a crash
+        if self._f.tell() > 0:
+            self._f.seek(self._f.tell() - 1)
+            if self._f.read(1) != '\n':
+                self._f.write('\n')
+        self._write({'params': self.params})
+
+    def _write(self, record):
+        self._f.write(json.dumps(record) + '\n')
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def remove(self):
+        """Close and delete the journal file."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
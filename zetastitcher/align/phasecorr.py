@@ -0,0 +1,125 @@
+"""3D phase correlation between the overlapping sub-volumes of two tiles."""
+
+import numpy as np
+import scipy.fft
+import scipy.ndimage as ndi
+
+from zetastitcher.align.dog import crossCorrStack, dog
+
+
+def phase_correlation(a, b, max_dz, max_dy, max_dx):
+    """Normalized 3D phase correlation of two sub-volumes.
+
+    Both sub-volumes are expected in the same canonical orientation used by
+    the align worker (rows along the stitching axis) and with the same shape:
+    `a` is the band at the end of the first tile, `b` the band at the
+    beginning of the second tile, both spanning the whole Z search window
+    (``2 * max_dz + 1`` frames) centered on the same frame. Since fewer
+    frames overlap at larger Z shifts, each plane of the result is divided
+    by the fraction of overlapping frames.
+
+    Parameters
+    ----------
+    a, b : :class:`numpy.ndarray`
+        Sub-volumes (ZYX).
+    max_dz, max_dy, max_dx : int
+        Maximum shifts.
+
+    Returns
+    -------
+    :class:`numpy.ndarray`
+        Phase correlation restricted to the search window, of shape
+        ``(2 * max_dz + 1, 2 * max_dy + 1, 2 * max_dx + 1)``, indexed as the
+        score volume produced by :func:`.crossCorrStack`.
+    """
+    window = np.outer(np.hanning(a.shape[1]), np.hanning(a.shape[2]))
+    window = window.astype(np.float32)
+    a = (a - a.mean()) * window
+    b = (b - b.mean()) * window
+
+    # zero padding avoids wrap-around of shifts within the search window
+    fft_shape = [
+        scipy.fft.next_fast_len(n + m, real=True)
+        for n, m in zip(a.shape, [max_dz, 2 * max_dy, max_dx])
+    ]
+
+    r = scipy.fft.rfftn(a, s=fft_shape)
+    r *= np.conj(scipy.fft.rfftn(b, s=fft_shape))
+    r /= np.abs(r) + np.finfo(np.float32).eps
+    r = scipy.fft.irfftn(r, s=fft_shape)
+
+    # r[d] peaks where a(p + d) matches b(p)
+    z = np.arange(-max_dz, max_dz + 1) % fft_shape[0]
+    y = np.arange(0, 2 * max_dy + 1) % fft_shape[1]
+    x = np.arange(-max_dx, max_dx + 1) % fft_shape[2]
+
+    r = r[np.ix_(z, y, x)]
+
+    # few frames overlap at large Z shifts, do not penalize them
+    overlap_z = a.shape[0] - np.abs(np.arange(-max_dz, max_dz + 1))
+    r /= overlap_z[:, np.newaxis, np.newaxis] / a.shape[0]
+
+    return r
+
+
+def find_peaks(pc, n_peaks):
+    """Return the indices of the `n_peaks` highest local maxima of `pc`."""
+    local_max = ndi.maximum_filter(pc, size=3, mode='constant', cval=-np.inf)
+    peaks = np.flatnonzero(pc == local_max)
+    peaks = peaks[np.argsort(pc.flat[peaks])[::-1][:n_peaks]]
+    return [np.unravel_index(p, pc.shape) for p in peaks]
+
+
+def align_phasecorr(a, b, max_dz, max_dy, max_dx, n_peaks=5):
+    """Find the best shift between two sub-volumes by phase correlation.
+
+    The highest peaks of the phase correlation are only candidates: with the
+    few frames of a Z search window, the peak is easily displaced by one
+    voxel or overtaken by a spurious one. Each candidate and its immediate
+    neighbours are verified by computing the normalized cross correlation
+    between the DoG-filtered central frame of `b` and the matching frames of
+    `a`, in a single :func:`.crossCorrStack` call, and the best one is kept.
+    The score is therefore comparable to the scores of the cross
+    correlation engine.
+
+    Parameters
+    ----------
+    a, b : :class:`numpy.ndarray`
+        Sub-volumes, see :func:`phase_correlation`. Only the first
+        ``b.shape[1] - 2 * max_dy`` rows of `b` are used for scoring.
+    max_dz, max_dy, max_dx : int
+        Maximum shifts.
+    n_peaks : int
+        Number of phase correlation peaks to verify.
+
+    Returns
+    -------
+    tuple
+        ``(dz, dy, dx, score)`` where the shifts are indices in the search
+        window, as for :func:`.crossCorrStack`.
+    """
+    pc = phase_correlation(a, b, max_dz, max_dy, max_dx)
+
+    templ = dog(b[max_dz])[:b.shape[1] - 2 * max_dy]
+    h = templ.shape[0]
+    planes = {}
+
+    best = None
+    for cz, cy, cx in find_peaks(pc, n_peaks):
+        z = range(max(cz - 1, 0), min(cz + 2, pc.shape[0]))
+        y_from = max(cy - 1, 0)
+        y_to = min(cy + 2, pc.shape[1])
+        x_from = max(cx - 1, 0)
+
+        for dz in z:
+            if dz not in planes:
+                planes[dz] = dog(a[dz])
+        stack = np.stack([planes[dz][y_from:y_to - 1 + h] for dz in z])
+
+        # (dz, dy, dx) scores of the candidate and its neighbours
+        cc = crossCorrStack(stack, templ, 0, max_dx)[..., x_from:cx + 2]
+        iz, iy, ix = np.unravel_index(np.argmax(cc), cc.shape)
+        if best is None or cc[iz, iy, ix] > best[-1]:
+            best = (z[iz], y_from + iy, x_from + ix, cc[iz, iy, ix])
+
+    return best
@@ -0,0 +1,132 @@
+"""Coarse-to-fine search of the best shift between two tiles.
+
+The shift is first estimated on downsampled bands (by factors ``2 **
+levels``, ..., 4, 2), then refined at each finer level only within a small
+neighborhood of the previous estimate. Compared to an exhaustive search at
+full resolution, the cost no longer grows with the area of the search
+window.
+
+At each level, bands are downsampled by averaging blocks of ``f x f`` pixels
+and then DoG-filtered with the usual kernel. Frames are not downsampled along Z,
+since only one frame of the second tile is available.
+"""
+
+import math
+
+import numpy as np
+
+from zetastitcher.align.dog import dog, crossCorrStack
+
+# coarser levels are skipped when the downsampled template gets too small
+MIN_TEMPLATE_SIZE = 16
+
+
+def downsample(a, f):
+    """Downsample the last two axes of `a` by averaging blocks of `f x f`."""
+    if f == 1:
+        return a
+    h = a.shape[-2] // f
+    w = a.shape[-1] // f
+    a = a[..., :h * f, :w * f]
+    a = a.reshape(a.shape[:-2] + (h, f, w, f))
+    return a.mean(axis=(-3, -1), dtype=np.float32)
+
+
+def level_dog(a, f):
+    """DoG filter with kernels scaled to downsampling factor `f`."""
+    sigma1 = max(5 / f, 1)
+    sigma2 = 2 * sigma1
+    ksize = int(10 * sigma2)
+    return dog(a, ksize, sigma1, sigma2)
+
+
+def search(planes, templ, y_range, x_range, pad_x):
+    """Exhaustive search within a sub-window at a single resolution.
+
+    Parameters
+    ----------
+    planes : :class:`numpy.ndarray`
+        DoG-filtered candidate planes (ZYX).
+    templ : :class:`numpy.ndarray`
+        DoG-filtered template (2D).
+    y_range, x_range : tuple
+        Inclusive ranges of the offsets to be tested. Y offsets are rows of
+        `planes`, X offsets are columns of `planes` zero padded by `pad_x`
+        on both sides, as in :func:`.crossCorrStack`.
+    pad_x : int
+
+    Returns
+    -------
+    tuple
+        ``(z, y, x, score)`` where `z` is an index in `planes`.
+    """
+    h, w = templ.shape
+    y_from, y_to = y_range
+    x_from, x_to = x_range
+
+    padded = np.pad(planes, ((0, 0), (0, 0), (pad_x, pad_x)), mode='constant')
+    sub = padded[:, y_from:y_to + h, x_from:x_to + w]
+
+    cc = crossCorrStack(sub, templ, 0, 0)
+    z, y, x = np.unravel_index(np.argmax(cc), cc.shape)
+    return z, y_from + y, x_from + x, cc[z, y, x]
+
+
+def align_pyramid(a, b, max_dz, max_dy, max_dx, levels):
+    """Find the best shift between two unfiltered bands, coarse to fine.
+
+    Parameters
+    ----------
+    a : :class:`numpy.ndarray`
+        Band of the first tile over the whole Z search window (ZYX).
+    b : :class:`numpy.ndarray`
+        Band of the second tile at the central frame (a single frame, ZYX),
+        ``2 * max_dy`` rows shorter than `a`.
+    max_dz, max_dy, max_dx : int
+        Maximum shifts, at full resolution.
+    levels : int
+        Number of downsampling levels. The coarsest level is downsampled by
+        ``2 ** levels``.
+
+    Returns
+    -------
+    tuple
+        ``(dz, dy, dx, score)`` as indices in the full resolution search
+        window, see :func:`.crossCorrStack`. The score is the normalized
+        cross correlation at full resolution.
+    """
+    # inclusive ranges of the search window, at full resolution
+    ranges = [[0, 2 * max_dz], [0, 2 * max_dy], [0, 2 * max_dx]]
+    b = b[0]
+
+    factors = [2 ** i for i in range(levels, 0, -1)]
+    factors = [f for f in factors if min(b.shape) // f >= MIN_TEMPLATE_SIZE]
+
+    for f in factors + [1]:
+        (z_from, z_to), (y_from, y_to), (x_from, x_to) = ranges
+
+        planes = a[z_from:z_to + 1].astype(np.float32, copy=False)
+        planes = level_dog(downsample(planes, f), f)
+        templ = level_dog(downsample(b.astype(np.float32, copy=False), f), f)
+
+        pad_x = math.ceil(max_dx / f)
+        max_y = planes.shape[-2] - templ.shape[0]
+        max_x = planes.shape[-1] + 2 * pad_x - templ.shape[1]
+
+        y_range = (min(y_from // f, max_y), min(math.ceil(y_to / f), max_y))
+        x_range = (
+            max(0, (x_from - max_dx) // f + pad_x),
+            min(math.ceil((x_to - max_dx) / f) + pad_x, max_x))
+
+        z, y, x, score = search(planes, templ, y_range, x_range, pad_x)
+
+        z += z_from
+        y = min(y * f, 2 * max_dy)
+        x = min(max((x - pad_x) * f + max_dx, 0), 2 * max_dx)
+
+        if f == 1:
+            return z, y, x, score
+
+        # next level: refine within the uncertainty of the current one
+        ranges = [[max(c - f, 0), min(c + f, m)] for c, m in
+                  zip([z, y, x], [2 * max_dz, 2 * max_dy, 2 * max_dx])]
@@ -0,0 +1,104 @@
+"""Locality-aware ordering of tiles and work items.
+
+Tiles are visited along a Hilbert curve covering the grid, so that
+consecutive tiles are adjacent and each tile is visited shortly after most
+of its neighbours. Work items are grouped by their first tile, so that the
+east and south pairs of a tile, and all of their Z samples, are aligned
+together, while the bands they need from the first tile are still in the
+page cache (or in the border cache).
+"""
+
+
+def _sign(v):
+    return (v > 0) - (v < 0)
+
+
+def _generalized_hilbert(x, y, ax, ay, bx, by):
+    """Walk the rectangle with corner ``(x, y)``, major axis ``(ax, ay)`` and
+    minor axis ``(bx, by)``."""
+    w = abs(ax + ay)
+    h = abs(bx + by)
+    dax, day = _sign(ax), _sign(ay)  # unit major direction
+    dbx, dby = _sign(bx), _sign(by)  # unit minor direction
+
+    if h == 1:
+        for _ in range(w):
+            yield x, y
+            x, y = x + dax, y + day
+        return
+    if w == 1:
+        for _ in range(h):
+            yield x, y
+            x, y = x + dbx, y + dby
+        return
+
+    ax2, ay2 = ax // 2, ay // 2
+    bx2, by2 = bx // 2, by // 2
+    w2 = abs(ax2 + ay2)
+    h2 = abs(bx2 + by2)
+
+    if 2 * w > 3 * h:
+        # long rectangle: split along the major axis only
+        if w2 % 2 and w > 2:
+            ax2, ay2 = ax2 + dax, ay2 + day
+        yield from _generalized_hilbert(x, y, ax2, ay2, bx, by)
+        yield from _generalized_hilbert(x + ax2, y + ay2, ax - ax2, ay - ay2,
+                                        bx, by)
+    else:
+        if h2 % 2 and h > 2:
+            bx2, by2 = bx2 + dbx, by2 + dby
+        yield from _generalized_hilbert(x, y, bx2, by2, ax2, ay2)
+        yield from _generalized_hilbert(x + bx2, y + by2, ax, ay,
+                                        bx - bx2, by - by2)
+        yield from _generalized_hilbert(
+            x + (ax - dax) + (bx2 - dbx), y + (ay - day) + (by2 - dby),
+            -bx2, -by2, -(ax - ax2), -(ay - ay2))
+
+
+def hilbert_order(shape):
+    """Cells of a grid of the given shape (rows, columns), in Hilbert order.
+
+    A generalized Hilbert curve is used, so that grids of any shape are
+    walked moving between adjacent cells (a diagonal step can be needed for
+    some odd sizes).
+
+    Returns
+    -------
+    list
+        ``(y, x)`` tuples.
+    """
+    ny, nx = shape
+    if nx >= ny:
+        walk = _generalized_hilbert(0, 0, nx, 0, 0, ny)
+    else:
+        walk = _generalized_hilbert(0, 0, 0, ny, nx, 0)
+    return [(y, x) for x, y in walk]
+
+
+def tile_order(name_array):
+    """Tile names of a grid (see :attr:`.FileMatrix.name_array`) in Hilbert
+    order."""
+    return [name_array[c] for c in hilbert_order(name_array.shape)]
+
+
+def schedule(items, name_array):
+    """Sort work items for locality.
+
+    Items are sorted by the position of their first tile (`aname`) along
+    the Hilbert curve, then by axis and Z frame.
+
+    Parameters
+    ----------
+    items : list
+        Work items.
+    name_array : :class:`numpy.ndarray`
+        Tile names in grid layout.
+
+    Returns
+    -------
+    list
+        The same items, in scheduling order.
+    """
+    rank = {name: i for i, name in enumerate(tile_order(name_array))}
+    return sorted(items, key=lambda item: (
+        rank[item['aname']], item['axis'], item['z_frame']))
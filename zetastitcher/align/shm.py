@@ -0,0 +1,118 @@
+"""Hand border bands from reader processes to correlation workers.
+
+Reader processes decode the bands of each tile into
+:class:`multiprocessing.shared_memory.SharedMemory` blocks and return only
+their descriptors (:class:`SharedArray`). Correlation workers attach to the
+same blocks and use them in place, without copying or pickling any pixel
+data. Blocks are released by the parent process once all the pairs using
+them have been correlated.
+"""
+
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from zetastitcher.align.border_cache import extract_borders
+
+
+def start_resource_tracker():
+    """Start the resource tracker of shared memory blocks.
+
+    Must be called before starting the worker processes, so that all of them
+    share the tracker of the parent. Otherwise each process starts its own
+    tracker, which reports blocks created by a process and released by
+    another one as leaked.
+    """
+    resource_tracker.ensure_running()
+
+
+class SharedArray:
+    """Descriptor of an array stored in a shared memory block.
+
+    Parameters
+    ----------
+    name : str
+        Name of the shared memory block.
+    shape : tuple
+    dtype : str
+    """
+    def __init__(self, name, shape, dtype):
+        self.name = name
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+
+    def __repr__(self):
+        return 'SharedArray({!r}, {}, {})'.format(self.name, self.shape,
+                                                  self.dtype)
+
+    @property
+    def nbytes(self):
+        return int(np.prod(self.shape)) * self.dtype.itemsize
+
+    @classmethod
+    def copy_of(cls, a):
+        """Copy `a` into a new shared memory block."""
+        shm = SharedMemory(create=True, size=max(a.nbytes, 1))
+        view = np.ndarray(a.shape, a.dtype, buffer=shm.buf)
+        view[...] = a
+        del view
+        shm.close()
+        return cls(shm.name, a.shape, a.dtype.str)
+
+    def attach(self):
+        """Map the block.
+
+        Returns
+        -------
+        tuple
+            ``(shm, array)``. The array must be deleted before calling
+            ``shm.close()``.
+        """
+        shm = SharedMemory(name=self.name)
+        return shm, np.ndarray(self.shape, self.dtype, buffer=shm.buf)
+
+    def unlink(self):
+        """Free the block."""
+        shm = SharedMemory(name=self.name)
+        shm.close()
+        shm.unlink()
+
+
+def extract_borders_shared(fname, keys, channel=None, filtered=True,
+                           timer=None, metadata_cache=True):
+    """Same as :func:`.extract_borders`, but bands are returned in shared
+    memory.
+
+    Returns
+    -------
+    dict
+        :class:`SharedArray` descriptors, by key.
+    """
+    bands = extract_borders(fname, keys, channel, filtered, timer,
+                            metadata_cache)
+    return {k: SharedArray.copy_of(a) for k, a in bands.items()}
+
+
+def call_shared(func, *args, **kwargs):
+    """Call `func` replacing :class:`SharedArray` arguments by their arrays.
+
+    The arrays are only valid during the call: `func` must not return them
+    or keep references to them.
+    """
+    blocks = []
+    args = list(args)
+    for i, a in enumerate(args):
+        if isinstance(a, SharedArray):
+            shm, args[i] = a.attach()
+            blocks.append(shm)
+
+    try:
+        return func(*args, **kwargs)
+    finally:
+        del args
+        for shm in blocks:
+            try:
+                shm.close()
+            except BufferError:  # still referenced, e.g. by a traceback
+                pass
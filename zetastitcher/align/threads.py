@@ -0,0 +1,152 @@
+"""Support for running alignment workers in threads.
+
+OpenCV filtering and template matching release the GIL, so that workers can
+run in threads of the main process. Threads share opened tiles through an
+:class:`InputFileCache`, and the internal thread pools of OpenCV and of BLAS
+are limited so that the total number of busy threads stays within the
+number of cores.
+"""
+
+import os
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import cv2 as cv
+
+try:
+    import threadpoolctl
+except ImportError:
+    threadpoolctl = None
+
+from zetastitcher.io.inputfile import InputFile
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+_warned_threadpoolctl = False
+
+DEFAULT_MAX_OPEN = 64
+
+
+class _Handle:
+    """An opened tile, used by one thread at a time."""
+    def __init__(self, path, infile, metadata_cache=True):
+        self.path = path
+        self.infile = infile
+        self.metadata_cache = metadata_cache
+        self.lock = threading.Lock()
+        self.evicted = False
+
+    def __enter__(self):
+        self.lock.acquire()
+        if self.infile is None:  # evicted after being handed out
+            self.infile = InputFile(self.path, self.metadata_cache)
+        return self.infile
+
+    def __exit__(self, *args):
+        try:
+            if self.evicted:
+                self._close()
+        finally:
+            self.lock.release()
+
+    def evict(self):
+        with self.lock:
+            self.evicted = True
+            self._close()
+
+    def _close(self):
+        if self.infile is not None:
+            self.infile.close()
+            self.infile = None
+
+
+class InputFileCache:
+    """Opened tiles shared among threads.
+
+    :meth:`open` returns a context manager giving exclusive access to the
+    tile, since file wrappers are not guaranteed to be thread safe. Different
+    tiles are read concurrently. At most `max_open` tiles are kept open, the
+    least recently used ones are closed first.
+
+    Example usage:
+
+    >>> files = InputFileCache()
+    >>> with files.open('0000_0000.tiff') as f:
+    ...     a = f.zslice(0, 10)
+
+    Tiles are opened with the metadata cache (see :mod:`.metadata_cache`)
+    unless `metadata_cache` is False.
+    """
+    def __init__(self, max_open=DEFAULT_MAX_OPEN, metadata_cache=True):
+        self.max_open = max_open
+        self.metadata_cache = metadata_cache
+        self._handles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def open(self, path):
+        with self._lock:
+            h = self._handles.get(path)
+            if h is not None:
+                self._handles.move_to_end(path)
+                return h
+
+        # open outside the lock, other tiles can be handed out meanwhile
+        new = _Handle(path, InputFile(path, self.metadata_cache),
+                      self.metadata_cache)
+
+        evicted = []
+        with self._lock:
+            h = self._handles.get(path)
+            if h is None:
+                h = self._handles[path] = new
+                while len(self._handles) > self.max_open:
+                    evicted.append(self._handles.popitem(last=False)[1])
+            else:  # opened by another thread meanwhile
+                evicted.append(new)
+
+        for e in evicted:
+            e.evict()
+        return h
+
+    def close(self):
+        """Close all tiles."""
+        with self._lock:
+            handles = list(self._handles.values())
+            self._handles.clear()
+        for h in handles:
+            h.evict()
+
+
+@contextmanager
+def limit_threads(n_workers):
+    """Limit the threads of OpenCV and BLAS while `n_workers` threads run.
+
+    Each worker gets an equal share of the cores, at least one thread. BLAS
+    threads are only limited if threadpoolctl is installed.
+    """
+    global _warned_threadpoolctl
+    n = max(1, (os.cpu_count() or 1) // n_workers)
+    old = cv.getNumThreads()
+    cv.setNumThreads(n)
+    logger.debug('{} threads per worker'.format(n))
+    try:
+        if threadpoolctl is None:
+            if not _warned_threadpoolctl:
+                logger.warning('threadpoolctl is not installed, BLAS threads '
+                               'are not limited')
+                _warned_threadpoolctl = True
+            yield
+        else:
+            with threadpoolctl.threadpool_limits(n):
+                yield
+    finally:
+        cv.setNumThreads(old)
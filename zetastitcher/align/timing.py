@@ -0,0 +1,159 @@
+"""Per-item timing of the alignment stages.
+
+Workers record the time spent in each stage of a work item, together with
+the number of bytes read, in a :class:`StageTimer`. Records are collected
+by the main process in a :class:`TimingReport`, which summarizes them to
+tell whether a dataset is I/O-bound or compute-bound.
+"""
+
+import os
+import csv
+import json
+import time
+import logging
+from contextlib import contextmanager
+
+from zetastitcher.align.journal import KEY_FIELDS
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+STAGE_OPEN = 'open'
+STAGE_READ = 'read'
+STAGE_CONVERT = 'convert'
+STAGE_DOG = 'dog'
+STAGE_CORRELATE = 'correlate'
+
+STAGES = [STAGE_OPEN, STAGE_READ, STAGE_CONVERT, STAGE_DOG, STAGE_CORRELATE]
+IO_STAGES = [STAGE_OPEN, STAGE_READ]
+
+TIMING_KEY = 'timing'
+
+
+class StageTimer:
+    """Accumulate the time spent in each stage of a work item.
+
+    Example usage:
+
+    >>> timer = StageTimer()
+    >>> with timer(STAGE_READ):
+    ...     a = f.zslice(0, 10)
+    >>> timer.bytes_read += a.nbytes
+    """
+    def __init__(self):
+        self.seconds = dict.fromkeys(STAGES, 0.)
+        self.bytes_read = 0
+
+    @contextmanager
+    def __call__(self, stage):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[stage] += time.perf_counter() - t
+
+    def to_dict(self):
+        d = dict(self.seconds)
+        d['bytes_read'] = self.bytes_read
+        return d
+
+    @classmethod
+    def of(cls, item):
+        """The timer stored in `item`, added if missing."""
+        timer = item.get(TIMING_KEY)
+        if timer is None:
+            timer = item[TIMING_KEY] = cls()
+        return timer
+
+
+class TimingReport:
+    """Collect the timings of work items.
+
+    With the border cache, tiles are read once for several items: the
+    timings of tile reads are recorded separately, with only the `aname`
+    field set to the tile name.
+
+    Parameters
+    ----------
+    dump_file : str
+        If specified, per-item timings are saved to this file, in CSV format
+        or in JSON format if the file name ends with ``.json``.
+    """
+    def __init__(self, dump_file=None):
+        self.dump_file = dump_file
+        self.records = []
+        self.n_items = 0
+        self.n_tiles = 0
+        self.t_start = time.perf_counter()
+
+    def add(self, item):
+        """Take the timings out of a result item."""
+        timer = item.pop(TIMING_KEY, None)
+        if timer is None:
+            return
+        record = {k: item[k] for k in KEY_FIELDS}
+        record.update(timer.to_dict())
+        self.records.append(record)
+        self.n_items += 1
+
+    def add_tile(self, name, timer):
+        """Add the timings of a tile read."""
+        record = dict.fromkeys(KEY_FIELDS)
+        record['aname'] = name
+        record.update(timer.to_dict())
+        self.records.append(record)
+        self.n_tiles += 1
+
+    def totals(self):
+        totals = dict.fromkeys(STAGES + ['bytes_read'], 0)
+        for r in self.records:
+            for k in totals:
+                totals[k] += r[k]
+        return totals
+
+    def summary(self):
+        """Summary table of time spent per stage.
+
+        Times are summed over all workers, so that their sum can exceed wall
+        time. Times per item include tile reads shared by several items.
+        """
+        n = max(self.n_items, 1)
+        totals = self.totals()
+        busy = sum(totals[s] for s in STAGES)
+        wall = time.perf_counter() - self.t_start
+
+        lines = ['{:<12}{:>12}{:>14}{:>8}'.format(
+            'stage', 'total [s]', 'per item [ms]', '%')]
+        for s in STAGES:
+            lines.append('{:<12}{:>12.2f}{:>14.1f}{:>8.1f}'.format(
+                s, totals[s], 1e3 * totals[s] / n,
+                100 * totals[s] / busy if busy else 0))
+
+        io = sum(totals[s] for s in IO_STAGES)
+        mb = totals['bytes_read'] / 2**20
+        items = '{} items'.format(self.n_items)
+        if self.n_tiles:
+            items += ' ({} tile reads)'.format(self.n_tiles)
+        lines.append('{} in {:.2f} s, {:.1f} MB read ({:.1f} MB/s per worker '
+                     'while reading)'.format(items, wall, mb,
+                                             mb / io if io else 0))
+        lines.append('{:.0f}% of worker time spent on I/O: {}'.format(
+            100 * io / busy if busy else 0,
+            'I/O-bound' if io > busy / 2 else 'compute-bound'))
+        return '\n'.join(lines)
+
+    def dump(self):
+        """Save per-item timings to :attr:`dump_file`."""
+        if self.dump_file is None:
+            return
+        if os.path.splitext(self.dump_file)[1].lower() == '.json':
+            with open(self.dump_file, 'w') as f:
+                json.dump(self.records, f, indent=2,
+                          default=lambda o: o.item())  # numpy scalars
+            return
+
+        fields = KEY_FIELDS + STAGES + ['bytes_read']
+        with open(self.dump_file, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fields)
+            writer.writeheader()
+            writer.writerows(self.records)
@@ -0,0 +1,136 @@
+"""Share alignment work among independent processes through the filesystem.
+
+The work items are split into shards of fixed size. Processes running on
+hosts sharing the same filesystem claim shards by atomically creating a lock
+file in the queue directory, and store the results of each shard in a
+:class:`.Journal`. When all shards are done, results are collected and
+merged by a single process.
+
+Layout of the queue directory::
+
+    queue.json          number of items and shard size
+    shard-00000.lock    claimed (contains host name, PID and time)
+    shard-00000.journal results
+    shard-00000.done    all items of the shard have been aligned
+"""
+
+import os
+import glob
+import json
+import time
+import socket
+import logging
+
+from zetastitcher.align.journal import Journal
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+class WorkQueue:
+    """Queue of shards of work items, in a shared directory.
+
+    Parameters
+    ----------
+    directory : str
+        Queue directory, created if missing.
+    n_items : int
+        Total number of work items.
+    shard_size : int
+        Number of items in each shard. Ignored if the queue already exists,
+        in which case the existing shard size is used.
+    """
+    def __init__(self, directory, n_items, shard_size=None):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+        info = {'n_items': n_items, 'shard_size': shard_size}
+        path = os.path.join(directory, 'queue.json')
+        if shard_size is not None and self._create(path, json.dumps(info)):
+            logger.info('created work queue in {}'.format(directory))
+        elif not os.path.exists(path):
+            raise ValueError('no work queue in {}'.format(directory))
+        else:
+            with open(path) as f:
+                info = json.load(f)
+
+        if info['n_items'] != n_items:
+            raise ValueError(
+                'work queue {} was created for {} items, found {}'.format(
+                    directory, info['n_items'], n_items))
+
+        self.n_items = n_items
+        self.shard_size = info['shard_size']
+
+    @property
+    def n_shards(self):
+        return -(-self.n_items // self.shard_size)
+
+    def shard(self, items, i):
+        """The items of shard `i`."""
+        return items[i * self.shard_size:(i + 1) * self.shard_size]
+
+    def claim(self):
+        """Claim free shards one at a time.
+
+        Yields
+        ------
+        int
+            Index of a shard now owned by the calling process.
+        """
+        for i in range(self.n_shards):
+            if self.is_done(i):
+                continue
+            content = '{} {} {}\n'.format(socket.gethostname(), os.getpid(),
+                                          time.time())
+            if self._create(self._path(i, 'lock'), content):
+                yield i
+
+    def mark_done(self, i):
+        self._create(self._path(i, 'done'), '')
+
+    def is_done(self, i):
+        return os.path.exists(self._path(i, 'done'))
+
+    def pending(self):
+        """Indices of the shards that are not done yet."""
+        return [i for i in range(self.n_shards) if not self.is_done(i)]
+
+    def journal_path(self, i):
+        return self._path(i, 'journal')
+
+    def load_results(self, params):
+        """Results of all shards, produced with the given parameters.
+
+        Returns
+        -------
+        dict
+            Result items, by :func:`.item_key`.
+        """
+        results = {}
+        pattern = os.path.join(self.directory, 'shard-*.journal')
+        for path in sorted(glob.glob(pattern)):
+            results.update(Journal(path, params).load())
+        return results
+
+    def _path(self, i, ext):
+        return os.path.join(self.directory, 'shard-{:05d}.{}'.format(i, ext))
+
+    @staticmethod
+    def _create(path, content):
+        """Atomically create `path` with `content`.
+
+        Returns False if `path` already exists. The file is written under a
+        temporary name and then hard linked, so that other processes never
+        see it partially written.
+        """
+        tmp = '{}.{}.{}.tmp'.format(path, socket.gethostname(), os.getpid())
+        with open(tmp, 'w') as f:
+            f.write(content)
+        try:
+            os.link(tmp, path)
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmp)
+        return True
@@ -1,5 +1,4 @@
-import yaml
-import pandas as pd
+from zetastitcher.io import project
 
 
 class XcorrFileMatrix:
@@ -31,10 +30,11 @@ class XcorrFileMatrix:
 
     @classmethod
     def from_yaml(cls, fname):
-        with open(fname, 'r') as f:
-            y = yaml.safe_load(f)
+        """Load from a project file, in any of the formats of
+        :mod:`.project`."""
+        y = project.read(fname)
 
-        return XcorrFileMatrix.from_data(y['xcorr-options'], pd.DataFrame(y['xcorr']))
+        return XcorrFileMatrix.from_data(y['xcorr-options'], y['xcorr'])
 
     def aggregate_results(self):
         sdf = self.stitch_data_frame.reset_index()
@@ -0,0 +1,336 @@
+"""End-to-end benchmark on a synthetic mosaic.
+
+A mosaic with known tile positions is generated (see :mod:`.synthetic`) and
+processed with the full pipeline. Each stage is timed separately:
+
+* ``align``: pairwise alignment (:meth:`.Runner.align_pairs`)
+* ``global_optimization``: absolute positions from pairwise results
+  (:meth:`.Runner.finalize`)
+* ``vfv_getitem``: random queries to :class:`.VirtualFusedVolume`
+* ``fuse``: fusion of the whole volume to a TIFF file (``stitch-fuse``)
+
+Results, including throughput, peak resident memory (of this process and of
+its children) and alignment accuracy against the ground truth, are saved to
+a JSON file.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+
+import psutil
+import coloredlogs
+import numpy as np
+
+from ..version import __version__
+
+from zetastitcher import FileMatrix, VirtualFusedVolume
+from zetastitcher.align.__main__ import Runner
+from zetastitcher.fuse.fuse_runner import FuseRunner
+from zetastitcher.benchmark.synthetic import SyntheticMosaic, FORMATS, \
+    load_ground_truth
+
+logger = logging.getLogger(__name__)
+coloredlogs.install(level='INFO', fmt='%(levelname)s [%(name)s]: %(message)s')
+
+
+class CustomFormatter(argparse.ArgumentDefaultsHelpFormatter,
+                      argparse.RawDescriptionHelpFormatter):
+    pass
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the stitching pipeline on a synthetic mosaic.',
+        epilog='Version: {}'.format(__version__),
+        formatter_class=CustomFormatter)
+
+    parser.add_argument('-o', type=str, default='benchmark.json',
+                        dest='output_file', help='results file (JSON)')
+    parser.add_argument('-j', type=int, dest='n_of_workers',
+                        help='number of parallel jobs for alignment (defaults '
+                             'to number of system cores)')
+    parser.add_argument('--workdir', type=str,
+                        help='directory where the mosaic is generated '
+                             '(defaults to a temporary directory)')
+    parser.add_argument('--keep', action='store_true',
+                        help='do not delete the mosaic at the end')
+
+    group = parser.add_argument_group('synthetic mosaic')
+    group.add_argument('--grid', type=int, nargs=2, default=[3, 3],
+                       metavar=('NY', 'NX'), help='number of tiles')
+    group.add_argument('--tile-shape', type=int, nargs=3,
+                       default=[64, 512, 512], metavar=('Z', 'Y', 'X'),
+                       help='shape of each tile')
+    group.add_argument('--overlap', type=int, default=64,
+                       help='nominal overlap, H & V')
+    group.add_argument('--max-shift', type=int, nargs=3, default=[3, 8, 8],
+                       metavar=('DZ', 'DY', 'DX'),
+                       help='maximum random displacement of tiles')
+    group.add_argument('--dtype', type=str, default='uint16',
+                       help='data type of the tiles')
+    group.add_argument('--format', type=str, default=FORMATS[0],
+                       choices=FORMATS, dest='fmt', help='tile file format')
+    group.add_argument('--seed', type=int, default=0,
+                       help='seed of the random number generator')
+
+    group = parser.add_argument_group('queries')
+    group.add_argument('--n-queries', type=int, default=20,
+                       help='number of random VirtualFusedVolume queries')
+
+    return parser.parse_args()
+
+
+class PeakRSS:
+    """Track the peak resident memory of this process and of its children.
+
+    Memory is sampled in a background thread while in the context.
+    """
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak = self.sample()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.sample())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.sample())
+
+    @staticmethod
+    def sample():
+        proc = psutil.Process()
+        rss = proc.memory_info().rss
+        for child in proc.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.Error:  # already exited
+                pass
+        return rss
+
+
+class Stage:
+    """Time a stage and track its peak memory."""
+    def __init__(self, name):
+        self.name = name
+        self.seconds = None
+        self.rss = PeakRSS()
+
+    def __enter__(self):
+        logger.info('benchmarking {}...'.format(self.name))
+        self.rss.__enter__()
+        self._t = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.seconds = time.perf_counter() - self._t
+        self.rss.__exit__(exc_type, exc_value, traceback)
+
+    def result(self, n_bytes=None, **kwargs):
+        out = {'seconds': self.seconds, 'peak_rss_mb': self.rss.peak / 2**20}
+        if n_bytes is not None:
+            out['mb'] = n_bytes / 2**20
+            out['mb_per_s'] = out['mb'] / self.seconds
+        out.update(kwargs)
+        return out
+
+
+def tile_bytes(mosaic_dir):
+    """Total size of the tiles in `mosaic_dir`."""
+    return sum(e.stat().st_size for e in os.scandir(mosaic_dir)
+               if e.is_file() and not e.name.endswith('.json'))
+
+
+def make_runner(mosaic_dir, yml_file, mosaic, n_of_workers=None):
+    r = Runner()
+    r.input_folder = mosaic_dir
+    r.output_file = yml_file
+    r.max_dz, r.max_dy, r.max_dx = [2 * m for m in mosaic.max_shift]
+    r.overlap_v = r.overlap_h = mosaic.overlap
+    r.z_samples = 1
+    r.n_of_workers = n_of_workers
+    return r
+
+
+def accuracy(df, ground_truth):
+    """Error of absolute positions with respect to the ground truth.
+
+    Positions are compared relative to the top-left tile.
+
+    Returns
+    -------
+    dict
+        Maximum absolute error and RMS error along each axis (px), and
+        fraction of tiles placed exactly.
+    """
+    keys = ['Zs', 'Ys', 'Xs']
+    df = df.rename(index=os.path.basename)
+    origin = df[(df['X'] == 0) & (df['Y'] == 0) & (df['Z'] == 0)].index[0]
+
+    errors = []
+    for name, true_pos in ground_truth['positions'].items():
+        pos = df.loc[name, keys] - df.loc[origin, keys]
+        errors.append([pos[k] - true_pos[k] for k in keys])
+    errors = np.abs(np.array(errors, dtype=float))
+
+    out = {}
+    for i, k in enumerate(['z', 'y', 'x']):
+        out['max_error_' + k] = errors[:, i].max()
+        out['rms_error_' + k] = np.sqrt(np.mean(errors[:, i] ** 2))
+    out['exact_fraction'] = np.mean(np.all(errors == 0, axis=1))
+    return {k: float(v) for k, v in out.items()}
+
+
+def random_queries(shape, n, rng):
+    """Random queries: whole planes, and boxes of a quarter of the volume."""
+    queries = []
+    for i in range(n):
+        z = int(rng.integers(shape[0]))
+        if i % 2 == 0:
+            queries.append((slice(z, z + 1), Ellipsis))
+            continue
+        size = [max(s // 2, 1) for s in shape[-2:]]
+        start = [int(rng.integers(s - sz + 1)) for s, sz in zip(shape[-2:],
+                                                                size)]
+        queries.append(
+            (slice(z, z + 1), Ellipsis) + tuple(
+                slice(st, st + sz) for st, sz in zip(start, size)))
+    return queries
+
+
+def run_queries(yml_file, n, seed):
+    vfv = VirtualFusedVolume(yml_file)
+    n_bytes = 0
+    for q in random_queries(vfv.shape, n, np.random.default_rng(seed)):
+        n_bytes += vfv[q].nbytes
+    return n_bytes
+
+
+def run_fuse(yml_file, output_filename):
+    fr = FuseRunner(FileMatrix(yml_file))
+    fr.output_filename = output_filename
+    fr.compression = None
+    n_bytes = (np.prod(fr.output_shape) * fr.dtype.itemsize).item()
+    fr.run()
+    return n_bytes
+
+
+def machine_info():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'memory_mb': psutil.virtual_memory().total / 2**20,
+        'numpy': np.__version__,
+    }
+
+
+def run(args, workdir):
+    mosaic_dir = os.path.join(workdir, 'mosaic')
+    yml_file = os.path.join(mosaic_dir, 'stitch.yml')
+    fused_file = os.path.join(workdir, 'fused.tiff')
+
+    mosaic = SyntheticMosaic(args.grid, args.tile_shape, args.overlap,
+                             args.max_shift, args.dtype, args.seed)
+    logger.info('generating mosaic in {}'.format(mosaic_dir))
+    mosaic.write(mosaic_dir, args.fmt)
+    ground_truth = load_ground_truth(mosaic_dir)
+    n_bytes = tile_bytes(mosaic_dir)
+
+    # the two steps of Runner.run(), timed separately
+    r = make_runner(mosaic_dir, yml_file, mosaic, args.n_of_workers)
+    stages = {}
+    with Stage('align') as s:
+        results = r.align_pairs()
+    stages[s.name] = s.result(n_bytes, pairs=len(results),
+                              pairs_per_s=len(results) / s.seconds)
+
+    with Stage('global_optimization') as s:
+        r.finalize(results)
+    r.journal.remove()
+    stages[s.name] = s.result(tiles=len(r.fm.data_frame))
+
+    with Stage('vfv_getitem') as s:
+        q_bytes = run_queries(yml_file, args.n_queries, args.seed)
+    stages[s.name] = s.result(q_bytes, queries=args.n_queries,
+                              queries_per_s=args.n_queries / s.seconds)
+
+    with Stage('fuse') as s:
+        fused_bytes = run_fuse(yml_file, fused_file)
+    stages[s.name] = s.result(fused_bytes)
+
+    return {
+        'version': __version__,
+        'params': {
+            'grid': args.grid,
+            'tile_shape': args.tile_shape,
+            'overlap': args.overlap,
+            'max_shift': args.max_shift,
+            'dtype': args.dtype,
+            'format': args.fmt,
+            'seed': args.seed,
+            'n_of_workers': args.n_of_workers,
+            'n_queries': args.n_queries,
+            'input_mb': n_bytes / 2**20,
+        },
+        'machine': machine_info(),
+        'stages': stages,
+        'accuracy': accuracy(r.fm.data_frame, ground_truth),
+    }
+
+
+def main():
+    args = parse_args()
+
+    if args.workdir is None:
+        workdir = tempfile.mkdtemp(prefix='zetastitcher-benchmark-')
+    else:
+        workdir = args.workdir
+        if os.path.exists(os.path.join(workdir, 'mosaic')):
+            logger.error('{} already contains a mosaic'.format(workdir))
+            sys.exit(1)
+        os.makedirs(workdir, exist_ok=True)
+
+    try:
+        results = run(args, workdir)
+    finally:
+        if not args.keep:
+            shutil.rmtree(os.path.join(workdir, 'mosaic'), ignore_errors=True)
+            try:
+                os.remove(os.path.join(workdir, 'fused.tiff'))
+            except FileNotFoundError:
+                pass
+            if args.workdir is None:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output_file, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    for name, stage in results['stages'].items():
+        logger.info('{:<20} {:8.2f} s  {:10.1f} MB peak RSS'.format(
+            name, stage['seconds'], stage['peak_rss_mb']))
+    logger.info('accuracy: {}'.format(results['accuracy']))
+    logger.info('results saved to {}'.format(args.output_file))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Scaling benchmark of :meth:`.FileMatrix.slices`.
+
+File matrices of growing square grids are built in memory, with tiles
+randomly displaced in `Z`, and the time needed to compute their slices is
+measured. The previous implementation, filtering the whole data frame for
+each tile, can be timed for comparison with ``--pairwise``.
+
+Example::
+
+    python -m zetastitcher.benchmark.slices --sizes 10 20 50 100 --pairwise
+"""
+
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+import networkx as nx
+
+from ..version import __version__
+
+from zetastitcher import FileMatrix
+
+
+def grid_matrix(n, nfrms=100, max_dz=20, seed=0):
+    """A :class:`.FileMatrix` of ``n x n`` tiles, without files.
+
+    Tiles are displaced by a random amount up to `max_dz` frames in `Z`.
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[:n, :n].reshape(2, -1) * 1000
+    df = pd.DataFrame({
+        'X': x, 'Y': y, 'Z': rng.integers(0, max_dz + 1, n * n),
+        'nfrms': nfrms, 'ysize': 1200, 'xsize': 1200,
+        'filename': ['{:06d}_{:06d}.tiff'.format(*t) for t in zip(x, y)],
+    })
+
+    fm = FileMatrix()
+    fm.data_frame = df.set_index('filename').sort_values(['Z', 'Y', 'X'])
+    fm.process_data_frame()
+    return fm
+
+
+def pairwise_slices(fm):
+    """Slices computed as before, with O(N^2) data frame filtering."""
+    G = nx.Graph()
+    for index, row in fm.data_frame.iterrows():
+        G.add_node(index)
+
+    for index, row in fm.data_frame.iterrows():
+        view = fm.data_frame[
+            (fm.data_frame['Z'] <= row['Z'])
+            & (fm.data_frame['Z_end'] >= row['Z_end'])
+            ]
+        pairs = zip(view.index.values[::1], view.index.values[1::1])
+        G.add_edges_from(pairs)
+        G.add_edge((view.index.values[0]), view.index.values[-1])
+
+    for c in nx.connected_components(G):
+        yield G.subgraph(c).copy()
+
+
+def time_slices(func, fm, repeat=3):
+    """Best time of `repeat` runs of `func`, and the number of slices."""
+    best = np.inf
+    for _ in range(repeat):
+        t = time.perf_counter()
+        n = len(list(func(fm)))
+        best = min(best, time.perf_counter() - t)
+    return best, n
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Measure the scaling of FileMatrix.slices().',
+        epilog='Version: {}'.format(__version__),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10, 20, 50, 100, 200],
+                        help='grid sizes (tiles per side)')
+    parser.add_argument('--max-dz', type=int, default=20,
+                        help='maximum random displacement of tiles in Z')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs per size, the best one is reported')
+    parser.add_argument('--pairwise', action='store_true',
+                        help='also time the previous O(N^2) implementation')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    funcs = [('sweep', FileMatrix.slices)]
+    if args.pairwise:
+        funcs.append(('pairwise', pairwise_slices))
+
+    print('{:>8}{:>8}'.format('tiles', 'slices')
+          + ''.join('{:>14}'.format(name + ' [s]') for name, _ in funcs))
+    times = {name: [] for name, _ in funcs}
+    n_tiles = []
+    for size in args.sizes:
+        fm = grid_matrix(size, max_dz=args.max_dz)
+        n_tiles.append(size * size)
+        line = ''
+        for name, func in funcs:
+            t, n = time_slices(func, fm, args.repeat)
+            times[name].append(t)
+            line += '{:>14.4f}'.format(t)
+        print('{:>8}{:>8}'.format(size * size, n) + line)
+
+    if len(n_tiles) > 1:
+        for name, _ in funcs:
+            k = np.polyfit(np.log(n_tiles), np.log(times[name]), 1)[0]
+            print('{}: time ~ N^{:.2f}'.format(name, k))
+
+
+if __name__ == '__main__':
+    main()
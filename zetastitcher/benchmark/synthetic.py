@@ -0,0 +1,198 @@
+"""Generate synthetic mosaics with known tile positions.
+
+A virtual specimen made of randomly placed Gaussian blobs ("cells") is
+sampled by a grid of overlapping tiles. Each tile is displaced from its
+nominal position by a random shift, and gets its own acquisition noise, so
+that overlapping regions are similar but not identical, as with real data.
+
+Tiles are named after their nominal stage position in px (``X_Y.ext``, see
+:func:`.parse_file_name`), and true positions are saved in
+``ground_truth.json`` in the output directory.
+"""
+
+import io
+import os
+import json
+import zipfile
+
+import numpy as np
+import tifffile
+import scipy.ndimage as ndi
+
+FORMAT_TIFF = 'tiff'
+FORMAT_MHD = 'mhd'
+FORMAT_ZIP = 'zip'
+
+FORMATS = [FORMAT_TIFF, FORMAT_MHD, FORMAT_ZIP]
+
+GROUND_TRUTH_FILE = 'ground_truth.json'
+
+# blob size (ZYX, px) and number of blobs per voxel
+BLOB_SIGMA = (1.5, 2.5, 2.5)
+BLOB_DENSITY = 1 / 400
+
+_MET_TYPES = {
+    'i1': 'MET_CHAR', 'u1': 'MET_UCHAR', 'i2': 'MET_SHORT',
+    'u2': 'MET_USHORT', 'i4': 'MET_INT', 'u4': 'MET_UINT', 'f4': 'MET_FLOAT',
+    'f8': 'MET_DOUBLE',
+}
+
+
+class SyntheticMosaic:
+    """A grid of overlapping tiles with random displacements.
+
+    Parameters
+    ----------
+    grid : tuple
+        Number of tiles along Y and X.
+    tile_shape : tuple
+        Shape of each tile (ZYX).
+    overlap : int
+        Nominal overlap between adjacent tiles, along both Y and X.
+    max_shift : tuple
+        Maximum displacement of each tile from its nominal position (ZYX).
+    dtype : str
+        Data type of the tiles.
+    seed : int
+        Seed for the random number generator.
+    """
+    def __init__(self, grid=(3, 3), tile_shape=(64, 512, 512), overlap=64,
+                 max_shift=(3, 8, 8), dtype='uint16', seed=0):
+        self.grid = tuple(grid)
+        self.tile_shape = tuple(tile_shape)
+        self.overlap = overlap
+        self.max_shift = tuple(max_shift)
+        self.dtype = np.dtype(dtype)
+        self.seed = seed
+
+        if overlap <= 2 * max(max_shift[1:]):
+            raise ValueError('overlap must be larger than twice the maximum '
+                             'lateral shift')
+
+        rng = np.random.default_rng(seed)
+
+        # true position of each tile, with a margin of max_shift
+        self.positions = {}
+        for iy in range(self.grid[0]):
+            for ix in range(self.grid[1]):
+                shift = [int(rng.integers(-m, m + 1)) for m in max_shift]
+                nominal = [0] + [i * s for i, s in zip((iy, ix), self.stride)]
+                self.positions[(iy, ix)] = tuple(
+                    m + n + s for m, n, s in zip(max_shift, nominal, shift))
+
+        shape = [
+            m * 2 + t + s * (g - 1) for m, t, s, g in zip(
+                max_shift, tile_shape, (0,) + self.stride, (1,) + self.grid)]
+        self.shape = tuple(shape)
+
+        n_blobs = int(np.prod(self.shape) * BLOB_DENSITY)
+        self.blobs = (rng.random((n_blobs, 3)) * self.shape).astype(np.int64)
+        self.intensities = rng.uniform(0.3, 1, n_blobs).astype(np.float32)
+
+    @property
+    def stride(self):
+        """Nominal distance between adjacent tiles (YX)."""
+        return tuple(t - self.overlap for t in self.tile_shape[1:])
+
+    def tile_name(self, iy, ix, ext):
+        x = ix * self.stride[1]
+        y = iy * self.stride[0]
+        return '{:06d}_{:06d}.{}'.format(x, y, ext)
+
+    def render(self, iy, ix):
+        """Render tile ``(iy, ix)``.
+
+        Returns
+        -------
+        :class:`numpy.ndarray`
+        """
+        pad = [int(np.ceil(4 * s)) for s in BLOB_SIGMA]
+        start = np.array(self.positions[(iy, ix)]) - pad
+        shape = np.array(self.tile_shape) + 2 * np.array(pad)
+
+        rel = self.blobs - start
+        inside = np.all((rel >= 0) & (rel < shape), axis=1)
+
+        a = np.zeros(shape, dtype=np.float32)
+        np.add.at(a, tuple(rel[inside].T), self.intensities[inside])
+        a = ndi.gaussian_filter(a, BLOB_SIGMA)
+        a = a[tuple(slice(p, p + t) for p, t in zip(pad, self.tile_shape))]
+
+        # peak of an isolated blob of unit intensity at half range
+        a *= 0.5 * (2 * np.pi) ** 1.5 * np.prod(BLOB_SIGMA)
+        rng = np.random.default_rng([self.seed, iy, ix])
+        a += rng.normal(0.05, 0.01, a.shape).astype(np.float32)
+        np.clip(a, 0, 1, out=a)
+
+        if np.issubdtype(self.dtype, np.integer):
+            a *= np.iinfo(self.dtype).max
+            np.rint(a, out=a)
+        return a.astype(self.dtype)
+
+    def write(self, out_dir, fmt=FORMAT_TIFF):
+        """Write all tiles and the ground truth to `out_dir`.
+
+        Returns
+        -------
+        list
+            File names of the tiles.
+        """
+        if fmt not in FORMATS:
+            raise ValueError('invalid format {}'.format(fmt))
+        os.makedirs(out_dir, exist_ok=True)
+
+        names = []
+        ground_truth = {}
+        for (iy, ix), pos in self.positions.items():
+            name = self.tile_name(iy, ix, fmt)
+            write_tile(os.path.join(out_dir, name), self.render(iy, ix), fmt)
+            names.append(name)
+
+            origin = self.positions[(0, 0)]
+            ground_truth[name] = dict(zip(['Zs', 'Ys', 'Xs'], [
+                p - o for p, o in zip(pos, origin)]))
+
+        with open(os.path.join(out_dir, GROUND_TRUTH_FILE), 'w') as f:
+            json.dump({
+                'grid': self.grid,
+                'tile_shape': self.tile_shape,
+                'overlap': self.overlap,
+                'max_shift': self.max_shift,
+                'dtype': self.dtype.name,
+                'seed': self.seed,
+                'positions': ground_truth,
+            }, f, indent=2)
+
+        return names
+
+
+def write_tile(fname, a, fmt=FORMAT_TIFF):
+    """Write a ZYX stack in the given format."""
+    if fmt == FORMAT_TIFF:
+        tifffile.imwrite(fname, a)
+    elif fmt == FORMAT_MHD:
+        raw = os.path.splitext(fname)[0] + '.raw'
+        a.astype(a.dtype.newbyteorder('<'), copy=False).tofile(raw)
+        with open(fname, 'w') as f:
+            f.write('ObjectType = Image\n'
+                    'NDims = 3\n'
+                    'BinaryData = True\n'
+                    'BinaryDataByteOrderMSB = False\n'
+                    'DimSize = {} {} {}\n'
+                    'ElementType = {}\n'
+                    'ElementDataFile = {}\n'.format(
+                        a.shape[2], a.shape[1], a.shape[0],
+                        _MET_TYPES[a.dtype.str[1:]], os.path.basename(raw)))
+    elif fmt == FORMAT_ZIP:
+        with zipfile.ZipFile(fname, 'w') as zf:
+            for i, frame in enumerate(a):
+                b = io.BytesIO()
+                tifffile.imwrite(b, frame)
+                zf.writestr('{:06d}.tiff'.format(i), b.getvalue())
+    else:
+        raise ValueError('invalid format {}'.format(fmt))
+
+
+def load_ground_truth(mosaic_dir):
+    with open(os.path.join(mosaic_dir, GROUND_TRUTH_FILE)) as f:
+        return json.load(f)
@@ -3,7 +3,6 @@ import os.path
 import logging
 import argparse
 
-import yaml
 import humanize
 import coloredlogs
 
@@ -13,8 +12,11 @@ import numpy as np
 
 from . import absolute_positions
 from .fuse_runner import FuseRunner
+from .weights import WeightCache, default_directory
+from .virtual_fused_volume import DEFAULT_IO_WORKERS, DEFAULT_PREFETCH_BYTES
 from zetastitcher.align.filematrix import FileMatrix
 from zetastitcher.align.xcorr_filematrix import XcorrFileMatrix
+from zetastitcher.io import project
 
 logger = logging.getLogger(__name__)
 coloredlogs.install(level='INFO', fmt='%(levelname)s [%(name)s]: %(message)s')
@@ -38,10 +40,10 @@ def parse_args():
 
     parser.add_argument(
         'yml_file',
-        help='.yml file produced by stitch align. It will also be used for '
-             'saving absolute coordinates, unless option -w is specified. If a '
-             'directory is specified instead of a file, uses a file named '
-             '"stitch.yml"')
+        help='.yml (or .npz) file produced by stitch align. It will also be '
+             'used for saving absolute coordinates, unless option -w is '
+             'specified. If a directory is specified instead of a file, uses '
+             'a file named "stitch.yml", or "stitch.npz" if only that exists')
 
     group = parser.add_argument_group('output')
     group.add_argument('-o', type=str, dest='output_filename',
@@ -50,13 +52,24 @@ def parse_args():
                             'are computed.')
 
     group.add_argument('-w', type=str, dest='yml_out_file',
-                       help='save data to a different .yml file')
+                       help='save data to a different .yml (or .npz) file')
 
     group.add_argument('-d', dest='debug', action='store_true',
                        help='overlay debug info')
 
     group.add_argument('-c', '--ch', type=int, dest='channel', help='channel')
 
+    group.add_argument('-j', type=int, dest='n_of_workers',
+                       help='number of parallel threads fusing tiles '
+                            '(defaults to number of system cores)')
+
+    group.add_argument('--io-workers', type=int, default=DEFAULT_IO_WORKERS,
+                       metavar='N', help='number of tiles read concurrently')
+
+    group.add_argument('--prefetch-size', type=int, metavar='MB',
+                       default=DEFAULT_PREFETCH_BYTES // 2**20,
+                       help='memory budget for tiles read and not yet fused')
+
     group.add_argument('--compression', type=str, default='zlib', help='int or string')
 
     group.add_argument('--downsample-xy', metavar='S', type=int, required=False,
@@ -81,6 +94,15 @@ def parse_args():
                        help='do not perform global optimization (where '
                             'applicable)')
 
+    group = parser.add_argument_group('blending weights')
+    group.add_argument('--weight-cache-size', type=int, default=1024,
+                       metavar='MB',
+                       help='memory budget for blending weight maps')
+    group.add_argument('--cache-weights', action='store_true',
+                       help='save blending weight maps to a directory next '
+                            'to the .yml file (with suffix .weights), to be '
+                            'reused by later runs')
+
     group = parser.add_argument_group('tile ordering (option -s only)')
     group.add_argument('--iX', action='store_true', dest='invert_x',
                        help='invert tile ordering along X')
@@ -114,7 +136,11 @@ def preprocess_and_check_args(args):
                                                               'invert_' + k))
     else:
         if os.path.isdir(args.yml_file):
-            args.yml_file = os.path.join(args.yml_file, 'stitch.yml')
+            yml_file = os.path.join(args.yml_file, 'stitch.yml')
+            npz_file = os.path.join(args.yml_file, 'stitch.npz')
+            if not os.path.isfile(yml_file) and os.path.isfile(npz_file):
+                yml_file = npz_file
+            args.yml_file = yml_file
         if not os.path.isfile(args.yml_file):
             logger.error(
                 "No stitch file specified or found. Please specify input file "
@@ -124,12 +150,11 @@ def preprocess_and_check_args(args):
         old_abs_mode = None
         # replace None args with values found in yml file
         if os.path.isfile(args.yml_file):
-            with open(args.yml_file, 'r') as f:
-                y = yaml.safe_load(f)
-                try:
-                    old_abs_mode = y['fuser-options']['abs_mode']
-                except KeyError:
-                    pass
+            y = project.read(args.yml_file)
+            try:
+                old_abs_mode = y['fuser-options']['abs_mode']
+            except KeyError:
+                pass
             keys = ['px_size_z', 'px_size_xy', 'ascending_tiles_x',
                     'ascending_tiles_y']
             for k in keys:
@@ -179,8 +204,7 @@ def compute_absolute_positions(args, fm):
 
 
 def append_fuser_options_to_yaml(yml_out_file, args):
-    with open(yml_out_file, 'r') as f:
-        y = yaml.safe_load(f)
+    y = project.read(yml_out_file)
     fr_options = {}
     keys = ['px_size_xy', 'px_size_z']
     if args.abs_mode == ABS_MODE_NOMINAL_POSITIONS:
@@ -191,8 +215,7 @@ def append_fuser_options_to_yaml(yml_out_file, args):
         fr_options[k] = getattr(args, k)
     y['fuser-options'] = fr_options
 
-    with open(yml_out_file, 'w') as f:
-        yaml.dump(y, f, default_flow_style=False)
+    project.write(yml_out_file, y)
 
 
 def main():
@@ -242,12 +265,25 @@ def main():
     # init FuseRunner
     # =========================================================================
     fr = FuseRunner(fm)
+    weight_dir = None
+    if args.cache_weights:
+        if os.path.isfile(fm.input_path):
+            weight_dir = default_directory(fm.input_path)
+        else:
+            logger.warning('no .yml file, blending weights are not saved')
+    fr.vfv.weight_cache = WeightCache(args.weight_cache_size * 2**20,
+                                      weight_dir)
+    fr.vfv.io_workers = args.io_workers
+    fr.vfv.prefetch_bytes = args.prefetch_size * 2**20
     bytes_human = humanize.naturalsize(np.prod(fr.output_shape) * fr.dtype.itemsize, binary=True)
     logger.info(f'fused shape, whole volume: {fr.output_shape}, {bytes_human}')
     if args.output_filename is not None:
 
+        if args.n_of_workers is None:
+            args.n_of_workers = os.cpu_count()
+
         keys = ['zmin', 'zmax', 'output_filename', 'debug', 'channel',
-                'compression', 'downsample_xy']
+                'compression', 'downsample_xy', 'n_of_workers']
 
         for k in keys:
             setattr(fr, k, getattr(args, k))
@@ -1,5 +1,7 @@
+import os
 import re
 import math
+
 import numpy as np
 
 from functools import lru_cache
@@ -11,18 +13,27 @@ def flatten(my_list):
     return [item for sublist in my_list for item in sublist]
 
 
-@lru_cache()
-def squircle_alpha(height, width):
-    squircle = np.zeros((height, width))
+SQUIRCLE_CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+    'zetastitcher')
+"""Per-user directory where :func:`squircle_alpha` maps are saved, to be
+shared among processes. Set to None to disable."""
+
+
+def _squircle_quadrant(height, width):
+    """Bottom-right quadrant of the squircle, before inversion.
+
+    Each pixel takes the value of the first of `N` nested squircles (with
+    increasing size and exponent) it falls into, starting from the one
+    corresponding to its distance from the centre. All pixels are handled
+    at once: at step `n`, squircle `n` is tested for pixels whose search
+    started at or before `n` and has not ended yet.
+    """
     ratio = width / height
     a = math.ceil(width / 2)
     b = math.ceil(height / 2)
-    grid = np.vstack(np.meshgrid(np.linspace(0, b - 1, b),
-                                 np.linspace(0, a - 1, a))).reshape(2, -1).T
-    grid = grid.astype(np.int)
     N = max(a, b)
     ps = np.logspace(np.log10(2), np.log10(50), N)  # exponents
-    # ps = np.ones(N) * 2
     alpha = np.linspace(0, 1, N)
 
     if a > b:
@@ -35,25 +46,44 @@ def squircle_alpha(height, width):
         rbs = np.arange(0, b, drb) + 1
         ras = rbs * ratio
         dra = drb * ratio
+    M = min(N, len(ras), len(rbs))  # number of squircles
 
-    start_y = b - 1 if height % 2 else b
-    start_x = a - 1 if width % 2 else a
+    y, x = np.mgrid[:b, :a].reshape(2, -1)
+    start = np.maximum(x / dra, y / drb).astype(int)
 
-    for y, x in grid:
-        j = x / dra
-        k = y / drb
-        i = int(max(j, k))
-        count = -1  # 0-based
-        for n, p, ra, rb in zip(range(0, N - i), ps[i:], ras[i:], rbs[i:]):
-            count += 1
+    # last squircle if the pixel falls into none, the previous one if there
+    # is none to test
+    found = np.where(start < M, M - 1, start - 1)
 
-            constant = math.pow(x / ra, p) + math.pow(y / rb, p)
+    order = np.argsort(start, kind='stable')
+    start_sorted = start[order]
+    active = np.empty(0, dtype=int)
+    for n in range(M):
+        lo, hi = np.searchsorted(start_sorted, [n, n + 1])
+        active = np.concatenate([active, order[lo:hi]])
+        if not active.size:
+            continue
 
-            if constant < 1:
-                break
+        constant = (np.power(x[active] / ras[n], ps[n])
+                    + np.power(y[active] / rbs[n], ps[n]))
+        inside = constant < 1
+        found[active[inside]] = n
+        active = active[~inside]
+
+    # squared one by one as scalars, as array squaring can round differently
+    alpha2 = np.array([v ** 2 for v in alpha])
+    return alpha2[found].reshape(b, a)
+
+
+def _compute_squircle_alpha(height, width):
+    a = math.ceil(width / 2)
+    b = math.ceil(height / 2)
+    quadrant = _squircle_quadrant(height, width)
 
-        ii = i + count
-        squircle[start_y + y, start_x + x] = alpha[ii] ** 2
+    squircle = np.zeros((height, width))
+    start_y = b - 1 if height % 2 else b
+    start_x = a - 1 if width % 2 else a
+    squircle[start_y:, start_x:] = quadrant
 
     stop_y_up = b - 1 if height % 2 else b
     start_y_down = b
@@ -68,7 +98,92 @@ def squircle_alpha(height, width):
     return squircle
 
 
-def fuse_queue(q, dest, frame_shape, debug=False):
+def _load_squircle_alpha(height, width):
+    """Compute the map, or load it from :data:`SQUIRCLE_CACHE_DIR`."""
+    if SQUIRCLE_CACHE_DIR is None:
+        return _compute_squircle_alpha(height, width)
+
+    path = os.path.join(SQUIRCLE_CACHE_DIR, 'squircle_{}x{}.npy'.format(
+        height, width))
+    try:
+        squircle = np.load(path)
+        if squircle.shape == (height, width):
+            return squircle
+    except (OSError, ValueError):
+        pass
+
+    squircle = _compute_squircle_alpha(height, width)
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        os.makedirs(SQUIRCLE_CACHE_DIR, mode=0o700, exist_ok=True)
+        with open(tmp, 'wb') as f:
+            np.save(f, squircle)
+        os.replace(tmp, path)
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+    return squircle
+
+
+@lru_cache()
+def squircle_alpha(height, width):
+    """Blending weights of a tile plane.
+
+    Weights are 1 at the centre and decrease towards the edges following
+    nested squircles. Maps are kept in memory and saved to
+    :data:`SQUIRCLE_CACHE_DIR`, so that they are computed once for each
+    shape.
+
+    Parameters
+    ----------
+    height, width : int
+        Shape of the map.
+
+    Returns
+    -------
+    :class:`numpy.ndarray`
+        A read-only map.
+    """
+    squircle = _load_squircle_alpha(height, width)
+    squircle.flags.writeable = False
+    return squircle
+
+
+def normalization_factor(frame_shape, rects):
+    """Normalization factor of a tile.
+
+    Parameters
+    ----------
+    frame_shape : tuple
+        Shape of a tile plane (YX).
+    rects : list
+        ``(Y_from, Y_to, X_from, X_to)`` ranges where the tile overlaps a
+        neighbour, relative to the tile.
+
+    Returns
+    -------
+    :class:`numpy.ndarray`
+        Factor of each pixel of a tile plane.
+    """
+    xy_weights = squircle_alpha(*frame_shape)
+    sums = np.copy(xy_weights)
+    for y_from, y_to, x_from, x_to in rects:
+        w = squircle_alpha(*frame_shape)[:y_to - y_from, :x_to - x_from]
+
+        if x_from == 0:
+            w = np.fliplr(w)
+        if y_from == 0:
+            w = np.flipud(w)
+
+        sums[y_from:y_to, x_from:x_to] += w
+
+    with np.errstate(invalid='ignore'):
+        return xy_weights / sums
+
+
+def fuse_queue(q, dest, frame_shape, debug=False, weights=None):
     """Fuse a queue of images along Y, optionally applying padding.
 
     Parameters
@@ -89,6 +204,8 @@ def fuse_queue(q, dest, frame_shape, debug=False):
         Destination array.
     debug: bool
         Whether to overlay debug information (tile edges and numbers).
+    weights : :class:`.WeightCache`
+        If specified, normalization factors are taken from this cache.
     """
 
     while True:
@@ -97,79 +214,89 @@ def fuse_queue(q, dest, frame_shape, debug=False):
         if got is None:
             break
 
-        my_slice, index_dbg, zfrom_dbg, sl, pos, overlaps = got
+        weigh(got, frame_shape, debug, weights)
+        accumulate(dest, got)
+
+        q.task_done()
 
-        z_from = pos[0]
-        z_to = z_from + my_slice.shape[0]
 
-        y_from = pos[1]
-        y_to = y_from + my_slice.shape[-2]
+def weigh(item, frame_shape, debug=False, weights=None):
+    """Apply blending weights to an element of the fusion queue, in place.
 
-        x_from = pos[2]
-        x_to = x_from + my_slice.shape[-1]
+    See :func:`fuse_queue` for a description of the parameters.
+    """
+    my_slice, index_dbg, zfrom_dbg, sl, pos, overlaps = item
 
-        if overlaps is not None:
-            z = np.array(flatten(overlaps[['Z_from', 'Z_to']].values))
-            z = np.unique(z)
-            z = np.sort(z)
+    z_to = pos[0] + my_slice.shape[0]
 
-            xy_weights = squircle_alpha(*frame_shape)
+    if overlaps is not None:
+        z = np.array(flatten(overlaps[['Z_from', 'Z_to']].values))
+        z = np.unique(z)
+        z = np.sort(z)
 
-            z_list = list(zip(z, z[1::]))
-            try:
-                z_list += [(z[-1], None)]
-            except IndexError:
-                pass
-
-            for zfrom, zto in z_list:
-                sums = np.copy(xy_weights)
-                condition = (overlaps['Z_from'] <= zfrom)
-                if zto is not None:
-                    condition = condition & (zto <= (overlaps['Z_to']))
-                else:
-                    condition = condition & (overlaps['Z_to'] >= z_to)
-
-                for _, row in overlaps[condition].iterrows():
-                    width = row.X_to - row.X_from
-                    height = row.Y_to - row.Y_from
-                    area = width * height
-                    if not area:
-                        continue
-
-                    w = squircle_alpha(*frame_shape)[:height, :width]
-
-                    if row.X_from == 0:
-                        w = np.fliplr(w)
-                    if row.Y_from == 0:
-                        w = np.flipud(w)
-
-                    xy_index = np.index_exp[row.Y_from:row.Y_to,
-                                            row.X_from:row.X_to]
-                    sums[xy_index] += w
-
-                if zto is None:
-                    slice_index = np.index_exp[zfrom:, ...]
-                else:
-                    slice_index = np.index_exp[zfrom:zto, ...]
-
-                with np.errstate(invalid='ignore'):
-                    factor = xy_weights / sums
-
-                if sl is not None:
-                    factor = factor[sl[-2::]]
-
-                my_slice[slice_index] *= factor
-
-        if debug:
-            overlay_debug(my_slice, index_dbg, zfrom_dbg)
-            my_slice[..., -2:, :] = 65000
-            my_slice[..., -2:] = 65000
-
-        output_roi_index = np.index_exp[z_from:z_to, ..., y_from:y_to,
-                                        x_from:x_to]
-        dest[output_roi_index] += my_slice
+        z_list = list(zip(z, z[1::]))
+        try:
+            z_list += [(z[-1], None)]
+        except IndexError:
+            pass
 
-        q.task_done()
+        for zfrom, zto in z_list:
+            condition = (overlaps['Z_from'] <= zfrom)
+            if zto is not None:
+                condition = condition & (zto <= (overlaps['Z_to']))
+            else:
+                condition = condition & (overlaps['Z_to'] >= z_to)
+
+            rects = [r for r in overlaps.loc[
+                condition, ['Y_from', 'Y_to', 'X_from', 'X_to']].values
+                if (r[1] - r[0]) * (r[3] - r[2])]
+
+            if weights is None:
+                factor = normalization_factor(frame_shape, rects)
+            else:
+                factor = weights.get(frame_shape, rects)
+
+            if zto is None:
+                slice_index = np.index_exp[zfrom:, ...]
+            else:
+                slice_index = np.index_exp[zfrom:zto, ...]
+
+            if sl is not None:
+                factor = factor[sl[-2::]]
+
+            my_slice[slice_index] *= factor
+
+    if debug:
+        overlay_debug(my_slice, index_dbg, zfrom_dbg)
+        my_slice[..., -2:, :] = 65000
+        my_slice[..., -2:] = 65000
+
+
+def accumulate(dest, item, rows=None):
+    """Add a weighted element of the fusion queue to `dest`.
+
+    If `rows` (a :class:`slice` along Y, with unit step) is specified, only
+    those rows of the element are added, so that disjoint rows of the same
+    element can be added concurrently.
+    """
+    my_slice, _, _, _, pos, _ = item
+
+    y_from = pos[1]
+    if rows is not None:
+        my_slice = my_slice[..., rows, :]
+        y_from += rows.start
+
+    z_from = pos[0]
+    z_to = z_from + my_slice.shape[0]
+
+    y_to = y_from + my_slice.shape[-2]
+
+    x_from = pos[2]
+    x_to = x_from + my_slice.shape[-1]
+
+    output_roi_index = np.index_exp[z_from:z_to, ..., y_from:y_to,
+                                    x_from:x_to]
+    dest[output_roi_index] += my_slice
 
 
 def overlay_debug(slice, index, z_from):
@@ -44,6 +44,14 @@ class FuseRunner(object):
     def debug(self, value):
         self.vfv.overlay_debug_enabled = value
 
+    @property
+    def n_of_workers(self):
+        return self.vfv.n_of_workers
+
+    @n_of_workers.setter
+    def n_of_workers(self, value):
+        self.vfv.n_of_workers = value
+
     @property
     def is_multichannel(self):
         if self.channel is not None:
@@ -4,20 +4,27 @@ import math
 import os.path
 import logging
 import threading
+import concurrent.futures
 
 from queue import Queue
+from collections import deque
 from functools import lru_cache
 
 import numpy as np
 
 from zetastitcher.align.filematrix import FileMatrix
 from zetastitcher.io.inputfile import InputFile
+from zetastitcher.io import metadata_cache
 from zetastitcher.fuse.overlaps import Overlaps
-from zetastitcher.fuse.fuse import fuse_queue
+from zetastitcher.fuse.fuse import weigh, accumulate
+from zetastitcher.fuse.weights import WeightCache
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
+DEFAULT_IO_WORKERS = 4
+DEFAULT_PREFETCH_BYTES = 1 << 30
+
 
 def to_dtype(x, dtype):
     if x.dtype == dtype:
@@ -71,14 +78,39 @@ class VirtualFusedVolume:
 
         self._debug = False
 
+        self.weight_cache = WeightCache()
+        """A :class:`.WeightCache` of blending weights, shared among
+        queries. Replace it to change its memory budget, or to save weights
+        to disk."""
+
         infile = os.path.join(self.path, self.fm.data_frame.iloc[0].name)
-        with InputFile(infile) as f:
-            self.temp_shape = list(f.shape)
-            self.dtype = f.dtype
-            self.nchannels = f.nchannels
+        entry = metadata_cache.lookup(infile)
+        if entry is not None:
+            self.temp_shape = [entry['nfrms'], entry['nchannels'],
+                               entry['ysize'], entry['xsize']]
+            if entry['nchannels'] == 1:
+                del self.temp_shape[1]
+            self.dtype = np.dtype(entry['dtype'])
+            self.nchannels = entry['nchannels']
+        else:
+            with InputFile(infile) as f:
+                self.temp_shape = list(f.shape)
+                self.dtype = f.dtype
+                self.nchannels = f.nchannels
 
         self.squeeze_enabled = True
 
+        self.n_of_workers = 1
+        """Number of threads weighting and summing tiles in parallel.
+        Results do not depend on this setting."""
+
+        self.io_workers = DEFAULT_IO_WORKERS
+        """Number of tiles read concurrently."""
+
+        self.prefetch_bytes = DEFAULT_PREFETCH_BYTES
+        """Memory budget for tiles read and not yet summed. A tile larger
+        than the budget is read when no other tile is held."""
+
     @property
     def overlay_debug_enabled(self):
         """Whether to overlay debug information (tile edges and numbers).
@@ -99,10 +131,7 @@ class VirtualFusedVolume:
         """
         thickness = self.fm.full_thickness
 
-        infile = os.path.join(self.path, self.fm.data_frame.iloc[0].name)
-        with InputFile(infile) as f:
-            output_shape = list(f.shape)
-
+        output_shape = list(self.temp_shape)
         output_shape[0] = thickness
         output_shape[-2] = self.fm.full_height
         output_shape[-1] = self.fm.full_width
@@ -222,60 +251,138 @@ class VirtualFusedVolume:
 
         fused = np.zeros(output_shape, dtype=dtype)
 
-        q = Queue(maxsize=20)
+        blend = not (self.ov is None or df.shape[0] == 1)
+        tiles = ((index, Xs, tuple(sl)) for index, Xs, sl
+                 in self._my_gen(df, X_min, X_stop, steps, myitem[:]))
+
+        self._fuse(fused, tiles, dtype, X_min, steps, blend)
 
-        t = threading.Thread(
-            target=fuse_queue,
-            args=(q, fused, self.temp_shape[-2::]),
-            kwargs={
-                'debug': self._debug,
-            }
-        )
-        t.start()
+        fused = to_dtype(fused, self.dtype)
 
-        for index, Xs, sl in self._my_gen(df, X_min, X_stop, steps, myitem[:]):
-            logger.info('loading {}\t{}'.format(index, sl))
-            with InputFile(os.path.join(self.path, index)) as f:
-                f.squeeze = False
-                sl_a = np.copy(f[tuple(sl)]).astype(dtype)
+        ie = tuple([slice(None, None, flip) for flip in flip_axis])
+        fused = fused[ie]
 
-            z_from = sl[0].start
-            z_to = sl[0].stop
+        if self.squeeze_enabled:
+            return np.squeeze(fused)
+        return fused
 
-            x_from = np.array([sl[i].start for i in [0, -2, -1]])
+    def _load(self, index, Xs, sl, dtype, X_min, steps, blend):
+        """Read a tile and make an element of the fusion queue (see
+        :func:`.fuse_queue`)."""
+        logger.info('loading {}\t{}'.format(index, sl))
+        with InputFile(os.path.join(self.path, index)) as f:
+            f.squeeze = False
+            sl_a = np.copy(f[sl]).astype(dtype)
 
-            Top_left = Xs + x_from
-            top_left = (Top_left - X_min) // steps
+        z_from = sl[0].start
+        z_to = sl[0].stop
 
-            if self.ov is None or df.shape[0] == 1:
-                overlaps = None
-            else:
-                overlaps = self.ov[index]
-                overlaps = overlaps.loc[
-                    (overlaps['Z_from'] <= z_to) & (overlaps['Z_to'] >= z_from)
-                    ].copy()
+        x_from = np.array([sl[i].start for i in [0, -2, -1]])
 
-                overlaps['Z_from'] -= z_from
-                overlaps['Z_to'] -= z_from
-                overlaps['Z_to'] /= abs(sl[0].step)
-                overlaps['Z_to'] = overlaps['Z_to'].apply(np.round).astype(int)
+        Top_left = Xs + x_from
+        top_left = (Top_left - X_min) // steps
 
-                overlaps.loc[overlaps['Z_from'] < 0, 'Z_from'] = 0
+        if not blend:
+            overlaps = None
+        else:
+            overlaps = self.ov[index]
+            overlaps = overlaps.loc[
+                (overlaps['Z_from'] <= z_to) & (overlaps['Z_to'] >= z_from)
+                ].copy()
 
-            q.put([sl_a, index, z_from, tuple(sl), top_left, overlaps])
+            overlaps['Z_from'] -= z_from
+            overlaps['Z_to'] -= z_from
+            overlaps['Z_to'] /= abs(sl[0].step)
+            overlaps['Z_to'] = overlaps['Z_to'].apply(np.round).astype(int)
 
-        q.put(None)  # close queue
+            overlaps.loc[overlaps['Z_from'] < 0, 'Z_from'] = 0
 
-        t.join()  # wait for fuse thread to finish
+        return [sl_a, index, z_from, sl, top_left, overlaps]
 
-        fused = to_dtype(fused, self.dtype)
+    def _fuse(self, fused, tiles, dtype, X_min, steps, blend):
+        """Read, weigh and sum tiles into `fused`.
 
-        ie = tuple([slice(None, None, flip) for flip in flip_axis])
-        fused = fused[ie]
+        Tiles are read by :attr:`io_workers` threads, as many at a time as
+        :attr:`prefetch_bytes` allows, and weighted by :attr:`n_of_workers`
+        threads as soon as they are read. Tiles are summed in query order,
+        each one split in blocks of rows summed concurrently, so that the
+        result does not depend on the order in which reads complete.
+        """
+        n = self.n_of_workers
+        frame_shape = self.temp_shape[-2::]
+        ready = Queue()  # tiles read, in completion order
+
+        def read(fut, index, Xs, sl):
+            try:
+                item = self._load(index, Xs, sl, dtype, X_min, steps, blend)
+            except BaseException as e:
+                fut.set_exception(e)
+            else:
+                ready.put((fut, item))
+
+        def weigh_ready():
+            while True:
+                got = ready.get()
+                if got is None:
+                    break
+                fut, item = got
+                try:
+                    weigh(item, frame_shape, self._debug, self.weight_cache)
+                except BaseException as e:
+                    fut.set_exception(e)
+                else:
+                    fut.set_result(item)
+
+        def add(item):
+            if n == 1:
+                accumulate(fused, item)
+                return
+            bounds = np.linspace(0, item[0].shape[-2], n + 1).astype(int)
+            futs = [adders.submit(accumulate, fused, item, slice(a, b))
+                    for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+            for fut in futs:
+                fut.result()
+
+        weighers = [threading.Thread(target=weigh_ready) for _ in range(n)]
+        for t in weighers:
+            t.start()
+
+        readers = concurrent.futures.ThreadPoolExecutor(self.io_workers)
+        adders = concurrent.futures.ThreadPoolExecutor(n)
+        pending = deque()  # (weighted tile, size), in query order
+        reads = []
+        held = 0
+        try:
+            for index, Xs, sl in tiles:
+                nbytes = self._nbytes(sl, dtype)
+                while pending and held + nbytes > self.prefetch_bytes:
+                    fut, size = pending.popleft()
+                    add(fut.result())
+                    held -= size
+
+                fut = concurrent.futures.Future()
+                reads.append(readers.submit(read, fut, index, Xs, sl))
+                pending.append((fut, nbytes))
+                held += nbytes
+
+            while pending:
+                fut, _ = pending.popleft()
+                add(fut.result())
+        finally:
+            for r in reads:
+                r.cancel()
+            readers.shutdown()
+            adders.shutdown()
+            for _ in weighers:
+                ready.put(None)
+            for t in weighers:
+                t.join()
 
-        if self.squeeze_enabled:
-            return np.squeeze(fused)
-        return fused
+    @staticmethod
+    def _nbytes(sl, dtype):
+        """Size in bytes of the hyperslice `sl` of a tile."""
+        return np.dtype(dtype).itemsize * math.prod(
+            len(range(s.start, s.stop, s.step)) for s in sl)
 
     @staticmethod
     def _my_gen(df, X_min, X_stop, steps, sl):
@@ -0,0 +1,128 @@
+"""Cache of blending weight maps.
+
+When fusing, each plane of a tile is multiplied by a normalization factor,
+the ratio between the blending weight of the tile and the sum of the
+weights of all tiles overlapping there. For a given frame shape, the factor
+only depends on the rectangles where the tile overlaps its neighbours. These
+are fixed for a stitched volume, so that factors are computed once and kept
+in a :class:`WeightCache`, optionally saved to disk to be reused by later
+runs.
+"""
+
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from zetastitcher.fuse.fuse import normalization_factor
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+DEFAULT_MAX_BYTES = 1 << 30
+
+
+def default_directory(project_file):
+    """Directory where weight maps of a stitch project are saved."""
+    return project_file + '.weights'
+
+
+class WeightCache:
+    """Normalization factors, kept in memory and optionally on disk.
+
+    Factors are evicted from memory in least recently used order when their
+    total size exceeds `max_bytes`. Factors saved to disk are named after a
+    hash of their key, so that they never go stale: factors of previous
+    alignments remain unused in `directory` until removed.
+
+    Parameters
+    ----------
+    max_bytes : int
+        Memory budget.
+    directory : str
+        If specified, factors are saved to and loaded from this directory.
+    """
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, directory=None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._factors = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, frame_shape, rects):
+        """Normalization factor, see :func:`.normalization_factor`."""
+        key = (tuple(int(s) for s in frame_shape),
+               tuple(tuple(int(v) for v in r) for r in rects))
+
+        with self._lock:
+            factor = self._factors.get(key)
+            if factor is not None:
+                self._factors.move_to_end(key)
+                self.hits += 1
+                return factor
+            self.misses += 1
+
+        factor = self._load(key)
+        if factor is None:
+            factor = normalization_factor(*key)
+            self._save(key, factor)
+        factor.flags.writeable = False  # shared among queries
+
+        self._put(key, factor)
+        return factor
+
+    def clear(self):
+        """Empty the memory cache."""
+        with self._lock:
+            self._factors.clear()
+            self.nbytes = 0
+
+    def _put(self, key, factor):
+        if factor.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._factors:
+                return
+            self._factors[key] = factor
+            self.nbytes += factor.nbytes
+            while self.nbytes > self.max_bytes:
+                _, f = self._factors.popitem(last=False)
+                self.nbytes -= f.nbytes
+
+    def _path(self, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.directory, digest + '.npy')
+
+    def _load(self, key):
+        if self.directory is None:
+            return None
+        try:
+            return np.load(self._path(key))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning('ignoring invalid weight map {}: {}'.format(
+                self._path(key), e))
+            return None
+
+    def _save(self, key, factor):
+        if self.directory is None:
+            return
+        path = self._path(key)
+        tmp = '{}.{}.{}.tmp'.format(path, os.getpid(), threading.get_ident())
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp, 'wb') as f:
+                np.save(f, factor)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning('cannot save weight map {}: {}'.format(path, e))
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
@@ -16,12 +16,43 @@ from .mhdwrapper import MHDWrapper
 from zipfile import BadZipFile
 
 from zetastitcher.io.inputfile_mixin import InputFileMixin
+from zetastitcher.io import metadata_cache
+
+
+def _dcimg_file(file_path):
+    return dcimg.DCIMGFile(file_path)
+
+
+def _pims_wrapper(file_path):
+    from .pims_wrapper import PimsWrapper
+    return PimsWrapper(file_path)
+
+
+def _openers():
+    """Wrapper types, in the order they are tried.
+
+    Returns
+    -------
+    list
+        ``(name, opener, errors)`` tuples, where `errors` are the exceptions
+        raised by `opener` when the file is not of its type.
+    """
+    return [
+        ('TiffWrapper', TiffWrapper, (ValueError, IndexError, TiffFileError)),
+        ('DCIMGFile', _dcimg_file, (NameError, ValueError, IsADirectoryError)),
+        ('ZipWrapper', ZipWrapper,
+         (AttributeError, NameError, IsADirectoryError, BadZipFile)),
+        ('MHDWrapper', MHDWrapper, (ValueError, IndexError, IsADirectoryError)),
+        ('FFMPEGWrapper', FFMPEGWrapper, (ValueError, FileNotFoundError)),
+        ('PimsWrapper', _pims_wrapper, (Exception,)),
+    ]
 
 
 class InputFile(InputFileMixin):
-    def __init__(self, file_path=None):
+    def __init__(self, file_path=None, metadata_cache=True):
         super().__init__()
         self.file_path = file_path
+        self.use_metadata_cache = metadata_cache
         self.wrapper = None
         self._channel = None
         self.squeeze = True
@@ -124,42 +155,28 @@ class InputFile(InputFileMixin):
         if not self.path.exists():
             raise FileNotFoundError(self.path)
 
-        try:
-            self.wrapper = TiffWrapper(self.file_path)
-            return
-        except (ValueError, IndexError, TiffFileError):
-            pass
-
-        try:
-            self.wrapper = dcimg.DCIMGFile(self.file_path)
-            return
-        except (NameError, ValueError, IsADirectoryError):
-            pass
-
-        try:
-            self.wrapper = ZipWrapper(self.file_path)
-            return
-        except (AttributeError, NameError, IsADirectoryError, BadZipFile):
-            pass
-
-        try:
-            self.wrapper = MHDWrapper(self.file_path)
-            return
-        except (ValueError, IndexError, IsADirectoryError):
-            pass
-
-        try:
-            self.wrapper = FFMPEGWrapper(self.file_path)
-            return
-        except (ValueError, FileNotFoundError):
-            pass
-
-        from .pims_wrapper import PimsWrapper
-        try:
-            self.wrapper = PimsWrapper(self.file_path)
-            return
-        except:
-            pass
+        openers = _openers()
+
+        # try first the wrapper that opened the file last time
+        entry = None
+        if self.use_metadata_cache:
+            entry = metadata_cache.lookup(self.path)
+        if entry is not None:
+            for name, opener, errors in openers:
+                if name != entry['wrapper']:
+                    continue
+                try:
+                    self.wrapper = opener(self.file_path)
+                    return
+                except errors:
+                    break
+
+        for name, opener, errors in openers:
+            try:
+                self.wrapper = opener(self.file_path)
+                return
+            except errors:
+                pass
 
         raise ValueError('Unsupported file type')
 
@@ -223,6 +240,57 @@ class InputFile(InputFileMixin):
                 a[z] = self.wrapper.frame(i)
                 z += 1
 
+        return self._to_output_layout(a)
+
+    def roi(self, z_from, z_to, y=None, x=None, dtype=None, copy=True):
+        """Return a region of interest, i.e. a substack cropped in the XY plane.
+
+        Wrappers that can read only the requested region (e.g. memory mapped
+        or strip/tile-selective decoding) are asked to do so, otherwise the
+        substack is read with :func:`zslice` and then cropped.
+
+        Parameters
+        ----------
+        z_from : int
+            Start frame.
+        z_to : int
+            Stop frame (noninclusive).
+        y : :class:`slice`
+            Rows to read (defaults to all rows).
+        x : :class:`slice`
+            Columns to read (defaults to all columns).
+        dtype
+
+        Returns
+        -------
+        :class:`numpy.ndarray`
+            A numpy array, see :func:`zslice`.
+        """
+        if y is None:
+            y = slice(None)
+        if x is None:
+            x = slice(None)
+
+        if dtype is None:
+            dtype = self.dtype
+
+        ok = False
+        try:
+            ok = callable(getattr(self.wrapper, 'roi'))
+        except AttributeError:
+            pass
+
+        if ok:
+            a = self.wrapper.roi(z_from, z_to, y, x, dtype, copy)
+            return self._to_output_layout(a)
+
+        a = self.zslice(z_from, z_to, 1, dtype, copy=False)
+        a = a[..., y, x]
+        if copy:
+            a = np.copy(a)
+        return a
+
+    def _to_output_layout(self, a):
         if self.channel is not None:
             a = a[..., self.channel]
         elif self.nchannels > 1 and a.ndim >= 3:
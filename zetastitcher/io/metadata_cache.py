@@ -0,0 +1,149 @@
+"""Persistent cache of tile metadata.
+
+Reading the shape of a tile requires finding a wrapper able to open it and
+parsing its header, which is slow for large mosaics on network filesystems.
+Metadata of tiles (shape, dtype, number of channels and wrapper type) is
+therefore saved in a sidecar file (:data:`CACHE_FILE`) in the directory
+containing the tiles. Entries are validated with the size and modification
+time of the tile only, without opening it.
+
+The sidecar file is written by :meth:`.FileMatrix.load_dir`, and used by
+:class:`.InputFile` to pick the right wrapper at once.
+"""
+
+import os
+import json
+import logging
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+CACHE_FILE = '.zetastitcher-meta.json'
+VERSION = 1
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def _stat(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+class MetadataCache:
+    """Metadata of the tiles in a directory.
+
+    Use :meth:`of` to get the (shared) cache of the directory containing a
+    tile.
+
+    Parameters
+    ----------
+    directory : str
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, CACHE_FILE)
+        self.entries = {}
+        self.dirty = False
+        self._lock = threading.Lock()
+        self._load()
+
+    @classmethod
+    def of(cls, path):
+        """The cache of the directory containing `path`."""
+        return cls.of_directory(os.path.dirname(os.path.abspath(path)))
+
+    @classmethod
+    def of_directory(cls, directory):
+        """The cache of `directory`."""
+        directory = os.path.abspath(directory)
+        with _caches_lock:
+            cache = _caches.get(directory)
+            if cache is None:
+                cache = _caches[directory] = cls(directory)
+            return cache
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                d = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            logger.warning('ignoring invalid metadata cache {}'.format(
+                self.path))
+            return
+
+        if d.get('version') == VERSION:
+            self.entries = d['files']
+
+    def get(self, path):
+        """Metadata of `path`, if cached and still valid.
+
+        Returns
+        -------
+        dict
+            With keys `nfrms`, `ysize`, `xsize`, `nchannels`, `dtype` and
+            `wrapper`, or None.
+        """
+        with self._lock:
+            entry = self.entries.get(os.path.basename(path))
+        if entry is None:
+            return None
+
+        try:
+            size, mtime = _stat(path)
+        except OSError:
+            return None
+        if entry['size'] != size or entry['mtime'] != mtime:
+            return None
+        return entry
+
+    def put(self, path, infile):
+        """Store the metadata of `path`, opened as `infile`."""
+        size, mtime = _stat(path)
+        entry = {
+            'size': size,
+            'mtime': mtime,
+            'nfrms': int(infile.nfrms),
+            'ysize': int(infile.ysize),
+            'xsize': int(infile.xsize),
+            'nchannels': int(infile.nchannels),
+            'dtype': np.dtype(infile.dtype).str,
+            'wrapper': type(infile.wrapper).__name__,
+        }
+        with self._lock:
+            self.entries[os.path.basename(path)] = entry
+            self.dirty = True
+
+    def save(self):
+        """Write the cache file, if changed.
+
+        Failures (e.g. a read-only directory) are logged and ignored.
+        """
+        with self._lock:
+            if not self.dirty:
+                return
+            d = {'version': VERSION, 'files': dict(self.entries)}
+            self.dirty = False
+
+        tmp = '{}.{}.tmp'.format(self.path, os.getpid())
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(d, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.debug('cannot write metadata cache {}: {}'.format(
+                self.path, e))
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+
+def lookup(path):
+    """Cached metadata of `path`, see :meth:`MetadataCache.get`."""
+    return MetadataCache.of(path).get(path)
@@ -121,3 +121,11 @@ class MHDWrapper(InputFileMixin):
         if copy:
             a = np.copy(a)
         return a
+
+    def roi(self, z_from, z_to, y, x, dtype=None, copy=True):
+        a = self.a[z_from:z_to, y, x]
+        if dtype is not None:
+            return a.astype(dtype)
+        if copy:
+            a = np.copy(a)
+        return a
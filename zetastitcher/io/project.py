@@ -0,0 +1,165 @@
+"""Reading and writing of stitch project files.
+
+A project file (e.g. ``stitch.yml``) holds the tables of tile positions
+(``filematrix``) and of pairwise alignment results (``xcorr``), together
+with dictionaries of options (``xcorr-options``, ``fuser-options``) and
+tile fingerprints. Two formats are supported, chosen by file extension:
+
+* YAML (any extension other than ``.npz``): human readable, slow to parse
+  when there are many alignment results.
+* Compressed NumPy archive (``.npz``): each table column is stored as a
+  typed array and loaded straight into a :class:`pandas.DataFrame`;
+  dictionaries are stored as JSON.
+
+Example usage:
+
+>>> p = read('stitch.yml')
+>>> p['xcorr'].head()
+>>> write('stitch.npz', p)
+"""
+
+import os
+import json
+import copy
+import logging
+import threading
+
+import yaml
+import numpy as np
+import pandas as pd
+from cachetools import LRUCache
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+NPZ_EXT = '.npz'
+
+TABLES = ['filematrix', 'xcorr']
+"""Sections holding tables, read as :class:`pandas.DataFrame` objects."""
+
+_META_KEY = 'meta'
+
+# the LibYAML parser, when available, is much faster
+_YAMLLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+CACHE_SIZE = 4
+"""Number of parsed project files kept in memory."""
+
+_cache = LRUCache(maxsize=CACHE_SIZE)
+_cache_lock = threading.Lock()
+
+
+def is_npz(fname):
+    """Whether `fname` is (to be) saved in the ``.npz`` format."""
+    return os.path.splitext(str(fname))[1].lower() == NPZ_EXT
+
+
+def _records(table):
+    if isinstance(table, pd.DataFrame):
+        return json.loads(table.to_json(orient='records'))
+    return table
+
+
+def _stat(fname):
+    st = os.stat(fname)
+    return st.st_size, st.st_mtime_ns
+
+
+def _read_yaml(fname):
+    with open(fname, 'r') as f:
+        y = yaml.load(f, Loader=_YAMLLoader)
+    for k in TABLES:
+        if k in y:
+            y[k] = pd.DataFrame(y[k])
+    return y
+
+
+def _read_npz(fname):
+    with np.load(fname, allow_pickle=False) as npz:
+        meta = json.loads(str(npz[_META_KEY]))
+        p = meta['sections']
+        for k, columns in meta['tables'].items():
+            p[k] = pd.DataFrame(
+                {c: npz['{}/{}'.format(k, c)] for c in columns},
+                columns=columns)
+    return p
+
+
+def _write_yaml(fname, project):
+    y = {k: _records(v) if k in TABLES else v for k, v in project.items()}
+    with open(fname, 'w') as f:
+        yaml.dump(y, f, default_flow_style=False)
+
+
+def _write_npz(fname, project):
+    arrays = {}
+    meta = {'tables': {}, 'sections': {}}
+    for k, v in project.items():
+        if k not in TABLES:
+            meta['sections'][k] = v
+            continue
+        df = pd.DataFrame(v)
+        meta['tables'][k] = [str(c) for c in df.columns]
+        for c in df.columns:
+            a = df[c].to_numpy()
+            if a.dtype == object:  # file names
+                a = a.astype(str)
+            arrays['{}/{}'.format(k, c)] = a
+
+    arrays[_META_KEY] = np.array(json.dumps(
+        meta, default=lambda o: o.item()))  # numpy scalars
+    with open(fname, 'wb') as f:
+        np.savez_compressed(f, **arrays)
+
+
+def read(fname):
+    """Read a project file.
+
+    The last :data:`CACHE_SIZE` parsed files are kept in memory while they
+    are not modified, so that reading the same file again is fast.
+
+    Parameters
+    ----------
+    fname : str
+
+    Returns
+    -------
+    dict
+        Sections of the project file. Sections listed in :data:`TABLES` are
+        :class:`pandas.DataFrame` objects.
+    """
+    fname = os.path.abspath(fname)
+    key = _stat(fname)
+    with _cache_lock:
+        cached = _cache.get(fname)
+    if cached is None or cached[0] != key:
+        logger.debug('parsing {}'.format(fname))
+        p = _read_npz(fname) if is_npz(fname) else _read_yaml(fname)
+        cached = (key, p)
+        with _cache_lock:
+            _cache[fname] = cached
+
+    # callers are free to modify what they get
+    p = cached[1]
+    return {k: v.copy() if isinstance(v, pd.DataFrame) else copy.deepcopy(v)
+            for k, v in p.items()}
+
+
+def write(fname, project):
+    """Write a project file, in the format given by its extension.
+
+    Parameters
+    ----------
+    fname : str
+    project : dict
+        Sections of the project file. Tables can be given either as
+        :class:`pandas.DataFrame` objects or as lists of records.
+    """
+    with _cache_lock:
+        _cache.pop(os.path.abspath(fname), None)
+
+    if is_npz(fname):
+        _write_npz(fname, project)
+    else:
+        _write_yaml(fname, project)
+
@@ -1,3 +1,5 @@
+import math
+import inspect
 from pathlib import Path
 
 import numpy as np
@@ -15,6 +17,8 @@ class TiffWrapper(InputFileMixin):
         self.flist = None
         self.glob_mode = False
         self.axes = None
+        self._contiguous = None
+        self._segment_decoding = None
 
         if file_path is not None:
             self.file_path = Path(file_path)
@@ -91,3 +95,155 @@ class TiffWrapper(InputFileMixin):
         if dtype is None:
             return a
         return a.astype(dtype)
+
+    def roi(self, z_from, z_to, y, x, dtype=None, copy=True):
+        """Read a substack cropped in the XY plane.
+
+        Uncompressed contiguous files are memory mapped, so that only the
+        requested rows are actually read. For compressed files, only the
+        strips or tiles intersecting the region are decoded, if supported by
+        the installed version of tifffile. Otherwise, the substack is read
+        with :meth:`zslice` and then cropped.
+        """
+        y_start, y_stop, y_step = y.indices(self.ysize)
+        x_start, x_stop, x_step = x.indices(self.xsize)
+
+        if (y_step != 1 or x_step != 1 or self.glob_mode or 'C' in self.axes
+                or not self._one_page_per_frame()):
+            a = None
+        elif self.is_contiguous:
+            a = self._memmap()
+            if a is not None:
+                a = a[z_from:z_to, y, x]
+                if copy or dtype is not None:
+                    a = np.array(a, dtype=self.dtype if dtype is None else dtype)
+                return a
+        elif self.segment_decoding:
+            zrange = range(*slice(z_from, z_to).indices(self.nfrms))
+            a = self._decode_roi(zrange, y_start, y_stop, x_start, x_stop)
+            if dtype is None:
+                return a
+            return a.astype(dtype)
+
+        a = self.zslice(z_from, z_to, 1, copy=False)
+        if a.ndim == (3 if self.nchannels > 1 else 2):
+            a = a[np.newaxis]
+        a = a[:, y, x]
+        if dtype is not None:
+            return a.astype(dtype)
+        if copy:
+            a = np.copy(a)
+        return a
+
+    @property
+    def is_contiguous(self):
+        """Whether image data is stored uncompressed and contiguously."""
+        if self._contiguous is None:
+            series = self.tfile.series[0]
+            try:
+                offset = series.dataoffset
+            except AttributeError:
+                offset = series.offset  # tifffile < 2022.4.22
+            self._contiguous = offset is not None
+        return self._contiguous
+
+    @property
+    def segment_decoding(self):
+        """Whether single strips or tiles can be decoded, see :meth:`roi`.
+
+        Decoding relies on the signature of ``TiffPage.decode``, which is
+        not part of the public API of tifffile.
+        """
+        if self._segment_decoding is None:
+            try:
+                keyframe = self.tfile.series[0].keyframe
+                params = inspect.signature(keyframe.decode).parameters
+            except (AttributeError, TypeError, ValueError):
+                params = {}
+            self._segment_decoding = (
+                {'jpegheader', '_fullsize'} <= set(params)
+                and hasattr(self.tfile.filehandle, 'read_segments'))
+        return self._segment_decoding
+
+    def _memmap(self):
+        """Memory map of the image data (ZYX[S]), for contiguous files.
+
+        Returns None if the layout of the data is not understood.
+        """
+        series = self.tfile.series[0]
+        shape = [self.nfrms, self.ysize, self.xsize]
+        if self.nchannels > 1:
+            shape.append(self.nchannels)
+        if math.prod(series.shape) != math.prod(shape):
+            return None
+
+        try:
+            offset = series.dataoffset
+        except AttributeError:
+            offset = series.offset  # tifffile < 2022.4.22
+        dtype = self.dtype.newbyteorder(self.tfile.byteorder)
+        return np.memmap(self.tfile.filehandle.path, dtype=dtype, mode='r',
+                         offset=offset, shape=tuple(shape))
+
+    def _one_page_per_frame(self):
+        keyframe = self.tfile.series[0].keyframe
+        return (len(self.tfile.series[0]) == self.nfrms
+                and keyframe.imagedepth == 1
+                and (keyframe.planarconfig == 1 or keyframe.samplesperpixel == 1))
+
+    def _decode_roi(self, zrange, y_start, y_stop, x_start, x_stop):
+        series = self.tfile.series[0]
+        keyframe = series.keyframe
+        fh = self.tfile.filehandle
+
+        shape = [len(zrange), y_stop - y_start, x_stop - x_start]
+        if self.nchannels > 1:
+            shape.append(self.nchannels)
+        out = np.zeros(shape, dtype=self.dtype)
+
+        if keyframe.is_tiled:
+            tl, tw = keyframe.tilelength, keyframe.tilewidth
+            ntiles_x = math.ceil(keyframe.imagewidth / tw)
+            indices = [
+                ty * ntiles_x + tx
+                for ty in range(y_start // tl, math.ceil(y_stop / tl))
+                for tx in range(x_start // tw, math.ceil(x_stop / tw))
+            ]
+        else:
+            rps = keyframe.rowsperstrip
+            indices = list(range(y_start // rps, math.ceil(y_stop / rps)))
+
+        decodeargs = {'_fullsize': keyframe.is_tiled}
+        if keyframe.compression in (6, 7, 34892, 33007):  # JPEG
+            decodeargs['jpegheader'] = keyframe.jpegheader
+
+        for i, z in enumerate(zrange):
+            page = series[z]
+            if 'jpegheader' in decodeargs:
+                decodeargs['jpegtables'] = page.jpegtables
+            offsets = [page.dataoffsets[j] for j in indices]
+            bytecounts = [page.databytecounts[j] for j in indices]
+
+            for data, index in fh.read_segments(
+                    offsets, bytecounts, indices=indices, lock=fh.lock,
+                    sort=True, flat=True):
+                segment, (_, _, h, w, _), seg_shape = keyframe.decode(
+                    data, index, **decodeargs)
+                if segment is None:
+                    continue
+
+                # intersection of segment and ROI, in page coordinates
+                y0 = max(h, y_start)
+                y1 = min(h + seg_shape[1], y_stop)
+                x0 = max(w, x_start)
+                x1 = min(w + seg_shape[2], x_stop)
+                if y0 >= y1 or x0 >= x1:
+                    continue
+
+                segment = segment.reshape(seg_shape)[0]
+                if self.nchannels == 1:
+                    segment = segment[..., 0]
+                out[i, y0 - y_start:y1 - y_start, x0 - x_start:x1 - x_start] = \
+                    segment[y0 - h:y1 - h, x0 - w:x1 - w]
+
+        return out
@@ -0,0 +1,47 @@
+import logging
+import argparse
+
+import coloredlogs
+
+from zetastitcher.io import project
+
+
+logger = logging.getLogger(__name__)
+coloredlogs.install(level='INFO', fmt='%(levelname)s [%(name)s]: %(message)s')
+
+
+class CustomFormatter(argparse.ArgumentDefaultsHelpFormatter,
+                      argparse.RawDescriptionHelpFormatter):
+    pass
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Convert a stitch project file between the YAML and the '
+                    'compressed NumPy archive (.npz) formats. The format of '
+                    'each file is given by its extension.',
+        epilog='Example: stitch-convert stitch.yml stitch.npz',
+        formatter_class=CustomFormatter)
+
+    parser.add_argument('input_file', help='input yml or npz file')
+    parser.add_argument('output_file', help='output yml or npz file')
+
+    args = parser.parse_args()
+
+    return args
+
+
+def main():
+    args = parse_args()
+
+    y = project.read(args.input_file)
+    for k in project.TABLES:
+        if k in y:
+            logger.info('{}: {} records'.format(k, len(y[k])))
+
+    project.write(args.output_file, y)
+    logger.info('written {}'.format(args.output_file))
+
+
+if __name__ == '__main__':
+    main()
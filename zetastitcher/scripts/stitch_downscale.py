@@ -2,13 +2,13 @@ import logging
 import argparse
 from pathlib import Path
 
-import yaml
 import coloredlogs
 
 import numpy as np
 
 from zetastitcher import VirtualFusedVolume, FileMatrix
 from zetastitcher.align.xcorr_filematrix import XcorrFileMatrix
+from zetastitcher.io import project
 
 
 logger = logging.getLogger(__name__)
@@ -26,8 +26,8 @@ def parse_args():
         epilog='Author: Giacomo Mazzamuto <mazzamuto@lens.unifi.it>',
         formatter_class=CustomFormatter)
 
-    parser.add_argument('input_file', help='input yml file')
-    parser.add_argument('output_file', help='output yml file')
+    parser.add_argument('input_file', help='input yml (or npz) file')
+    parser.add_argument('output_file', help='output yml (or npz) file')
 
     parser.add_argument('--xy-divide-by', type=float)
     parser.add_argument('--z-divide-by', type=float)
@@ -71,30 +71,20 @@ def main():
     xcorr_fm.xcorr_options['overlap_v'] /= args.xy_divide_by
     xcorr_fm.xcorr_options['z_stride'] /= args.z_divide_by
 
-    fm.save_to_yaml(args.output_file, 'w')
-
-    with open(args.input_file, 'r') as f:
-        y = yaml.load(f)
-
-    with open(args.output_file, 'a') as f:
-        yaml.dump(
-            {
-                'fuser-options': y['fuser-options'],
-                'xcorr-options': xcorr_fm.xcorr_options,
-            }, f, default_flow_style=False)
-
-    with open(args.output_file, 'r') as f:
-        file_content = f.read()
-
     ext = args.ext
     if not ext.startswith('.'):
         ext = '.' + ext
     old_ext = Path(df.index[0]).suffix
     if old_ext:
-        file_content = file_content.replace(old_ext, ext)
+        fm.data_frame = df.rename(index=lambda n: n.replace(old_ext, ext))
+
+    y = project.read(args.input_file)
 
-    with open(args.output_file, 'w') as f:
-        f.write(file_content)
+    project.write(args.output_file, {
+        'filematrix': fm.get_table(),
+        'fuser-options': y['fuser-options'],
+        'xcorr-options': xcorr_fm.xcorr_options,
+    })
 
     vfv = VirtualFusedVolume(args.output_file)
     logger.info(f'final shape: {vfv.shape}')